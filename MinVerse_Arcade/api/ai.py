@@ -1,16 +1,64 @@
-from dotenv import load_dotenv
-load_dotenv()
-
 import os
 import json
+import logging
+import threading
 import time
 import random
-from openai import OpenAI
 
-# Now that load_dotenv() has been called, this will load your key correctly.
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+from api.outbound import Upstream
 
-def trivia():
+logger = logging.getLogger(__name__)
+
+def openai_errors():
+    """OpenAI exceptions worth a retry. Looked up on the first call, like the
+    clients, since importing openai takes most of a second."""
+    import openai
+    return (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+# Timeouts, retries and the circuit breaker are handled by openai_upstream
+# rather than the SDK, so a failing API fails fast instead of retrying inside
+# every request.
+openai_upstream = Upstream(
+    'openai',
+    connect_timeout=float(os.getenv('OPENAI_CONNECT_TIMEOUT', 3)),
+    read_timeout=float(os.getenv('OPENAI_READ_TIMEOUT', 60)),
+    retries=int(os.getenv('OPENAI_RETRIES', 2)),
+    pool_size=int(os.getenv('OPENAI_POOL_SIZE', 50)),
+    failure_threshold=int(os.getenv('OPENAI_FAILURE_THRESHOLD', 5)),
+    reset_timeout=float(os.getenv('OPENAI_RESET_TIMEOUT', 30)),
+    retry_on=openai_errors
+)
+
+# The clients are built on first use, so workers and scripts that never ask
+# for trivia don't import openai at all. Each process builds its own, after
+# any fork, so connection pools are never shared between workers.
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import DefaultHttpxClient, OpenAI
+            _client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0,
+                             timeout=openai_upstream.timeout,
+                             http_client=DefaultHttpxClient(limits=openai_upstream.limits))
+        return _client
+
+def get_async_client():
+    """Async twin of get_client() for the ASGI entry point (asgi.py). It keeps
+    its own connection pool, shared by every request on the event loop."""
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            _async_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0,
+                                        timeout=openai_upstream.timeout,
+                                        http_client=DefaultAsyncHttpxClient(limits=openai_upstream.limits))
+        return _async_client
+
+def trivia_prompt():
     # Generate a random value and current timestamp to ensure uniqueness
     random_value = random.random()
     current_timestamp = int(time.time())
@@ -21,32 +69,101 @@ def trivia():
         "Return a valid JSON object with two keys: 'question' and 'answer'. "
         f"Random seed: {random_value}, Timestamp: {current_timestamp}."
     )
+    return {
+        'model': "gpt-4",
+        'messages': [{"role": "system", "content": system_message}],
+        'temperature': 0.9  # Increase randomness for more varied output
+    }
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "system", "content": system_message}],
-            temperature=0.9  # Increase randomness for more varied output
-        )
-        content = response.choices[0].message.content.strip()
+def parse_trivia(content):
+    content = content.strip()
 
-        # Try parsing the JSON response
+    # Try parsing the JSON response
+    try:
+        data = json.loads(content)
+        if 'question' in data and 'answer' in data:
+            return data
+    except json.JSONDecodeError:
+        # If JSON parsing fails, try to clean up the content and parse again
         try:
+            content = content.replace("```json", "").replace("```", "").strip()
             data = json.loads(content)
             if 'question' in data and 'answer' in data:
                 return data
-        except json.JSONDecodeError:
-            # If JSON parsing fails, try to clean up the content and parse again
-            try:
-                content = content.replace("```json", "").replace("```", "").strip()
-                data = json.loads(content)
-                if 'question' in data and 'answer' in data:
-                    return data
-            except:
-                pass
-
-        # Fallback to a default response if parsing fails
-        return {"question": "What is the capital of France?", "answer": "Paris"}
+        except:
+            pass
+
+    # Fallback to a default response if parsing fails
+    return {"question": "What is the capital of France?", "answer": "Paris"}
+
+def trivia():
+    try:
+        response = openai_upstream.call(get_client().chat.completions.create, **trivia_prompt())
+        return parse_trivia(response.choices[0].message.content)
     except Exception as e:
-        print(f"API Error: {str(e)}")
+        logger.error("OpenAI API error: %s", e)
         return {"question": "API Error", "answer": "Please try again later"}
+
+async def trivia_async():
+    """Same as trivia(), but waits on the API without holding a thread"""
+    try:
+        response = await openai_upstream.call_async(get_async_client().chat.completions.create,
+                                                     **trivia_prompt())
+        return parse_trivia(response.choices[0].message.content)
+    except Exception as e:
+        logger.error("OpenAI API error: %s", e)
+        return {"question": "API Error", "answer": "Please try again later"}
+
+def validate_trivia(item):
+    """Return a clean {'question', 'answer'} dict, or None if the item is unusable"""
+    if not isinstance(item, dict):
+        return None
+    question = item.get('question')
+    answer = item.get('answer')
+    if not isinstance(question, str) or not isinstance(answer, (str, int, float)):
+        return None
+    question = question.strip()
+    answer = str(answer).strip()
+    if not question or not answer or len(question) > 500 or len(answer) > 200:
+        return None
+    return {'question': question, 'answer': answer}
+
+def trivia_batch(count=20):
+    """Generate several trivia questions with a single completion call.
+
+    Returns a list of validated {'question', 'answer'} dicts, which may be
+    shorter than count (or empty if the API call failed).
+    """
+    system_message = (
+        f"Generate {count} unique, random trivia questions along with their answers. "
+        "Cover a wide mix of topics, keep them interesting and not overly difficult, "
+        "and never repeat a question. "
+        "Return only a valid JSON array of objects, each with two keys: 'question' and 'answer'. "
+        f"Random seed: {random.random()}, Timestamp: {int(time.time())}."
+    )
+
+    try:
+        response = openai_upstream.call(
+            get_client().chat.completions.create,
+            model="gpt-4",
+            messages=[{"role": "system", "content": system_message}],
+            temperature=0.9
+        )
+        content = response.choices[0].message.content.strip()
+        content = content.replace("```json", "").replace("```", "").strip()
+        items = json.loads(content)
+    except Exception as e:
+        logger.error("OpenAI API error: %s", e)
+        return []
+
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        return []
+
+    questions = []
+    for item in items:
+        valid = validate_trivia(item)
+        if valid:
+            questions.append(valid)
+    return questions
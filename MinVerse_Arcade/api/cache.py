@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe cache with per-entry expiry, a bounded LRU size and
+    request coalescing.
+
+    get_or_load() returns a cached value while it is fresh. On a miss, only
+    the first caller runs the loader; concurrent callers for the same key
+    wait for its result instead of making their own upstream call. Results
+    the is_error callback flags are kept for error_ttl seconds only, so a
+    failing upstream isn't hammered but recovers quickly.
+
+    get_or_load_async() is the same for coroutine loaders, coalescing
+    callers on the event loop. Both share the cached entries.
+    """
+
+    def __init__(self, maxsize=256, ttl=600, error_ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight = {}           # key -> threading.Event set when the load finishes
+        self._in_flight_async = {}     # key -> asyncio.Task running the load
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _get_fresh(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get_or_load(self, key, loader, is_error=lambda value: False):
+        while True:
+            with self._lock:
+                entry = self._get_fresh(key, time.monotonic())
+                if entry is not None:
+                    self.hits += 1
+                    return entry[1]
+
+                event = self._in_flight.get(key)
+                if event is None:
+                    # This caller loads the value, everyone else waits for it
+                    self.misses += 1
+                    event = threading.Event()
+                    self._in_flight[key] = event
+                    break
+                self.coalesced += 1
+
+            event.wait()
+            # Loop round to pick up the value the loading caller stored
+
+        try:
+            value = loader()
+        except BaseException:
+            with self._lock:
+                del self._in_flight[key]
+            event.set()
+            raise
+
+        with self._lock:
+            self._store(key, value, is_error)
+            del self._in_flight[key]
+        event.set()
+        return value
+
+    async def get_or_load_async(self, key, loader, is_error=lambda value: False):
+        with self._lock:
+            entry = self._get_fresh(key, time.monotonic())
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+
+            task = self._in_flight_async.get(key)
+            if task is None:
+                self.misses += 1
+                task = asyncio.ensure_future(self._load_async(key, loader, is_error))
+                self._in_flight_async[key] = task
+            else:
+                self.coalesced += 1
+
+        # Shielded so one caller disconnecting doesn't cancel everyone's load
+        return await asyncio.shield(task)
+
+    async def _load_async(self, key, loader, is_error):
+        try:
+            value = await loader()
+            with self._lock:
+                self._store(key, value, is_error)
+            return value
+        finally:
+            with self._lock:
+                del self._in_flight_async[key]
+
+    def _store(self, key, value, is_error):
+        # Caller holds the lock
+        if is_error(value):
+            self.errors += 1
+            ttl = self.error_ttl
+        else:
+            ttl = self.ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def update(self, key, change):
+        """Replace a cached value with change(value), keeping its expiry. Does nothing if it isn't cached."""
+        with self._lock:
+            entry = self._get_fresh(key, time.monotonic())
+            if entry is not None:
+                self._entries[key] = (entry[0], change(entry[1]))
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'errors': self.errors,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
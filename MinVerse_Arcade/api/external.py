@@ -1,43 +1,120 @@
-import requests
+import logging
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from api.cache import TTLCache
+from api.outbound import CircuitOpenError, Upstream
+
+logger = logging.getLogger(__name__)
+
+WEATHER_API_URL = os.getenv('WEATHER_API_URL', 'https://api.openweathermap.org/data/2.5/weather')
+
+# Weather barely changes minute to minute, so lookups are cached per city.
+# Failed lookups are only cached briefly so a flaky upstream recovers fast.
+weather_cache = TTLCache(
+    maxsize=int(os.getenv('WEATHER_CACHE_SIZE', 256)),
+    ttl=int(os.getenv('WEATHER_CACHE_TTL', 600)),
+    error_ttl=int(os.getenv('WEATHER_ERROR_TTL', 30))
+)
+
+def transport_errors():
+    # Looked up on the first lookup, so importing this module skips requests and httpx
+    import httpx
+    import requests
+    return (requests.exceptions.ConnectionError, requests.exceptions.Timeout, httpx.TransportError)
+
+# Pooled connections, timeouts, retries and a circuit breaker for OpenWeatherMap.
+# Once it keeps failing, lookups fail fast instead of waiting on timeouts.
+weather_upstream = Upstream(
+    'weather',
+    connect_timeout=float(os.getenv('WEATHER_CONNECT_TIMEOUT', 3)),
+    read_timeout=float(os.getenv('WEATHER_READ_TIMEOUT', 5)),
+    retries=int(os.getenv('WEATHER_RETRIES', 2)),
+    pool_size=int(os.getenv('WEATHER_POOL_SIZE', 50)),
+    failure_threshold=int(os.getenv('WEATHER_FAILURE_THRESHOLD', 5)),
+    reset_timeout=float(os.getenv('WEATHER_RESET_TIMEOUT', 30)),
+    retry_on=transport_errors
+)
+
+def normalize_city(city):
+    """Cache key for a city: 'new  York ' and 'New York' are the same lookup"""
+    return ' '.join(city.split()).lower()
+
+def is_weather_error(result):
+    return result.get('temperature') == 'N/A'
 
 def get_weather(city):
-    api_key = os.getenv('WEATHER_API_KEY')
-    url = f"https://api.openweathermap.org/data/2.5/weather?q={city}&units=imperial&appid={api_key}"
-    
+    data = weather_cache.get_or_load(
+        normalize_city(city),
+        lambda: fetch_weather(city),
+        is_error=is_weather_error
+    )
+    # Callers add their own keys to the result, so hand out a copy
+    return dict(data)
+
+async def get_weather_async(city):
+    """Same as get_weather(), for the ASGI entry point (asgi.py)"""
+    data = await weather_cache.get_or_load_async(
+        normalize_city(city),
+        lambda: fetch_weather_async(city),
+        is_error=is_weather_error
+    )
+    return dict(data)
+
+def weather_params(city):
+    return {'q': city, 'units': 'imperial', 'appid': os.getenv('WEATHER_API_KEY')}
+
+def fetch_weather(city):
+    import requests
     try:
-        response = requests.get(url, timeout=10)
-        
-        # Check if the request was successful
-        if response.status_code != 200:
-            return {
-                'city': city, 
-                'temperature': 'N/A', 
-                'weather': f'Error: {response.status_code}'
-            }
-            
-        data = response.json()
-        if data.get('cod') != 200:
-            return {
-                'city': city, 
-                'temperature': 'N/A', 
-                'weather': data.get('message', 'Unknown error')
-            }
-            
-        return {
-            'city': data['name'],  # Use the returned city name to handle capitalization
-            'temperature': round(data['main']['temp']),  # Round to nearest whole number
-            'weather': data['weather'][0]['description'],
-            'humidity': data['main']['humidity'],
-            'wind': data['wind']['speed']
-        }
+        response = weather_upstream.get(WEATHER_API_URL, params=weather_params(city))
+        return parse_weather(city, response)
+    except CircuitOpenError:
+        return {'city': city, 'temperature': 'N/A', 'weather': 'Weather service unavailable'}
     except requests.exceptions.Timeout:
         return {'city': city, 'temperature': 'N/A', 'weather': 'Request timed out'}
     except requests.exceptions.ConnectionError:
         return {'city': city, 'temperature': 'N/A', 'weather': 'Connection error'}
     except Exception as e:
-        print(f"Weather API error: {str(e)}")
+        logger.error("Weather API error for %s: %s", city, e)
         return {'city': city, 'temperature': 'N/A', 'weather': 'API Error'}
+
+async def fetch_weather_async(city):
+    import httpx
+    try:
+        response = await weather_upstream.get_async(WEATHER_API_URL, params=weather_params(city))
+        return parse_weather(city, response)
+    except CircuitOpenError:
+        return {'city': city, 'temperature': 'N/A', 'weather': 'Weather service unavailable'}
+    except httpx.TimeoutException:
+        return {'city': city, 'temperature': 'N/A', 'weather': 'Request timed out'}
+    except httpx.TransportError:
+        return {'city': city, 'temperature': 'N/A', 'weather': 'Connection error'}
+    except Exception as e:
+        logger.error("Weather API error for %s: %s", city, e)
+        return {'city': city, 'temperature': 'N/A', 'weather': 'API Error'}
+
+def parse_weather(city, response):
+    """Turn an API response (from requests or httpx) into the weather dict"""
+    # Check if the request was successful
+    if response.status_code != 200:
+        return {
+            'city': city, 
+            'temperature': 'N/A', 
+            'weather': f'Error: {response.status_code}'
+        }
+        
+    data = response.json()
+    if data.get('cod') != 200:
+        return {
+            'city': city, 
+            'temperature': 'N/A', 
+            'weather': data.get('message', 'Unknown error')
+        }
+        
+    return {
+        'city': data['name'],  # Use the returned city name to handle capitalization
+        'temperature': round(data['main']['temp']),  # Round to nearest whole number
+        'weather': data['weather'][0]['description'],
+        'humidity': data['main']['humidity'],
+        'wind': data['wind']['speed']
+    }
@@ -0,0 +1,263 @@
+import asyncio
+import random
+import threading
+import time
+
+# Responses worth retrying: the upstream is overloaded or briefly broken
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Functions called as listener(upstream_name, seconds) after every call,
+# retries included. Used by instrumentation.py to time outbound calls.
+call_listeners = []
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that has been failing"""
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after failure_threshold calls in a row fail.
+
+    While open, calls fail straight away with CircuitOpenError. After
+    reset_timeout seconds one trial call is let through (half open): if it
+    succeeds the circuit closes again, if not it stays open for another
+    reset_timeout. A trial that is cancelled before it has an answer gives
+    its turn to the next call.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.trial_running or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call can't go ahead. Returns True
+        when it goes ahead as the half-open trial."""
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if self.trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError('circuit open, upstream is failing')
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def release_trial(self):
+        """End the half-open trial without a verdict, leaving the circuit open"""
+        with self._lock:
+            self.trial_running = False
+
+
+class Upstream:
+    """Everything needed to call one external API well: pooled keep-alive
+    clients, connect/read timeouts, bounded retries with jittered backoff
+    and a circuit breaker.
+
+    Each upstream is a single host, so pool_size is the per-host limit on
+    open connections. retry_on lists the exceptions that mean the call
+    never got a usable answer (connection errors, timeouts); responses with
+    a status in RETRY_STATUSES are retried too. It can also be a function
+    returning them, called on the first call, for clients imported lazily.
+    """
+
+    def __init__(self, name, connect_timeout=3.0, read_timeout=10.0, retries=2,
+                 backoff=0.2, max_backoff=2.0, pool_size=10,
+                 failure_threshold=5, reset_timeout=30, retry_on=()):
+        self.name = name
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self._retry_on = retry_on if callable(retry_on) else tuple(retry_on)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._session = None
+        self._async_client = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retried = 0
+        self.failed = 0
+        self.short_circuited = 0
+
+    @property
+    def retry_on(self):
+        if callable(self._retry_on):
+            self._retry_on = tuple(self._retry_on())
+        return self._retry_on
+
+    @property
+    def timeout(self):
+        """httpx timeouts, for the async client and the OpenAI clients"""
+        import httpx
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    @property
+    def limits(self):
+        """httpx pool limits, for the async client and the OpenAI clients"""
+        import httpx
+        return httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+
+    @property
+    def session(self):
+        """Pooled requests session for sync calls, created on first use"""
+        with self._lock:
+            if self._session is None:
+                # Imported here so processes that never make a sync call skip it
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                                      max_retries=0)  # Retries happen in call()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    @property
+    def async_client(self):
+        """Pooled httpx client for async calls, created on first use"""
+        if self._async_client is None:
+            # Imported here so processes that never make an async call skip it
+            import httpx
+            self._async_client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._async_client
+
+    def get(self, url, **kwargs):
+        return self.call(self.session.get, url,
+                         timeout=(self.connect_timeout, self.read_timeout), **kwargs)
+
+    async def get_async(self, url, **kwargs):
+        return await self.call_async(self.async_client.get, url, **kwargs)
+
+    def retry_delay(self, attempt):
+        # Full jitter, so callers that failed together don't retry together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _start_call(self):
+        """Returns whether this call is the breaker's half-open trial"""
+        try:
+            trial = self.breaker.before_call()
+        except CircuitOpenError:
+            self.short_circuited += 1
+            raise
+        self.calls += 1
+        return trial
+
+    def _outcome(self, attempt, result=None, error=None):
+        """Work out what to do after an attempt: return, retry or give up"""
+        if error is None and getattr(result, 'status_code', None) not in RETRY_STATUSES:
+            self.breaker.record_success()
+            return 'done'
+        if attempt < self.retries:
+            self.retried += 1
+            return 'retry'
+        self.failed += 1
+        self.breaker.record_failure()
+        return 'give_up'
+
+    def call(self, fn, *args, **kwargs):
+        """Call fn (which makes the request) with retries and the circuit breaker.
+
+        Raises CircuitOpenError without calling fn while the circuit is open.
+        When retries run out, the last error is raised or the last failed
+        response returned.
+        """
+        start = time.perf_counter()
+        trial = False
+        try:
+            trial = self._start_call()
+            for attempt in range(self.retries + 1):
+                result = error = None
+                try:
+                    result = fn(*args, **kwargs)
+                except self.retry_on as e:
+                    error = e
+                except Exception:
+                    # The upstream answered, it just didn't like the request
+                    self.breaker.record_success()
+                    raise
+                outcome = self._outcome(attempt, result, error)
+                if outcome == 'retry':
+                    time.sleep(self.retry_delay(attempt))
+                elif error is not None:
+                    raise error
+                else:
+                    return result
+        except BaseException as e:
+            self._interrupted(trial, e)
+            raise
+        finally:
+            self._report(time.perf_counter() - start)
+
+    async def call_async(self, fn, *args, **kwargs):
+        """Same as call() for a coroutine function"""
+        start = time.perf_counter()
+        trial = False
+        try:
+            trial = self._start_call()
+            for attempt in range(self.retries + 1):
+                result = error = None
+                try:
+                    result = await fn(*args, **kwargs)
+                except self.retry_on as e:
+                    error = e
+                except Exception:
+                    self.breaker.record_success()
+                    raise
+                outcome = self._outcome(attempt, result, error)
+                if outcome == 'retry':
+                    await asyncio.sleep(self.retry_delay(attempt))
+                elif error is not None:
+                    raise error
+                else:
+                    return result
+        except BaseException as e:
+            self._interrupted(trial, e)
+            raise
+        finally:
+            self._report(time.perf_counter() - start)
+
+    def _interrupted(self, trial, error):
+        # Cancelled (asyncio.CancelledError), interrupted or exiting before
+        # the upstream had its say, during the request or a retry's wait.
+        # That says nothing about the upstream, but a half-open trial would
+        # otherwise hold its slot, and keep the circuit from ever closing.
+        if trial and not isinstance(error, Exception):
+            self.breaker.release_trial()
+
+    def _report(self, seconds):
+        for listener in call_listeners:
+            listener(self.name, seconds)
+
+    def stats(self):
+        return {
+            'state': self.breaker.state,
+            'calls': self.calls,
+            'retried': self.retried,
+            'failed': self.failed,
+            'short_circuited': self.short_circuited
+        }
@@ -0,0 +1,149 @@
+"""ASGI entry point for running the arcade on an async server:
+
+    uvicorn asgi:app --workers 4
+
+Every route still runs as a normal Flask view on a pool of threads
+(WSGI_THREADS per worker, 10 by default), except for the waiting parts of
+routes that would otherwise hold a thread:
+
+- /api/trivia and /api/weather make their upstream call on the event loop
+  first, using the shared async clients in api/, and hand the result to
+  the Flask view through the WSGI environ. A slow OpenAI or OpenWeatherMap
+  call then costs an idle coroutine instead of a thread, so it can't
+  starve score posts and other requests of workers.
+- /events, the live update stream every open page keeps, is served on the
+  event loop entirely.
+
+`python main.py` and plain WSGI servers keep working as before; the views
+fetch the data themselves when nothing was prefetched.
+"""
+import asyncio
+import io
+import os
+from contextvars import ContextVar
+
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from flask import request
+from flask_login import current_user
+
+import instrumentation
+import main
+from api.ai import trivia_async
+from api.external import get_weather_async
+
+# Extra WSGI environ keys for the current request. a2wsgi runs the Flask view
+# in a copy of the request task's context, so the view sees what was set here.
+_prefetched = ContextVar('prefetched', default=None)
+
+
+def _request_info(flask_app, environ, check):
+    """Run check() in a request context for the logged in user, or return
+    None for anonymous users.
+
+    Runs on a thread since loading the user (and check) hit the database.
+    """
+    with flask_app.request_context(environ):
+        if not current_user.is_authenticated:
+            return None
+        return check()
+
+
+async def prefetch_trivia(flask_app, environ):
+    if await asyncio.to_thread(_request_info, flask_app, environ,
+                               lambda: main.trivia_pool_exhausted(current_user.id)):
+        return {'arcade.live_trivia': await trivia_async()}
+    return {}
+
+
+async def prefetch_weather(flask_app, environ):
+    city = await asyncio.to_thread(_request_info, flask_app, environ,
+                                   lambda: request.args.get('city', 'London'))
+    if city is None:
+        return {}
+    return {'arcade.weather': await get_weather_async(city)}
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def event_stream(flask_app, environ, receive, send):
+    """Serve /events on the event loop, so an open page costs a coroutine
+    rather than a thread. Returns False for anonymous users, for Flask to
+    send to the login page."""
+    user_id = await asyncio.to_thread(_request_info, flask_app, environ, lambda: current_user.id)
+    if user_id is None:
+        return False
+    
+    subscription = main.event_broker.subscribe_async(user_id)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        snapshot = await asyncio.to_thread(_request_info, flask_app, environ,
+                                           lambda: main.get_event_snapshot(user_id))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        body = f"retry: {main.EVENTS_CONFIG['retry_ms']}\n\n"
+        body += ''.join(main.format_sse(*message) for message in snapshot or [])
+        while not disconnected.done():
+            await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+            next_message = asyncio.ensure_future(subscription.get(main.EVENTS_CONFIG['keepalive']))
+            await asyncio.wait({next_message, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_message.done():
+                next_message.cancel()
+                break
+            message = next_message.result()
+            body = main.format_sse(*message) if message else ': keepalive\n\n'
+    except OSError:
+        pass  # The client went away mid-send
+    finally:
+        main.event_broker.unsubscribe(subscription)
+        disconnected.cancel()
+    return True
+
+
+PREFETCH_ROUTES = {
+    '/api/trivia': prefetch_trivia,
+    '/api/weather': prefetch_weather,
+}
+
+
+def make_asgi_app(flask_app, threads=None):
+    """Wrap a Flask app for an ASGI server, prefetching upstream data for PREFETCH_ROUTES"""
+    def wsgi_app(environ, start_response):
+        environ.update(_prefetched.get() or {})
+        return flask_app(environ, start_response)
+
+    if os.getenv('EVENTS_STREAMS') != '0':
+        # A stream costs a coroutine here, so pages can keep one open
+        flask_app.config['EVENTS_STREAMS'] = True
+    threads = threads or int(os.getenv('WSGI_THREADS', 10))
+    flask_asgi = WSGIMiddleware(wsgi_app, workers=threads)
+
+    async def asgi_app(scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            path = scope['path']
+            if path == '/events' and flask_app.config.get('EVENTS_STREAMS'):
+                environ = build_environ(scope, io.BytesIO())
+                if await event_stream(flask_app, environ, receive, send):
+                    return
+            elif path in PREFETCH_ROUTES:
+                environ = build_environ(scope, io.BytesIO())
+                # With instrumentation on, the request's clock starts before the prefetch
+                stats = instrumentation.start_request()
+                prefetched = await PREFETCH_ROUTES[path](flask_app, environ)
+                if stats is not None:
+                    prefetched['arcade.request_stats'] = stats
+                _prefetched.set(prefetched)
+        await flask_asgi(scope, receive, send)
+
+    return asgi_app
+
+
+# Fork the password workers before the event loop and thread pool start
+main.password_hasher.start()
+app = make_asgi_app(main.app)
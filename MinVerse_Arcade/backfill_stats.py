@@ -0,0 +1,18 @@
+from main import app, db
+from main import rebuild_user_stats, create_missing_indexes, add_missing_columns, migrate_conversation_history
+
+with app.app_context():
+    print("Creating missing tables, columns and indexes...")
+    db.create_all()
+    create_missing_indexes()
+    add_missing_columns()
+    
+    print("Rebuilding user stats from score and clue history...")
+    count = rebuild_user_stats()
+    
+    print(f"{count} stats rows written.")
+    
+    print("Moving NEXUS conversation history into the message log...")
+    migrated = migrate_conversation_history()
+    
+    print(f"Backfill complete! {migrated} conversations migrated.")
@@ -0,0 +1,147 @@
+"""Load test /api/weather and /api/trivia against upstream APIs that take
+2 seconds to answer, served two ways with the same number of threads:
+
+- sync:  every request holds a thread while it waits on the upstream,
+         like gunicorn sync workers
+- async: asgi.py, upstream calls wait on the event loop
+
+While the load runs, a few game score posts are timed to show whether slow
+upstream calls starve the rest of the app.
+
+    python benchmarks/bench_async_upstream.py [requests] [threads]
+"""
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UPSTREAM_DELAY = 2
+total_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+threads = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+
+class SlowUpstreamHandler(BaseHTTPRequestHandler):
+    """OpenWeatherMap on GET, OpenAI chat completions on POST"""
+
+    def do_GET(self):
+        time.sleep(UPSTREAM_DELAY)
+        self.send_json({'cod': 200, 'name': 'Somewhere', 'main': {'temp': 50, 'humidity': 40},
+                        'weather': [{'description': 'cloudy'}], 'wind': {'speed': 2}})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(UPSTREAM_DELAY)
+        content = json.dumps({'question': 'How slow is this API?', 'answer': 'Two seconds'})
+        self.send_json({
+            'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4',
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+        })
+
+    def send_json(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+ThreadingHTTPServer.request_queue_size = 1024
+upstream = ThreadingHTTPServer(('127.0.0.1', 0), SlowUpstreamHandler)
+threading.Thread(target=upstream.serve_forever, daemon=True).start()
+os.environ['WEATHER_API_URL'] = f'http://127.0.0.1:{upstream.server_port}/weather'
+os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{upstream.server_port}/v1'
+os.environ['OPENAI_API_KEY'] = 'stub'
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from a2wsgi import WSGIMiddleware  # noqa: E402
+
+import common  # noqa: E402
+from common import main  # noqa: E402
+import asgi  # noqa: E402
+from api.external import weather_cache  # noqa: E402
+
+# Keep the trivia pool empty so every trivia request goes to the API
+main.ensure_trivia_refill_worker = lambda: None
+
+app = common.make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'async.db')}",
+                      engine_options={'connect_args': {'timeout': 30}}, with_routes=True)
+
+
+def serve(asgi_app):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host='127.0.0.1', port=port,
+                                           log_level='warning', lifespan='off'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f'http://127.0.0.1:{port}'
+
+
+async def run_load(base_url, label):
+    limits = httpx.Limits(max_connections=total_requests + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await client.post('/register', data={'username': label, 'password': 'pw'})
+        await client.post('/login', data={'username': label, 'password': 'pw'})
+
+        async def upstream_request(i):
+            # Distinct cities so the weather cache can't answer for the upstream
+            if i % 3 == 0:
+                response = await client.get('/api/trivia')
+            else:
+                response = await client.get('/api/weather', params={'city': f'{label} city {i}'})
+            assert response.status_code == 200, response.status_code
+            return response.json()
+
+        async def score_posts():
+            await asyncio.sleep(0.3)  # Let the upstream requests take the workers first
+            latencies = []
+            for _ in range(5):
+                start = time.perf_counter()
+                response = await client.post('/games/clickmaster', json={'score': 10})
+                assert response.status_code == 200, response.status_code
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        start = time.perf_counter()
+        results, latencies = await asyncio.gather(
+            asyncio.gather(*(upstream_request(i) for i in range(total_requests))),
+            score_posts())
+        elapsed = time.perf_counter() - start
+
+    assert all(result.get('question') or result.get('weather') == 'cloudy' for result in results)
+    return elapsed, latencies
+
+
+print(f"Upstream delay {UPSTREAM_DELAY}s, {threads} threads per server")
+timings = {}
+for label, asgi_app in (('sync', WSGIMiddleware(app, workers=threads)),
+                        ('async', asgi.make_asgi_app(app, threads=threads))):
+    weather_cache.clear()
+    server, base_url = serve(asgi_app)
+    with contextlib.redirect_stdout(io.StringIO()):  # The game routes print debug output
+        elapsed, latencies = asyncio.run(run_load(base_url, label))
+    server.should_exit = True
+    timings[label] = elapsed
+    print(f"{label:>5}: {total_requests} upstream requests in {elapsed:.1f}s "
+          f"({total_requests / elapsed:.1f} req/s), score post latency "
+          f"avg {sum(latencies) / len(latencies) * 1000:.0f}ms, "
+          f"max {max(latencies) * 1000:.0f}ms")
+
+print(f"Speedup: {timings['sync'] / timings['async']:.1f}x")
+upstream.shutdown()
@@ -0,0 +1,112 @@
+"""Coin reconciliation over the whole CoinTransaction history vs checkpoints
+plus recent transactions, and checks that checkpointing and compaction
+(main.checkpoint_coin_ledger / compact_coin_ledger) keep every balance
+accounted for.
+
+Seeds 90 days of transactions (500k by default) into a SQLite file, then
+adds a burst of new plays on top.
+
+    python benchmarks/bench_coin_ledger.py [transactions]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, update
+
+import common
+from common import db, main
+
+total = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+users = 1000
+recent = 20_000
+sources = ['clickmaster_play', 'space_dodger_play', 'emoji_memory_play', 'coin_cruncher', 'unlock']
+
+app = common.make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ledger.db')}", profile='production')
+
+
+def full_history_reconcile():
+    # What checking balances took before checkpoints: sum every transaction
+    ledger = dict(db.session.query(main.CoinTransaction.user_id, db.func.sum(main.CoinTransaction.amount))
+                  .group_by(main.CoinTransaction.user_id))
+    return [(user_id, coins, ledger.get(user_id, 0))
+            for user_id, coins in db.session.query(main.PlayerCoins.user_id, main.PlayerCoins.coins)
+            if coins != ledger.get(user_id, 0)]
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:42} {time.perf_counter() - start:7.3f}s")
+    return result
+
+
+with app.app_context():
+    rng = random.Random(7)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    start = now - timedelta(days=90)
+    balances = Counter()
+    with common.timer(f"Seeding {total:,} transactions for {users} users"):
+        db.session.execute(insert(main.User), [{'username': f'player{i}', 'password': 'x'} for i in range(users)])
+        batch = []
+        for i in range(total):
+            user_id, amount = rng.randint(1, users), rng.choice([1, 2, 5, 10, -3, -20])
+            balances[user_id] += amount
+            batch.append({'user_id': user_id, 'amount': amount, 'source': rng.choice(sources),
+                          'timestamp': start + timedelta(days=90) * i / total - timedelta(hours=1)})
+            if len(batch) == 50_000:
+                db.session.execute(insert(main.CoinTransaction), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(main.CoinTransaction), batch)
+        db.session.execute(insert(main.PlayerCoins), [
+            {'user_id': user_id, 'coins': balances[user_id]} for user_id in range(1, users + 1)])
+        db.session.commit()
+        db.session.execute(db.text('ANALYZE'))
+
+    assert timed("Reconcile, whole history", full_history_reconcile) == []
+    assert timed("Reconcile, no checkpoints yet", main.reconcile_coins) == []
+    timed("First checkpoint", main.checkpoint_coin_ledger)
+    moved = timed("First compaction", main.compact_coin_ledger)
+    archived = db.session.query(db.func.count(main.CoinTransactionArchive.id)).scalar()
+    kept = db.session.query(db.func.count(main.CoinTransaction.id)).scalar()
+    # The remaining history alone no longer adds up to the balances
+    timed("Sum remaining history (no longer enough)", full_history_reconcile)
+    print(f"Archived {moved:,} transactions as {archived:,} daily totals, {kept:,} left in CoinTransaction")
+    assert moved + kept == total
+
+    # New plays since the checkpoint, recorded the way the routes do it
+    for _ in range(recent):
+        main.credit_coins(rng.randint(1, users), 1, source='clickmaster_play')
+    db.session.commit()
+
+    assert timed("Reconcile, checkpoint + recent", main.reconcile_coins) == []
+    assert timed("Checkpoint again, only recent ids", main.checkpoint_coin_ledger) > 0
+    # Only the few seeded rows that crossed the 30 day line since the first run
+    assert timed("Compact again, little old left", main.compact_coin_ledger) < 10
+
+    # Every coin is still accounted for: archive + live transactions = balance
+    archive = Counter(dict(db.session.query(main.CoinTransactionArchive.user_id,
+                                            db.func.sum(main.CoinTransactionArchive.amount))
+                           .group_by(main.CoinTransactionArchive.user_id)))
+    live = Counter(dict(db.session.query(main.CoinTransaction.user_id, db.func.sum(main.CoinTransaction.amount))
+                        .group_by(main.CoinTransaction.user_id)))
+    coins = dict(db.session.query(main.PlayerCoins.user_id, main.PlayerCoins.coins))
+    assert all(archive[user_id] + live[user_id] == coins[user_id] for user_id in coins)
+
+    # A balance changed without a transaction is caught
+    db.session.execute(update(main.PlayerCoins).where(main.PlayerCoins.user_id == 7)
+                       .values(coins=main.PlayerCoins.coins + 1))
+    db.session.commit()
+    assert [user_id for user_id, _, _ in main.reconcile_coins()] == [7]
+    assert [user_id for user_id, _, _ in main.reconcile_coins([7, 8])] == [7]
+    print("Tampered balance found by reconcile_coins")
+
+    plan = db.session.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN SELECT sum(amount) FROM coin_transaction WHERE user_id = 7 AND id > 100").fetchall()
+    assert 'ix_coin_transaction_user_id' in plan[0][-1], plan
+print("OK")
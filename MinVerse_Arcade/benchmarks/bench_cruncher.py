@@ -0,0 +1,129 @@
+"""Time the Coin Cruncher worker's pass over many online players' events,
+check that worker threads racing for the same events (as several gunicorn
+workers do) steal only once each, then simulate an hour of play to check
+the server keeps to COIN_CRUNCHER_CONFIG: steal amounts, time between
+appearances, and a balance that matches the ledger. Some players close
+the page after their first check-in, and must never be robbed.
+
+    python benchmarks/bench_cruncher.py [players]
+"""
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+import common
+from common import db, main
+from sqlalchemy import insert
+
+players = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+config = main.COIN_CRUNCHER_CONFIG
+start = datetime(2026, 1, 1)
+stay = timedelta(seconds=config['stay_duration'])
+
+app = common.make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'cruncher.db')}",
+                      profile='production')
+with app.app_context():
+    db.session.execute(insert(main.User), [{'username': f'player{i}', 'password': 'x'} for i in range(players)])
+    db.session.execute(insert(main.PlayerCoins), [{'user_id': i + 1, 'coins': 1000} for i in range(players)])
+    db.session.execute(insert(main.CruncherState), [
+        {'user_id': i + 1, 'kind': 'appear', 'due_at': start, 'last_seen': start} for i in range(players)])
+    db.session.commit()
+
+    with common.timer(f"Crunchers appearing for {players:,} players", players):
+        main.run_cruncher_events(start)
+    with common.timer(f"Nothing due for {players:,} players", 100):
+        for _ in range(100):
+            main.run_cruncher_events(start)
+            main.next_cruncher_due()
+    assert main.CruncherState.query.filter_by(kind='steal').count() == players
+
+
+errors = []
+
+
+def work_through(now):
+    with app.app_context():
+        try:
+            main.run_cruncher_events(now)
+        except Exception as e:
+            errors.append(e)
+
+
+# Every steal falls due at once and four workers go after them
+with common.timer(f"Four workers stealing from {players:,} players", players):
+    workers = [threading.Thread(target=work_through, args=(start + stay,)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+assert not errors, errors
+with app.app_context():
+    steals = db.session.query(main.CoinTransaction.user_id, db.func.count()) \
+                       .filter_by(source='coin_cruncher').group_by(main.CoinTransaction.user_id).all()
+    assert len(steals) == players and all(count == 1 for _, count in steals), "stolen more than once"
+    assert main.CruncherState.query.filter_by(kind='appear').count() == players
+print(f"{players:,} steals, one each")
+
+# An hour of play for a few hundred players against a fresh database
+app = common.make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'cruncher.db')}")
+online = 200
+hour = 3600
+# Every fourth player (all odd, so none of the ones fighting back) leaves
+absent = set(range(1, online + 1, 4))
+present = [user_id for user_id in range(1, online + 1) if user_id not in absent]
+with app.app_context():
+    db.session.execute(insert(main.User), [
+        {'username': f'player{i}', 'password': 'x'} for i in range(online)])
+    db.session.execute(insert(main.PlayerCoins), [
+        {'user_id': i + 1, 'coins': 1000} for i in range(online)])
+    db.session.commit()
+
+    defeats = Counter()
+    with common.timer(f"Simulating an hour for {online} players"):
+        for second in range(hour + 1):
+            now = start + timedelta(seconds=second)
+            main.run_cruncher_events(now)
+            # Everyone opens a page, the absent players close it again
+            if second % 60 == 0:
+                for user_id in (range(1, online + 1) if second == 0 else present):
+                    main.get_cruncher_state(user_id, now)
+            # Open pages send heartbeats
+            if second % config['heartbeat_interval'] == 0:
+                db.session.execute(db.update(main.CruncherState)
+                                   .where(main.CruncherState.user_id.in_(present))
+                                   .values(last_seen=now))
+                db.session.commit()
+            # Every other player fights back
+            for (user_id,) in db.session.query(main.CruncherState.user_id).filter_by(kind='steal').all():
+                if user_id % 2 == 0:
+                    assert main.defeat_cruncher(user_id, now)
+                    defeats[user_id] += 1
+            db.session.rollback()
+
+    steals = Counter(dict(db.session.query(main.CoinTransaction.user_id, db.func.count())
+                          .filter_by(source='coin_cruncher')
+                          .group_by(main.CoinTransaction.user_id).all()))
+    amounts = {amount for (amount,) in db.session.query(main.CoinTransaction.amount)
+               .filter_by(source='coin_cruncher').distinct()}
+    balances = dict(db.session.query(main.PlayerCoins.user_id, main.PlayerCoins.coins).all())
+    ledger = dict(db.session.query(main.CoinTransaction.user_id, db.func.sum(main.CoinTransaction.amount))
+                  .group_by(main.CoinTransaction.user_id).all())
+    left_scheduled = main.CruncherState.query.filter(main.CruncherState.user_id.in_(absent)).count()
+
+# Each encounter takes between min interval + stay and max interval + stay
+cycle = (config['min_appearance_interval'] + config['stay_duration'],
+         config['max_appearance_interval'] + config['stay_duration'])
+encounters = [steals[user_id] + defeats[user_id] for user_id in present]
+print(f"Encounters per player per hour: min {min(encounters)}, max {max(encounters)} "
+      f"(allowed {hour // cycle[1] - 1} to {hour // cycle[0] + 1})")
+assert all(hour // cycle[1] - 1 <= count <= hour // cycle[0] + 1 for count in encounters)
+assert all(steals[user_id] == 0 for user_id in range(2, online + 1, 2)), "defeated crunchers stole"
+assert not any(steals[user_id] for user_id in absent), "robbed a player who had left"
+assert left_scheduled == 0, "kept scheduling crunchers for players who left"
+assert all(-config['max_steal_amount'] <= amount <= -config['min_steal_amount'] for amount in amounts)
+assert all(balances[user_id] == 1000 + ledger.get(user_id, 0) for user_id in balances)
+print(f"Steals: {sum(steals.values())}, defeats: {sum(defeats.values())}")
+print("OK")
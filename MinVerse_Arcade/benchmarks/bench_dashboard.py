@@ -0,0 +1,42 @@
+"""Show that the home page query count stays flat as games are added.
+
+    python benchmarks/bench_dashboard.py
+"""
+import common
+from common import db, main
+
+app = common.make_app()
+
+with app.app_context():
+    user_id = common.create_user(coins=100)
+    for game_id in main.GAME_PROGRESSION:
+        for score in range(50):
+            db.session.add(main.Score(user_id=user_id, game=game_id, score=score))
+            main.update_user_stats(user_id, game_id, score=score)
+    db.session.commit()
+
+    original_games = dict(main.GAME_PROGRESSION)
+    query_counts = {}
+    for extra in (0, 10, 100, 1000):
+        main.GAME_PROGRESSION.clear()
+        main.GAME_PROGRESSION.update(original_games)
+        for i in range(extra):
+            main.GAME_PROGRESSION[f'extra_game_{i}'] = dict(
+                original_games['clickmaster'], order=100 + i, coins_required=i)
+
+        with common.count_queries() as counter:
+            games_info, user_coins, boss_available = main.get_dashboard_data(user_id)
+        assert len(games_info) == len(main.GAME_PROGRESSION)
+        query_counts[len(main.GAME_PROGRESSION)] = counter['queries']
+
+        runs = 200
+        with common.timer(f"{len(main.GAME_PROGRESSION):5d} games, {counter['queries']} queries", runs):
+            for _ in range(runs):
+                main.get_dashboard_data(user_id)
+
+    main.GAME_PROGRESSION.clear()
+    main.GAME_PROGRESSION.update(original_games)
+
+# The same queries for 7 games as for 1007
+assert len(set(query_counts.values())) == 1, query_counts
+print("OK")
@@ -0,0 +1,139 @@
+"""Load test idle pages: polling /user/coins versus the /events stream.
+
+Opens many idle logged-in pages against asgi.py, first polling the way
+coin_display.js used to (sped up to once a second so the test is short),
+then holding one /events stream each. Counts the requests the server
+handled in the same window, then changes every player's coins and times
+how long the pushed update takes to arrive.
+
+    python benchmarks/bench_events.py [clients] [seconds]
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import httpx
+import uvicorn
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+import common
+from common import db, main
+import asgi
+
+clients = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+window = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+poll_interval = 1  # coin_display.js polled every 30 seconds
+
+app = common.make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'events.db')}",
+                      engine_options={'connect_args': {'timeout': 30}}, with_routes=True)
+with app.app_context():
+    password = generate_password_hash('pw')
+    db.session.execute(insert(main.User), [
+        {'username': f'player{i}', 'password': password} for i in range(clients)])
+    db.session.execute(insert(main.PlayerCoins), [
+        {'user_id': i + 1, 'coins': 0} for i in range(clients)])
+    db.session.commit()
+
+# Log every player in by signing their session cookie directly
+serializer = app.session_interface.get_signing_serializer(app)
+cookies = {user_id: serializer.dumps({'_user_id': str(user_id), '_fresh': True})
+           for user_id in range(1, clients + 1)}
+
+requests_seen = Counter()
+flask_asgi = asgi.make_asgi_app(app)
+
+
+async def counting_app(scope, receive, send):
+    if scope['type'] == 'http':
+        requests_seen[scope['path']] += 1
+    await flask_asgi(scope, receive, send)
+
+
+with socket.socket() as sock:
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+server = uvicorn.Server(uvicorn.Config(counting_app, host='127.0.0.1', port=port,
+                                       log_level='warning', lifespan='off', timeout_keep_alive=60))
+threading.Thread(target=server.run, daemon=True).start()
+while not server.started:
+    time.sleep(0.01)
+
+
+def http_client():
+    return httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=60,
+                             limits=httpx.Limits(max_connections=clients + 10))
+
+
+async def polling_pages():
+    async with http_client() as client:
+        async def page(user_id):
+            deadline = time.perf_counter() + window
+            while time.perf_counter() < deadline:
+                response = await client.get('/user/coins', headers={'Cookie': f'session={cookies[user_id]}'})
+                assert response.status_code == 200
+                await asyncio.sleep(poll_interval)
+        await asyncio.gather(*(page(user_id) for user_id in cookies))
+
+
+async def streaming_pages():
+    received = {}
+    connected = asyncio.Event()
+
+    async with http_client() as client:
+        async def page(user_id):
+            headers = {'Cookie': f'session={cookies[user_id]}'}
+            async with client.stream('GET', '/events', headers=headers) as response:
+                assert response.status_code == 200
+                event_type = None
+                async for line in response.aiter_lines():
+                    if line.startswith('event: '):
+                        event_type = line[7:]
+                    elif line.startswith('data: ') and event_type == 'coins':
+                        if connected.is_set():
+                            received[user_id] = time.perf_counter()
+                            return
+
+        pages = [asyncio.ensure_future(page(user_id)) for user_id in cookies]
+        await asyncio.sleep(window)
+        connected.set()
+        idle_requests = sum(requests_seen.values())
+        streams = main.event_broker.subscriber_count()
+        threads = threading.active_count()
+
+        # Change everyone's coins from a request thread, as a game route would
+        committed = {}
+
+        def award_everyone():
+            with app.app_context():
+                for user_id in cookies:
+                    main.credit_coins(user_id, 5, source='bench_events')
+                    committed[user_id] = time.perf_counter()
+                    db.session.commit()
+        await asyncio.to_thread(award_everyone)
+        await asyncio.wait_for(asyncio.gather(*pages), timeout=30)
+        latencies = sorted(received[user_id] - committed[user_id] for user_id in received)
+    return idle_requests, streams, threads, latencies
+
+
+print(f"{clients} idle pages for {window:.0f}s")
+asyncio.run(polling_pages())
+polling_requests = sum(requests_seen.values())
+print(f"  polling every {poll_interval}s: {polling_requests} requests "
+      f"({polling_requests / clients:.1f} per page)")
+
+requests_seen.clear()
+idle_requests, streams, threads, latencies = asyncio.run(streaming_pages())
+print(f"  /events streams:    {idle_requests} requests ({idle_requests / clients:.1f} per page), "
+      f"{streams} streams open on {threads} threads")
+print(f"  pushed {len(latencies)} coin updates, latency p50 {latencies[len(latencies) // 2] * 1000:.0f}ms, "
+      f"max {latencies[-1] * 1000:.0f}ms")
+assert len(latencies) == clients
+assert streams == clients and idle_requests == clients
+print("OK")
+server.should_exit = True
@@ -0,0 +1,143 @@
+"""Time per page of /user/transactions and /user/scores deep into one
+player's history (1M rows of each by default), compared with fetching the
+same page with OFFSET, then checks that walking the cursors returns every
+row exactly once, that filters match, and that the coin history carries on
+into archived daily totals.
+
+    python benchmarks/bench_history_pages.py [rows]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert
+
+import common
+from common import db, main
+
+rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+page_size = 50
+depths = [1, 10, 100, 1000, rows * 9 // 10 // page_size - 1]  # Player 1 has 9 rows in 10
+sources = ['clickmaster_play', 'space_dodger_play', 'emoji_memory_play', 'coin_cruncher']
+games = ['clickmaster', 'space_dodger', 'emoji_memory']
+
+app = common.make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'history.db')}",
+                      with_routes=True, profile='production')
+rng = random.Random(3)
+start = datetime(2026, 1, 1)
+span = timedelta(seconds=rows // 3 * 10)  # Three rows every 10 seconds
+
+with common.timer(f"Seeding {rows:,} transactions and scores for one player"):
+    with app.app_context():
+        db.session.execute(insert(main.User), [{'username': f'player{i}', 'password': 'x'} for i in range(3)])
+        db.session.execute(insert(main.PlayerCoins), [{'user_id': i, 'coins': 0} for i in (1, 2, 3)])
+        for offset in range(0, rows, 50_000):
+            # Several rows share each second, so ties on the timestamp are covered
+            batch = range(offset, min(offset + 50_000, rows))
+            db.session.execute(insert(main.CoinTransaction), [
+                {'user_id': 1 if i % 10 else 2, 'amount': 1, 'source': rng.choice(sources),
+                 'timestamp': start + timedelta(seconds=i // 3 * 10)} for i in batch])
+            db.session.execute(insert(main.Score), [
+                {'user_id': 1 if i % 10 else 2, 'game': rng.choice(games), 'score': i,
+                 'date': start + timedelta(seconds=i // 3 * 10)} for i in batch])
+        db.session.commit()
+        db.session.execute(db.text('ANALYZE'))
+
+client = app.test_client()
+serializer = app.session_interface.get_signing_serializer(app)
+client.set_cookie('session', serializer.dumps({'_user_id': '1', '_fresh': True}))
+
+
+def walk(url, key, pages=None):
+    """Follow next_cursor from the first page, returning the cursors and rows seen"""
+    cursors, seen, cursor = [None], [], None
+    while pages is None or len(cursors) <= pages:
+        data = client.get(url + (f"&cursor={cursor}" if cursor else '')).json
+        seen += data[key]
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+        cursors.append(cursor)
+    return cursors, seen
+
+
+def offset_page(model, time_column, depth):
+    with app.app_context():
+        return model.query.filter(model.user_id == 1) \
+                          .order_by(time_column.desc(), model.id.desc()) \
+                          .offset(depth * page_size).limit(page_size).all()
+
+
+with app.app_context():
+    engine = db.engine
+statements = [0]
+event.listen(engine, 'before_cursor_execute', lambda *args: statements.__setitem__(0, statements[0] + 1))
+
+for url, key, model, time_column in [
+        (f'/user/transactions?limit={page_size}', 'transactions', main.CoinTransaction, main.CoinTransaction.timestamp),
+        (f'/user/scores?limit={page_size}', 'scores', main.Score, main.Score.date)]:
+    with common.timer(f"Walking {depths[-1]:,} pages of {url.split('?')[0]}"):
+        cursors, seen = walk(url, key, depths[-1])
+    print(f"{'page':>8} {'cursor':>10} {'offset':>10} {'queries':>8}")
+    cursor_times = []
+    for depth in depths:
+        started = time.perf_counter()
+        statements[0] = 0
+        for _ in range(20):
+            page = client.get(url + (f"&cursor={cursors[depth]}" if cursors[depth] else '')).json[key]
+        cursor_time = (time.perf_counter() - started) / 20
+        started = time.perf_counter()
+        expected = offset_page(model, time_column, depth)
+        offset_time = time.perf_counter() - started
+        assert [row['id'] for row in page] == [row.id for row in expected]
+        cursor_times.append(cursor_time)
+        print(f"{depth:>8,} {cursor_time * 1000:>8.2f}ms {offset_time * 1000:>8.2f}ms {statements[0] / 20:>8.1f}")
+    # The last page costs about what the first does, however deep it is
+    assert max(cursor_times) < min(cursor_times) * 3, cursor_times
+
+# Every row exactly once, newest first, on a smaller player with ties
+client.set_cookie('session', serializer.dumps({'_user_id': '2', '_fresh': True}))
+_, seen = walk('/user/transactions?limit=7', 'transactions')
+keys = [(row['timestamp'], row['id']) for row in seen]
+assert keys == sorted(keys, reverse=True) and len(set(keys)) == len(keys) == rows // 10
+_, seen = walk('/user/scores?game=clickmaster&from=2026-01-02&to=2026-01-03&limit=9', 'scores')
+with app.app_context():
+    expected = main.Score.query.filter(main.Score.user_id == 2, main.Score.game == 'clickmaster',
+                                       main.Score.date >= datetime(2026, 1, 2),
+                                       main.Score.date < datetime(2026, 1, 4)).count()
+assert len(seen) == expected and all(row['game'] == 'clickmaster' for row in seen)
+print(f"Player 2: {rows // 10:,} transactions walked in order, {expected} filtered scores")
+
+# Compacted history carries on as daily totals after the live transactions
+with app.app_context():
+    main.checkpoint_coin_ledger()
+    # Archive the older half of the seeded history
+    main.COIN_LEDGER_CONFIG['archive_after_days'], archive_after_days = \
+        (datetime.now() - (start + span / 2)).days, main.COIN_LEDGER_CONFIG['archive_after_days']
+    main.compact_coin_ledger()
+    main.COIN_LEDGER_CONFIG['archive_after_days'] = archive_after_days
+_, seen = walk('/user/transactions?limit=7', 'transactions')
+live = [row for row in seen if not row['archived']]
+archived = [row for row in seen if row['archived']]
+assert seen == live + archived and live and archived
+assert sum(row['transactions'] for row in archived) + len(live) == rows // 10
+print(f"Player 2 after compaction: {len(live)} live transactions then {len(archived)} daily totals")
+
+# Rows timed by the column default (CURRENT_TIMESTAMP, stored without
+# microseconds), many in the same second
+with app.app_context():
+    db.session.execute(insert(main.CoinTransaction), [{'user_id': 3, 'amount': 1, 'source': 'daily_bonus'}] * 25)
+    db.session.execute(insert(main.Score), [{'user_id': 3, 'game': 'clickmaster', 'score': i} for i in range(25)])
+    db.session.commit()
+client.set_cookie('session', serializer.dumps({'_user_id': '3', '_fresh': True}))
+for url, key in [('/user/transactions?limit=10', 'transactions'), ('/user/scores?limit=10', 'scores')]:
+    cursors, seen = walk(url, key, 10)
+    assert len(cursors) == 3 and len({row['id'] for row in seen}) == len(seen) == 25, (url, cursors)
+print("Player 3: 25 rows from the same second walked in 3 pages")
+
+assert client.get('/user/transactions?cursor=nonsense').status_code == 400
+assert client.get('/user/scores?limit=1000').status_code == 400
+print("OK")
@@ -0,0 +1,84 @@
+"""Queries and time per request for the logged-in user lookup, with the
+identity cache (main.identity_cache) on and off, then checks it stays
+correct: balances changed in this process show up at once, a renamed user
+is reloaded, and a game unlocked by another worker isn't refused.
+
+    python benchmarks/bench_identity_cache.py [requests]
+"""
+import sys
+import time
+
+from sqlalchemy import event, update
+
+import common
+from common import db, main
+
+requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+cache = main.identity_cache
+
+app = common.make_app(with_routes=True)
+with app.app_context():
+    user_id = common.create_user('cached', coins=500)
+client = app.test_client()
+serializer = app.session_interface.get_signing_serializer(app)
+client.set_cookie('session', serializer.dumps({'_user_id': str(user_id), '_fresh': True}))
+
+
+# Count statements on the engine directly: requests made while an app
+# context is pushed would share its g, and with it the loaded user
+with app.app_context():
+    engine = db.engine
+statements = [0]
+event.listen(engine, 'before_cursor_execute', lambda *args: statements.__setitem__(0, statements[0] + 1))
+
+
+def measure(path, ttl):
+    cache.clear()
+    cache.ttl = ttl
+    statements[0] = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        assert client.get(path).status_code == 200
+    elapsed = time.perf_counter() - start
+    return statements[0] / requests, requests / elapsed
+
+
+# Before the cache these requests ran 2 queries: the User row, then PlayerCoins
+paths = ['/user/coins', '/games/space_dodger']
+ttl = cache.ttl
+uncached = {path: measure(path, 0) for path in paths}
+cache.hits = cache.misses = 0
+cached = {path: measure(path, ttl) for path in paths}
+for path in paths:
+    print(f"{path:20} no cache: {uncached[path][0]:.2f} queries, {uncached[path][1]:,.0f} req/s   "
+          f"cache: {cached[path][0]:.2f} queries, {cached[path][1]:,.0f} req/s")
+    assert cached[path][0] < 0.01
+print("Identity cache:", cache.stats())
+assert cache.stats()['hit_rate'] > 0.99
+
+with app.app_context():
+    # A balance change committed in this process updates the cached balance
+    main.credit_coins(user_id, 25, source='bench_identity_cache')
+    db.session.commit()
+statements[0] = 0
+assert client.get('/user/coins').json['coins'] == 525
+assert statements[0] == 0
+
+with app.app_context():
+
+    # Changing the user row drops the cached copy
+    db.session.get(main.User, user_id).username = 'renamed'
+    db.session.commit()
+    assert main.get_identity(user_id)[1] == 'renamed'
+
+    # Another worker spends coins and then earns enough for a locked game:
+    # the stale cached balance must not turn the player away
+    db.session.execute(update(main.PlayerCoins).where(main.PlayerCoins.user_id == user_id).values(coins=0))
+    db.session.commit()
+    main.get_identity(user_id, refresh=True)
+    db.session.execute(update(main.PlayerCoins).where(main.PlayerCoins.user_id == user_id).values(coins=500))
+    db.session.commit()
+    assert main.get_identity(user_id)[2] == 0
+assert client.get('/games/space_dodger').status_code == 200
+assert main.get_identity(user_id)[2] == 500
+print("OK")
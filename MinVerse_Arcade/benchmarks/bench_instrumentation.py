@@ -0,0 +1,100 @@
+"""Requests per second with request instrumentation (instrumentation.py) off
+and on, then checks what it records: per-route query counts at /metrics,
+one JSON log line per request, and a folded stacks file for a slow request.
+
+    python benchmarks/bench_instrumentation.py [requests]
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import common
+import instrumentation
+from common import main
+
+requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+paths = ['/', '/user/coins', '/api/leaderboard/clickmaster']
+
+
+def make_client(app):
+    with app.app_context():
+        user_id = common.create_user('measured', coins=500)
+    client = app.test_client()
+    serializer = app.session_interface.get_signing_serializer(app)
+    client.set_cookie('session', serializer.dumps({'_user_id': str(user_id), '_fresh': True}))
+    return client
+
+
+def measure(client):
+    rates = {}
+    for path in paths:
+        start = time.perf_counter()
+        for _ in range(requests):
+            assert client.get(path).status_code == 200
+        rates[path] = requests / (time.perf_counter() - start)
+    return rates
+
+
+def crunch():
+    # Stands in for a slow view
+    deadline = time.perf_counter() + 0.15
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+    return 'done'
+
+
+plain = make_client(common.make_app(with_routes=True))
+off = measure(plain)
+
+profiles = tempfile.mkdtemp()
+app = common.make_app(with_routes=True)
+app.add_url_rule('/bench/slow', 'bench_slow', crunch)
+lines = []
+handler = logging.Handler()
+handler.emit = lambda record: lines.append(record.getMessage())
+instrumentation.logger.addHandler(handler)
+instrumentation.logger.setLevel(logging.INFO)
+instrumentation.logger.propagate = False  # Keep the lines out of the console
+metrics = instrumentation.install(app, log_requests=True, slow_request_ms=100, profile_dir=profiles)
+main.identity_cache.clear()  # Both apps have a user 1
+client = make_client(app)
+on = measure(client)
+
+for path in paths:
+    print(f"{path:30} off: {off[path]:6,.0f} req/s   on: {on[path]:6,.0f} req/s "
+          f"({(off[path] - on[path]) / off[path]:+.0%} overhead)")
+# Rates are noisy on a shared machine, only catch something badly wrong
+assert all(on[path] > off[path] * 0.5 for path in paths)
+
+# Every request is counted, with its queries. /user/coins is served from the
+# identity cache, so its only queries came from the first request
+text = client.get('/metrics').text
+assert f'arcade_requests_total{{route="/user/coins",method="GET",status="200"}} {requests}' in text
+assert 'arcade_request_duration_seconds_bucket{route="/",le="+Inf"} %d' % requests in text
+queries = {line.split('"')[1]: int(line.split()[-1]) for line in text.splitlines()
+           if line.startswith('arcade_request_queries_total{')}
+print("Queries per request:", {route: round(n / requests, 2) for route, n in queries.items()})
+assert queries['/user/coins'] < 5
+assert queries['/'] >= requests
+assert 'arcade_identity_cache_hits_total' not in text  # Only main.app adds the cache gauges
+
+# One JSON line per request
+assert len(lines) == len(paths) * requests + 1
+entry = json.loads(lines[0])
+assert entry['route'] == '/' and entry['status'] == 200 and entry['queries'] > 0
+print("Log line:", lines[0])
+
+# A slow request leaves its stacks behind, fast ones don't
+assert os.listdir(profiles) == []
+assert client.get('/bench/slow').text == 'done'
+[profile] = os.listdir(profiles)
+with open(os.path.join(profiles, profile)) as f:
+    stacks = [line.rsplit(' ', 1) for line in f]
+samples = sum(int(count) for _, count in stacks)
+in_view = sum(int(count) for stack, count in stacks if 'crunch (' in stack)
+print(f"Slow request profile {profile}: {samples} samples, {in_view} in the view")
+assert samples > 5 and in_view / samples > 0.8
+print("OK")
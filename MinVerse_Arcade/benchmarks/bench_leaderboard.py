@@ -0,0 +1,50 @@
+"""Leaderboard load, update, top-N and rank lookup times at 100k users.
+
+    python benchmarks/bench_leaderboard.py [users]
+"""
+import random
+import sys
+
+import common
+from common import db, main
+
+from leaderboard import Leaderboard
+
+users = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+rows = [(user_id, random.randint(0, 1000)) for user_id in range(1, users + 1)]
+
+board = Leaderboard(size=10)
+with common.timer(f"Load {users:,} users"):
+    board.load(rows)
+
+runs = 10_000
+with common.timer("Score updates", runs):
+    for _ in range(runs):
+        board.update(random.randint(1, users), random.randint(0, 1200))
+
+with common.timer("Top 10 reads", runs):
+    for _ in range(runs):
+        board.top()
+
+with common.timer("Rank lookups", runs):
+    for _ in range(runs):
+        board.rank(random.randint(1, users))
+
+# Compare with ranking in SQL from the UserStats table on every request
+app = common.make_app()
+with app.app_context():
+    db.session.execute(db.insert(main.UserStats), [
+        {'user_id': user_id, 'game': 'clickmaster', 'best_score': score,
+         'play_count': 1, 'has_clue': False} for user_id, score in rows])
+    db.session.commit()
+
+    sql_runs = 100
+    with common.timer("SQL rank lookups (COUNT of better scores)", sql_runs):
+        for _ in range(sql_runs):
+            score = random.randint(0, 1000)
+            db.session.query(db.func.count(main.UserStats.id)) \
+                .filter(main.UserStats.game == 'clickmaster',
+                        main.UserStats.best_score > score).scalar()
+
+    with common.timer("Load clickmaster board from UserStats"):
+        main.get_leaderboard('clickmaster')
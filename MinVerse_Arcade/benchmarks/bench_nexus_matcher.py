@@ -0,0 +1,31 @@
+"""Time the compiled NEXUS keyword matcher against the original substring
+checks on long pasted messages. tests/test_nexus_matcher.py checks they
+agree.
+
+    python benchmarks/bench_nexus_matcher.py
+"""
+import common
+
+from game_constants import NEXUS_WEAKNESS_KEYWORDS
+from keyword_matcher import KeywordMatcher
+
+matcher = KeywordMatcher(NEXUS_WEAKNESS_KEYWORDS)
+
+
+def original_categories(user_message):
+    """The per-category `any(word in user_message.lower() ...)` checks the
+    matcher replaced"""
+    return {category for category, words in NEXUS_WEAKNESS_KEYWORDS.items()
+            if any(word in user_message.lower() for word in words)}
+
+
+filler = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor. "
+for size in (100, 10_000, 100_000):
+    message = (filler * (size // len(filler) + 1))[:size - 30] + " pattern and cold climate"
+    runs = max(10, 200_000 // size)
+    with common.timer(f"{size:>7,} chars original", runs):
+        for _ in range(runs):
+            original_categories(message)
+    with common.timer(f"{size:>7,} chars matcher ", runs):
+        for _ in range(runs):
+            matcher.match(message)
@@ -0,0 +1,110 @@
+"""Login latency and the latency of an unrelated route during a login
+flood, with passwords hashed on the request threads vs main.password_hasher's
+worker processes. Also checks that a password stored with old hash settings
+is rehashed on login.
+
+    python benchmarks/bench_password_hashing.py [flood threads] [seconds]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+import common
+from common import db, main
+from passwords import PasswordHasher, hash_settings
+
+threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 15
+config = main.PASSWORD_HASH_CONFIG
+
+app = common.make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'logins.db')}",
+                      with_routes=True, profile='production')
+stored = generate_password_hash('hunter22', config['method'])
+with app.app_context():
+    db.session.execute(insert(main.User), [{'username': f'player{i}', 'password': stored} for i in range(threads)])
+    db.session.execute(insert(main.User), [{'username': 'legacy', 'password': generate_password_hash('old', 'scrypt')}])
+    db.session.commit()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else float('nan')
+
+
+def run(label, hasher):
+    main.password_hasher = hasher
+    done = threading.Event()
+    logins, statuses, probes = [], Counter(), []
+
+    def flood(i):
+        client = app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            response = client.post('/login', data={'username': f'player{i}', 'password': 'hunter22'})
+            statuses[response.status_code] += 1
+            if response.status_code == 302:
+                logins.append(time.perf_counter() - started)
+            elif response.status_code == 503:
+                time.sleep(0.2)  # Browsers don't retry instantly either
+
+    def probe():
+        # A player already logged in, browsing while the flood goes on
+        client = app.test_client()
+        serializer = app.session_interface.get_signing_serializer(app)
+        client.set_cookie('session', serializer.dumps({'_user_id': '1', '_fresh': True}))
+        while not done.is_set():
+            started = time.perf_counter()
+            assert client.get('/user/clues').status_code == 200
+            probes.append(time.perf_counter() - started)
+            time.sleep(0.05)
+
+    workers = [threading.Thread(target=flood, args=(i,)) for i in range(threads)]
+    workers.append(threading.Thread(target=probe))
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    done.set()
+    for worker in workers:
+        worker.join()
+    hasher.stop()
+    print(f"{label}: {len(logins)} logins, p50 {percentile(logins, 0.5):,.0f}ms p99 {percentile(logins, 0.99):,.0f}ms, "
+          f"{statuses[503]} turned away | /user/clues p50 {percentile(probes, 0.5):,.0f}ms "
+          f"p99 {percentile(probes, 0.99):,.0f}ms ({len(probes)} requests)")
+    return statuses, probes
+
+
+print(f"{threads} clients logging in over and over for {seconds:g}s, {config['method']}")
+inline_statuses, inline_probes = run("On request threads  ", PasswordHasher(config['method'], workers=0, max_pending=10_000))
+pool_statuses, pool_probes = run("Worker processes    ", PasswordHasher(config['method'], workers=config['workers'],
+                                                                        max_pending=config['max_pending'],
+                                                                        timeout=config['timeout']))
+assert inline_statuses[503] == 0 and pool_statuses[503] > 0 and pool_statuses[302] > 0
+assert percentile(pool_probes, 0.99) < percentile(inline_probes, 0.99)
+
+# Turned away quickly rather than after waiting for a hash
+hasher = main.password_hasher = PasswordHasher(config['method'], workers=1, max_pending=1)
+slow = threading.Thread(target=lambda: hasher.hash('x'))
+slow.start()
+time.sleep(0.1)
+started = time.perf_counter()
+assert app.test_client().post('/login', data={'username': 'player0', 'password': 'hunter22'}).status_code == 503
+print(f"Rejected in {(time.perf_counter() - started) * 1000:.1f}ms while the pool is full")
+slow.join()
+
+# A hash made with other settings is replaced at login, once
+client = app.test_client()
+assert client.post('/login', data={'username': 'legacy', 'password': 'old'}).status_code == 302
+assert client.post('/login', data={'username': 'legacy', 'password': 'old'}).status_code == 302
+with app.app_context():
+    assert main.User.query.filter_by(username='legacy').first().password.startswith(
+        hash_settings(config['method']) + '$')
+assert hasher.stats()['rehashed'] == 1
+hasher.stop()
+print("Old scrypt hash replaced with", hash_settings(config['method']))
+print("OK")
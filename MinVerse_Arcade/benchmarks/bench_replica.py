@@ -0,0 +1,124 @@
+"""Mixed read/write load with and without a read replica, using two local
+SQLite files for primary and replica and db_routing.copy_sqlite as the
+replication. Half the players only browse (dashboard, profile, coins and
+clues), the other half also post ClickMaster scores. Reports requests per
+second, how many SQL statements each database served, and checks replica
+lag behaves as documented: other readers may see old data, the player who
+made a change does not.
+
+    python benchmarks/bench_replica.py [threads] [seconds]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event, insert
+
+import common
+from common import db, main
+from db_routing import copy_sqlite
+
+threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+reads = ['/', '/profile', '/user/coins', '/user/clues']
+write_share = 0.3  # For the players who are playing
+
+
+def make_app(with_replica):
+    folder = tempfile.mkdtemp()
+    primary = os.path.join(folder, 'primary.db')
+    replica = os.path.join(folder, 'replica.db')
+    app = common.make_app(f"sqlite:///{primary}", with_routes=True, profile='production',
+                          replica_uri=f"sqlite:///{replica}" if with_replica else None)
+    with app.app_context():
+        db.session.execute(insert(main.User), [
+            {'username': f'player{i}', 'password': 'x'} for i in range(threads + 1)])
+        db.session.execute(insert(main.PlayerCoins), [
+            {'user_id': i + 1, 'coins': 0} for i in range(threads + 1)])
+        db.session.commit()
+    if with_replica:
+        copy_sqlite(primary, replica)
+    return app, primary, replica
+
+
+def client_for(app, user_id):
+    client = app.test_client()
+    serializer = app.session_interface.get_signing_serializer(app)
+    client.set_cookie('session', serializer.dumps({'_user_id': str(user_id), '_fresh': True}))
+    return client
+
+
+def run(with_replica):
+    app, primary, replica = make_app(with_replica)
+    statements = Counter()
+    with app.app_context():
+        for name, engine in db.engines.items():
+            event.listen(engine, 'before_cursor_execute',
+                         lambda *args, name=name: statements.update([name or 'primary']))
+
+    done = threading.Event()
+    requests = Counter()
+
+    def replicate():
+        # Copy the primary every second, like a replica running a second behind
+        while not done.wait(1):
+            copy_sqlite(primary, replica)
+
+    def player(user_id):
+        client = client_for(app, user_id)
+        rng = random.Random(user_id)
+        playing = user_id % 2 == 0
+        while not done.is_set():
+            if playing and rng.random() < write_share:
+                response = client.post('/games/clickmaster', json={'score': rng.randint(0, 60)})
+                requests['writes'] += 1
+            else:
+                response = client.get(rng.choice(reads))
+                requests['reads'] += 1
+            assert response.status_code == 200, response.status_code
+
+    workers = [threading.Thread(target=player, args=(user_id,)) for user_id in range(1, threads + 1)]
+    if with_replica:
+        workers.append(threading.Thread(target=replicate))
+    with contextlib.redirect_stdout(io.StringIO()):  # The ClickMaster route prints every score
+        for worker in workers:
+            worker.start()
+        time.sleep(seconds)
+        done.set()
+        for worker in workers:
+            worker.join()
+
+    label = 'primary + replica' if with_replica else 'primary only     '
+    print(f"{label}: {requests['reads'] / seconds:6,.0f} reads/s {requests['writes'] / seconds:5,.0f} writes/s, "
+          f"statements: {dict(statements)}")
+    return app, primary, replica
+
+
+run(with_replica=False)
+app, primary, replica = run(with_replica=True)
+
+# Lag: a player who didn't make the change reads the replica's copy...
+user_id = threads + 1
+with app.app_context():
+    db.session.add(main.DiscoveredClue(user_id=user_id, game_name='fliptext', clue_id=1))
+    db.session.commit()
+bystander = client_for(app, user_id)
+assert len(bystander.get('/user/clues').json['clues']) == 0
+copy_sqlite(primary, replica)
+assert len(bystander.get('/user/clues').json['clues']) == 1
+print("Replica lag: a clue found outside the player's requests shows up after the next copy")
+
+# ...but the player who changed something reads their own writes from the primary
+player = client_for(app, user_id)
+with contextlib.redirect_stdout(io.StringIO()):
+    assert player.post('/games/clickmaster', json={'score': 42}).json['show_clue']
+assert len(player.get('/user/clues').json['clues']) == 2
+assert len(bystander.get('/user/clues').json['clues']) == 1
+print("Read your writes: the player sees their new clue straight away, other sessions after the next copy")
+print("OK")
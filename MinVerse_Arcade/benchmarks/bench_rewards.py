@@ -0,0 +1,37 @@
+"""Measure reward throughput per game, with and without the database.
+
+    python benchmarks/bench_rewards.py
+"""
+import common
+from common import db, main
+
+from rewards import evaluate_reward
+
+# A rewarding event for every game in GAME_REWARDS
+EVENTS = {
+    'clickmaster': {'score': 42},
+    'fliptext': {'score': 17, 'input': 'hello NEXUS!!', 'output': 'HELLO nexus!!'},
+    'emoji_memory': {'score': 8},
+    'space_dodger': {'score': 520},
+    'weather_wizard': {'temperature': 12},
+    'ai_trivia': {'question': 'Which robot was built first?'},
+    'boss_battle': {'score': 1},
+}
+
+runs = 500
+print("Rule evaluation only:")
+for game, event in EVENTS.items():
+    with common.timer(f"  {game:15s}", runs * 10):
+        for _ in range(runs * 10):
+            evaluate_reward(game, event)
+
+app = common.make_app()
+with app.app_context():
+    print("Full awards (one commit each):")
+    for game, event in EVENTS.items():
+        user_id = common.create_user(username=f'bench_{game}')
+        with common.count_queries() as counter:
+            main.grant_reward(user_id, game, **event)
+        with common.timer(f"  {game:15s} {counter['queries']} statements", runs):
+            for _ in range(runs):
+                main.grant_reward(user_id, game, **event)
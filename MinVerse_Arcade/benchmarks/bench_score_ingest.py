@@ -0,0 +1,125 @@
+"""Compare game-over throughput with one commit per score against the
+write-behind score queue, then check nothing was lost: Score rows, UserStats
+best scores and play counts, and coin balances against the ledger. Also
+checks backpressure with a tiny queue and a slow writer, and that stopping
+the writer (what happens at shutdown) saves queued scores.
+
+    python benchmarks/bench_score_ingest.py [plays] [threads]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import common
+from common import db, main
+from ingest import BatchWriter
+from sqlalchemy import insert
+
+plays = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+players = 200
+config = main.SCORE_INGEST_CONFIG
+
+random.seed(1)
+games = [(random.randint(1, players), *random.choice([('clickmaster', random.randint(0, 60)),
+                                                      ('space_dodger', random.randint(0, 600)),
+                                                      ('emoji_memory', random.randint(0, 8))]))
+         for _ in range(plays)]
+
+
+def make_app(name):
+    # Threads need a shared file database, an in-memory one is per connection
+    app = common.make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), name)}",
+                          engine_options={'connect_args': {'timeout': 60}})
+    with app.app_context():
+        db.session.execute(insert(main.User), [
+            {'username': f'player{i}', 'password': 'x'} for i in range(players)])
+        db.session.execute(insert(main.PlayerCoins), [
+            {'user_id': i + 1, 'coins': 0} for i in range(players)])
+        db.session.commit()
+    return app
+
+
+def check(app):
+    """Assert every play from games was saved"""
+    expected = defaultdict(list)
+    for user_id, game, score in games:
+        expected[(user_id, game)].append(score)
+    with app.app_context():
+        assert main.Score.query.count() == plays
+        stats = {(row.user_id, row.game): row for row in main.UserStats.query}
+        for key, scores in expected.items():
+            assert stats[key].play_count == len(scores) and stats[key].best_score == max(scores), key
+        balances = dict(db.session.query(main.PlayerCoins.user_id, main.PlayerCoins.coins))
+        ledger = dict(db.session.query(main.CoinTransaction.user_id, db.func.sum(main.CoinTransaction.amount))
+                      .group_by(main.CoinTransaction.user_id))
+        assert all(balances[user_id] == ledger.get(user_id, 0) for user_id in balances)
+
+
+def run(app, write_behind):
+    config['write_behind'] = write_behind
+
+    # Players are spread over the threads, each one's games end one after another
+    by_player = defaultdict(list)
+    for user_id, name, score in games:
+        by_player[user_id].append((name, score))
+
+    def play(user_id):
+        for name, score in by_player[user_id]:
+            with app.app_context():
+                main.grant_reward(user_id, name, score=score)
+
+    label = 'write-behind queue' if write_behind else 'commit per score '
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(play, by_player))
+    elapsed = time.perf_counter() - start
+    main.score_writer.flush()
+    total = time.perf_counter() - start
+    print(f"{label}: {plays / elapsed:,.0f} plays/s answered, "
+          f"{plays / total:,.0f} scores/s saved ({plays} plays on {threads} threads)")
+    check(app)
+
+
+run(make_app('per_request.db'), write_behind=False)
+run(make_app('write_behind.db'), write_behind=True)
+print("Score writer:", main.score_writer.stats())
+
+# A full queue makes requests wait, then save their own score
+app = make_app('backpressure.db')
+saved = []
+
+
+def slow_write(scores):
+    time.sleep(0.05)
+    main.write_scores(scores)
+    saved.extend(scores)
+
+
+slow_writer = BatchWriter(slow_write, batch_size=5, flush_interval=0.01, queue_size=10, name='slow-writer')
+with app.app_context():
+    slow_writer.start(app.app_context)
+    rejected = 0
+    for user_id, game, score in games[:200]:
+        if not slow_writer.put((user_id, game, score, time.time()), timeout=0.001):
+            main.write_scores([(user_id, game, score, time.time())])
+            rejected += 1
+    slow_writer.flush()
+    assert rejected > 0 and len(saved) + rejected == 200
+    assert main.Score.query.count() == 200
+print(f"Backpressure: {rejected} of 200 scores saved by the request itself with a 10 item queue")
+
+# Stopping the writer saves what is still queued
+lazy_writer = BatchWriter(main.write_scores, flush_interval=60, name='lazy-writer')
+with app.app_context():
+    lazy_writer.start(app.app_context)
+    for user_id, game, score in games[:100]:
+        lazy_writer.put((user_id, game, score, time.time()))
+    lazy_writer.stop()
+    assert main.Score.query.count() == 300
+print("Shutdown: 100 queued scores saved by stop()")
+print("OK")
@@ -0,0 +1,106 @@
+"""Compare SQLite's default settings with the 'production' profile from
+sqlite_tuning.py under several worker processes, the way gunicorn runs the
+app: each process has a few threads loading dashboards and saving game
+results against one database file. Reports operations per second and how
+many requests failed with "database is locked".
+
+    python benchmarks/bench_sqlite_profile.py [processes] [threads] [seconds]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+import common
+from common import db, main
+
+players_per_thread = 20
+write_share = 0.3  # One in three requests saves a game result
+
+
+def worker(uri, profile, process_index, threads, seconds, results):
+    app = common.make_app(uri, profile=profile)
+    # Measure the per-request commit, not the score queue
+    main.SCORE_INGEST_CONFIG['write_behind'] = False
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+    deadline = time.time() + seconds
+
+    def run(thread_index):
+        # Each thread plays its own players, one request at a time per player
+        first = (process_index * threads + thread_index) * players_per_thread + 1
+        user_ids = range(first, first + players_per_thread)
+        rng = random.Random(first)
+        reads = writes = locked = 0
+        while time.time() < deadline:
+            user_id = rng.choice(user_ids)
+            with app.app_context():
+                try:
+                    if rng.random() < write_share:
+                        main.grant_reward(user_id, 'space_dodger', score=rng.randint(0, 600))
+                        writes += 1
+                    else:
+                        main.get_dashboard_data(user_id)
+                        reads += 1
+                except OperationalError as e:
+                    db.session.rollback()
+                    if 'locked' not in str(e):
+                        raise
+                    locked += 1
+        with lock:
+            counts['reads'] += reads
+            counts['writes'] += writes
+            counts['locked'] += locked
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(counts)
+
+
+def run_profile(profile, processes, threads, seconds):
+    uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), f'{profile}.db')}"
+    app = common.make_app(uri, profile=profile)
+    with app.app_context():
+        for i in range(processes * threads * players_per_thread):
+            db.session.add(main.User(username=f'player{i}', password='x'))
+        db.session.commit()
+        db.engine.dispose()
+
+    results = multiprocessing.Queue()
+    pool = [multiprocessing.Process(target=worker, args=(uri, profile, i, threads, seconds, results))
+            for i in range(processes)]
+    for process in pool:
+        process.start()
+    totals = {'reads': 0, 'writes': 0, 'locked': 0}
+    for _ in pool:
+        for key, value in results.get().items():
+            totals[key] += value
+    for process in pool:
+        process.join()
+
+    print(f"{profile:>10}: {totals['reads'] / seconds:8,.0f} reads/s {totals['writes'] / seconds:6,.0f} writes/s "
+          f"{totals['locked']:5} database is locked errors")
+    return totals
+
+
+if __name__ == '__main__':
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    multiprocessing.set_start_method('spawn')
+
+    print(f"{processes} processes x {threads} threads for {seconds:.0f}s, {write_share:.0%} writes")
+    default = run_profile('default', processes, threads, seconds)
+    production = run_profile('production', processes, threads, seconds)
+    speedup = (production['reads'] + production['writes']) / max(1, default['reads'] + default['writes'])
+    print(f"production profile: {speedup:.1f}x the requests")
+    assert production['locked'] == 0
+    print("OK")
@@ -0,0 +1,101 @@
+"""How long `import main` takes now that the OpenAI and requests clients are
+built on first use, against also building the clients as importing used to,
+then the time to the first response and the memory of each worker under
+gunicorn with the app loaded in every worker vs preloaded in the master
+(gunicorn.conf.py). Memory is read from /proc, so Linux only.
+
+    python benchmarks/bench_startup.py [workers] [requests]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+requests = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+env = dict(os.environ, OPENAI_API_KEY=os.getenv('OPENAI_API_KEY', 'benchmark'),
+           DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}")
+
+
+def import_time(code):
+    """Median seconds to run code in a fresh interpreter, and the modules it loaded"""
+    script = ("import sys, time\nstarted = time.perf_counter()\n" + code +
+              "\nprint(time.perf_counter() - started, 'openai' in sys.modules, 'requests' in sys.modules)")
+    runs = [subprocess.run([sys.executable, '-c', script], cwd=root, env=env, capture_output=True,
+                           text=True, check=True).stdout.split() for _ in range(5)]
+    return statistics.median(float(run[0]) for run in runs), runs[0][1] == 'True', runs[0][2] == 'True'
+
+
+lazy, lazy_openai, lazy_requests = import_time("import main")
+eager, _, _ = import_time("import main, api.ai, api.external\napi.ai.get_client(); api.ai.get_async_client()\n"
+                          "api.ai.openai_upstream.retry_on; api.external.weather_upstream.retry_on")
+print(f"import main: {lazy * 1000:.0f}ms (openai loaded: {lazy_openai}, requests loaded: {lazy_requests}), "
+      f"{eager * 1000:.0f}ms with the clients built up front")
+assert not lazy_openai and not lazy_requests and lazy < eager
+
+
+def memory(pid):
+    """Rss, Pss and private kB of a process"""
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        fields = dict((line.split()[0].rstrip(':'), int(line.split()[1])) for line in f if line.split()[1].isdigit())
+    return fields['Rss'], fields['Pss'], fields['Private_Clean'] + fields['Private_Dirty']
+
+
+def children(pid):
+    found = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The name can contain spaces, the parent pid comes after it
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        found.append(int(entry))
+            except (OSError, IndexError):
+                pass
+    return found
+
+
+def serve(preload, port):
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+                               '--workers', str(workers), 'main:create_app()'],
+                              cwd=root, env=dict(env, GUNICORN_PRELOAD='1' if preload else '0'),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    started = time.perf_counter()
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=5).read()
+                break
+            except OSError:
+                assert server.poll() is None, "gunicorn exited"
+                time.sleep(0.02)
+        first_response = time.perf_counter() - started
+        # Spread some page loads over the workers before measuring them
+        for i in range(requests):
+            path = ['/', '/login', '/register', '/static/css/style.css'][i % 4]
+            urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=10).read()
+        pids = children(server.pid)
+        assert len(pids) == workers, pids
+        usage = [memory(pid) for pid in pids]
+        master = memory(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+    rss, pss, private = (statistics.mean(values) / 1024 for values in zip(*usage))
+    label = "Preloaded in the master" if preload else "Loaded in each worker  "
+    print(f"{label}: first response {first_response:.2f}s, per worker RSS {rss:.1f}MB "
+          f"PSS {pss:.1f}MB private {private:.1f}MB, {workers} workers + master "
+          f"{(sum(p for _, p, _ in usage) + master[1]) / 1024:.1f}MB PSS in all")
+    return first_response, private
+
+
+# The preloaded run goes first so the database exists before several
+# workers would set it up at once
+preloaded = serve(True, 8931)
+per_worker = serve(False, 8932)
+assert preloaded[1] < per_worker[1] and preloaded[0] < per_worker[0]
+print("OK")
@@ -0,0 +1,127 @@
+"""Static requests and bytes for a player opening the main pages, first
+visit and repeat visit, with static files served from static/ as before vs
+the fingerprinted, precompressed build from static_assets.build(). A small
+browser cache honours Cache-Control and ETags like a real one would. Also
+checks the encodings and headers of the built files.
+
+    python benchmarks/bench_static_assets.py
+"""
+import gzip
+import os
+import re
+import tempfile
+
+from flask import url_for
+
+import common
+from common import db, main
+from static_assets import StaticAssets, build
+
+pages = ['/', '/profile', '/leaderboard/coins', '/games/clickmaster', '/games/emoji_memory',
+         '/games/fliptext', '/games/space_dodger', '/games/weather_wizard', '/games/ai_trivia', '/victory']
+# Quoted /static/... paths in the page: link and script tags, sounds played on
+# load and the page's SOUND_URLS map, as if every sound in it were played
+asset = re.compile(r'''["'](/static/[^"'$`]+)["']''')
+
+
+class Browser:
+    """Fetches pages and the static files they use, keeping a cache like a
+    browser: fresh entries are used without a request, stale ones revalidated."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+        serializer = app.session_interface.get_signing_serializer(app)
+        self.client.set_cookie('session', serializer.dumps({'_user_id': '1', '_fresh': True}))
+        self.cache = {}
+        self.clock = 0
+
+    def visit(self, pages):
+        """Open each page, returning (static requests, static bytes received)"""
+        requests = received = 0
+        for page in pages:
+            response = self.client.get(page)
+            assert response.status_code == 200, (page, response.status_code)
+            for url in dict.fromkeys(asset.findall(response.text)):
+                cached = self.cache.get(url)
+                if cached and cached['fresh_until'] > self.clock:
+                    continue
+                headers = {'Accept-Encoding': 'br, gzip'}
+                if cached and cached['etag']:
+                    headers['If-None-Match'] = cached['etag']
+                response = self.client.get(url, headers=headers)
+                assert response.status_code in (200, 304), (url, response.status_code)
+                requests += 1
+                received += len(response.data)
+                max_age = response.cache_control.max_age or 0
+                self.cache[url] = {'fresh_until': self.clock + max_age,
+                                   'etag': response.headers.get('ETag') or (cached or {}).get('etag')}
+                response.close()
+        return requests, received
+
+    def later(self, seconds):
+        self.clock += seconds
+
+
+def run(label, app):
+    browser = Browser(app)
+    first = browser.visit(pages)
+    browser.later(3600)  # Back an hour later
+    repeat = browser.visit(pages)
+    print(f"{label}: first visit {first[0]} requests {first[1] / 1024:,.0f}KB, "
+          f"repeat visit {repeat[0]} requests {repeat[1] / 1024:,.0f}KB ({len(browser.cache)} files)")
+    return first, repeat
+
+
+out_dir = tempfile.mkdtemp()
+with common.timer("Building"):
+    manifest = build(os.path.join(main.app.root_path, 'static'), out_dir)
+print(f"{len(manifest['files'])} files, {len(manifest['encodings'])} precompressed")
+
+plain = common.make_app(with_routes=True)
+built = common.make_app(with_routes=True)
+assets = StaticAssets(built, directory=out_dir)
+for app in (plain, built):
+    with app.app_context():
+        db.session.add(main.User(username='player', password='x'))
+        db.session.add(main.PlayerCoins(user_id=1, coins=100_000))
+        db.session.add(main.BossProgress(user_id=1, stage='escape'))
+        db.session.commit()
+
+plain_first, plain_repeat = run("static/ as before", plain)
+built_first, built_repeat = run("Fingerprinted    ", built)
+assert plain_repeat[0] > 0 and built_repeat[0] == 0
+# Files shared by several pages are revalidated on each one without max-age
+assert built_first[0] <= plain_first[0] and built_first[1] < plain_first[1]
+
+# Compressed to what the browser accepts, same bytes once decoded
+client = built.test_client()
+with built.test_request_context():
+    url = url_for('static', filename='css/style.css')
+assert url.startswith('/static/dist/css/style.') and url.endswith('.css')
+with open(os.path.join(main.app.root_path, 'static', 'css', 'style.css'), 'rb') as f:
+    original = f.read()
+response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+assert response.headers['Content-Encoding'] == 'gzip' and response.mimetype == 'text/css'
+assert gzip.decompress(response.data) == original
+assert response.cache_control.immutable and response.cache_control.max_age == 365 * 24 * 3600
+assert 'Accept-Encoding' in response.vary
+response = client.get(url, headers={'Accept-Encoding': 'identity'})
+assert 'Content-Encoding' not in response.headers and response.data == original
+if 'br' in manifest['encodings'].get(url[len('/static/dist/'):], ()):
+    assert client.get(url, headers={'Accept-Encoding': 'gzip, br'}).headers['Content-Encoding'] == 'br'
+print(f"style.css: {len(original):,} bytes, {len(client.get(url, headers={'Accept-Encoding': 'br, gzip'}).data):,} sent")
+
+# Sounds aren't compressed, and paths written in the JS point at the hashed copies
+clickmaster = manifest['files']['js/clickmaster.js']
+with open(os.path.join(out_dir, clickmaster)) as f:
+    assert f"/static/dist/{manifest['files']['media/sounds/click.mp3']}" in f.read()
+response = client.get(f"/static/dist/{manifest['files']['media/sounds/click.mp3']}", headers={'Accept-Encoding': 'gzip'})
+assert response.status_code == 200 and 'Content-Encoding' not in response.headers
+# Sounds picked by name get the hashed copies too
+victory = Browser(built).client.get('/victory').text
+assert f"/static/dist/{manifest['files']['media/sounds/victory-fanfare.mp3']}" in victory
+assert '"/static/media/sounds/' not in victory
+# Files outside the manifest are still served from static/
+assert client.get('/static/css/style.css').status_code == 200
+assert client.get('/static/dist/css/style.000000000000.css').status_code == 404
+print("OK")
@@ -0,0 +1,155 @@
+"""Check the outbound API layer (api/outbound.py) against a local stub
+upstream: keep-alive connection reuse, retries on errors, timeouts, and the
+circuit breaker opening, failing fast and closing again, also after a
+cancelled trial call.
+
+    python benchmarks/check_outbound.py
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+stub = {'mode': 'ok', 'fail_next': 0, 'requests': 0, 'connections': set()}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def do_GET(self):
+        self.answer()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.answer()
+
+    def answer(self):
+        stub['requests'] += 1
+        stub['connections'].add(self.client_address)
+        if stub['mode'] == 'hang':
+            time.sleep(2)
+        if stub['mode'] == 'fail' or stub['fail_next'] > 0:
+            stub['fail_next'] -= 1
+            status, body = 503, {'error': {'message': 'overloaded'}}
+        elif self.command == 'POST':
+            status, body = 200, {
+                'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4',
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {
+                    'role': 'assistant',
+                    'content': json.dumps({'question': 'Is it up?', 'answer': 'Yes'})}}],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}}
+        else:
+            status, body = 200, {'cod': 200, 'name': 'Oslo', 'main': {'temp': 20, 'humidity': 80},
+                                 'weather': [{'description': 'snow'}], 'wind': {'speed': 3}}
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client timed out and hung up
+
+    def log_message(self, *args):
+        pass
+
+
+def reset(mode='ok'):
+    stub.update(mode=mode, fail_next=0, requests=0, connections=set())
+
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+os.environ['WEATHER_API_URL'] = f'http://127.0.0.1:{server.server_port}/weather'
+os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{server.server_port}/v1'
+os.environ['OPENAI_API_KEY'] = 'stub'
+os.environ['WEATHER_READ_TIMEOUT'] = '0.5'
+os.environ['WEATHER_FAILURE_THRESHOLD'] = '3'
+os.environ['WEATHER_RESET_TIMEOUT'] = '1'
+
+import common  # noqa: E402,F401  (sets up the import path)
+from api import ai  # noqa: E402
+from api.external import fetch_weather, fetch_weather_async, weather_upstream  # noqa: E402
+
+# Connections are kept alive and reused
+reset()
+for _ in range(20):
+    assert fetch_weather('Oslo')['temperature'] == 20
+assert stub['requests'] == 20 and len(stub['connections']) == 1, stub
+
+
+async def async_lookups():
+    return await asyncio.gather(*(fetch_weather_async('Oslo') for _ in range(20)))
+reset()
+assert all(result['temperature'] == 20 for result in asyncio.run(async_lookups()))
+assert len(stub['connections']) <= weather_upstream.pool_size, stub
+
+# Brief upstream errors are retried
+reset()
+stub['fail_next'] = 2
+assert fetch_weather('Oslo')['temperature'] == 20
+assert stub['requests'] == 3, stub
+assert weather_upstream.breaker.state == 'closed'
+
+# A hanging upstream costs the read timeout per attempt, not 10 seconds
+reset('hang')
+start = time.perf_counter()
+assert fetch_weather('Oslo')['weather'] == 'Request timed out'
+print(f"Hanging upstream gave up after {time.perf_counter() - start:.1f}s "
+      f"({weather_upstream.retries + 1} attempts)")
+
+# Enough failures in a row open the circuit, after which calls fail fast
+reset('fail')
+while weather_upstream.breaker.state == 'closed':
+    fetch_weather('Oslo')
+requests_when_opened = stub['requests']
+runs = 10_000
+start = time.perf_counter()
+for _ in range(runs):
+    assert fetch_weather('Oslo')['weather'] == 'Weather service unavailable'
+per_call = (time.perf_counter() - start) / runs
+print(f"Open circuit: {per_call * 1_000_000:.1f}us per call")
+assert stub['requests'] == requests_when_opened
+assert per_call < 0.001
+
+# A trial call cancelled before the upstream answers neither closes the
+# circuit nor keeps the trial slot, so the next call gets to try
+time.sleep(1.1)
+
+
+async def cancelled_trial():
+    # A request that hangs until the caller gives up on it
+    trial = asyncio.create_task(weather_upstream.call_async(asyncio.sleep, 10))
+    await asyncio.sleep(0.2)
+    trial.cancel()
+    try:
+        await trial
+    except asyncio.CancelledError:
+        pass
+
+asyncio.run(cancelled_trial())
+assert weather_upstream.breaker.state == 'half_open' and not weather_upstream.breaker.trial_running
+
+# After the reset timeout one trial call goes through and closes the circuit
+reset('ok')
+time.sleep(1.1)
+assert weather_upstream.breaker.state == 'half_open'
+assert fetch_weather('Oslo')['temperature'] == 20
+assert weather_upstream.breaker.state == 'closed'
+print("Weather upstream:", weather_upstream.stats())
+
+# OpenAI calls go through the same layer
+reset()
+stub['fail_next'] = 1
+assert ai.trivia()['question'] == 'Is it up?'
+assert stub['requests'] == 2, stub
+reset('fail')
+assert ai.trivia()['question'] == 'API Error'
+assert stub['requests'] == ai.openai_upstream.retries + 1, stub
+print("OpenAI upstream:", ai.openai_upstream.stats())
+
+print("OK")
+server.shutdown()
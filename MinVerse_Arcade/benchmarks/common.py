@@ -0,0 +1,102 @@
+"""Shared setup for the benchmark scripts.
+
+Run the scripts from the MinVerse_Arcade folder, e.g.
+    python benchmarks/bench_dashboard.py
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Make main.py importable when running a script from the benchmarks folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The OpenAI client refuses to build without a key, benchmarks never call it
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+from flask import Flask
+from sqlalchemy import event
+
+import main
+import sqlite_tuning
+from main import db
+
+
+def make_app(uri='sqlite:///:memory:', engine_options=None, with_routes=False, profile=None,
+             replica_uri=None):
+    """Create a throwaway app bound to its own database so benchmarks never
+    touch the real database.db.
+
+    with_routes mounts every route from main.app (plus login and templates)
+    so the app can be driven with a test client. profile applies one of
+    sqlite_tuning.SQLITE_PROFILES, like main.app does. replica_uri adds a
+    read replica bind (see db_routing.py).
+    """
+    if profile and engine_options is None:
+        engine_options = sqlite_tuning.engine_options(uri, profile)
+    bench_app = Flask('benchmark', root_path=main.app.root_path)
+    bench_app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    bench_app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options or {}
+    bench_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if replica_uri:
+        bench_app.config['SQLALCHEMY_BINDS'] = {main.REPLICA: {
+            'url': replica_uri, **(sqlite_tuning.engine_options(replica_uri, profile) if profile else {})}}
+    db.init_app(bench_app)
+    if profile:
+        with bench_app.app_context():
+            for engine in db.engines.values():
+                sqlite_tuning.install(engine, profile)
+
+    if with_routes:
+        bench_app.config['SECRET_KEY'] = 'benchmark'
+        bench_app.config['TESTING'] = True
+        for rule in main.app.url_map.iter_rules():
+            if rule.endpoint != 'static':
+                bench_app.add_url_rule(rule.rule, rule.endpoint,
+                                       main.app.view_functions[rule.endpoint],
+                                       methods=rule.methods)
+        main.login_manager.init_app(bench_app)
+        bench_app.template_context_processors[None].extend(
+            processor for processor in main.app.template_context_processors[None]
+            if processor not in bench_app.template_context_processors[None])
+    with bench_app.app_context():
+        db.create_all()
+        main.init_game_data()
+    return bench_app
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements sent to the current app's engine."""
+    counter = {'queries': 0}
+
+    def before_cursor_execute(*args):
+        counter['queries'] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextmanager
+def timer(label, operations=None):
+    """Print how long the block took, and the rate if operations is given."""
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    if operations:
+        print(f"{label}: {elapsed:.3f}s ({operations / elapsed:,.0f} ops/s)")
+    else:
+        print(f"{label}: {elapsed:.3f}s")
+
+
+def create_user(username='bench', coins=0):
+    """Add a user with a coin balance and return their id."""
+    user = main.User(username=username, password='x')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(main.PlayerCoins(user_id=user.id, coins=coins))
+    db.session.commit()
+    return user.id
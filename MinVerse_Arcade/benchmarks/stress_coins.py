@@ -0,0 +1,53 @@
+"""Fire thousands of concurrent awards and steals at one player and check
+that the final balance matches the sum of their CoinTransaction rows.
+
+    python benchmarks/stress_coins.py [operations] [threads]
+"""
+import os
+import random
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import common
+from common import db, main
+
+operations = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+# Threads need a shared file database, an in-memory one is per connection
+db_dir = tempfile.mkdtemp()
+app = common.make_app(f"sqlite:///{os.path.join(db_dir, 'stress.db')}",
+                      engine_options={'connect_args': {'timeout': 60}})
+
+with app.app_context():
+    user_id = common.create_user(coins=0)
+
+
+def award_or_steal(i):
+    with app.app_context():
+        if i % 3 == 0:
+            # A Coin Cruncher steal, which takes whatever is left if the player is short
+            stolen, _ = main.cruncher_steal(user_id, random.randint(1, 15))
+            db.session.commit()
+            return 'steal' if stolen else 'missed'
+        main.credit_coins(user_id, random.randint(1, 10), source='stress_award')
+        db.session.commit()
+        return 'award'
+
+
+with common.timer(f"{operations} operations on {threads} threads", operations):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outcomes = list(pool.map(award_or_steal, range(operations)))
+
+with app.app_context():
+    balance = main.PlayerCoins.query.filter_by(user_id=user_id).first().coins
+    ledger = db.session.query(db.func.sum(main.CoinTransaction.amount)) \
+        .filter_by(user_id=user_id).scalar() or 0
+
+print(f"awards={outcomes.count('award')} steals={outcomes.count('steal')} "
+      f"missed steals={outcomes.count('missed')}")
+print(f"balance={balance} ledger sum={ledger}")
+assert balance == ledger, "balance and ledger disagree"
+assert balance >= 0, "balance went negative"
+print("OK")
@@ -0,0 +1,14 @@
+"""Fingerprint and precompress static/ into static/dist for production.
+
+Run on every deploy before starting the server:
+    python build_static.py
+main.py picks up static/dist/manifest.json at startup.
+"""
+import os
+
+from static_assets import build
+
+static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+manifest = build(static_folder)
+print(f"{len(manifest['files'])} files fingerprinted, {len(manifest['encodings'])} precompressed "
+      f"into {os.path.join(static_folder, 'dist')}")
@@ -35,4 +35,54 @@ INSERT OR IGNORE INTO game_clues (game_name, clue_id, clue_text) VALUES
 ('emoji_memory', 1, 'NEXUS has a weak memory for faces. Show it the same pattern twice to confuse it.'),
 ('space_dodger', 1, 'NEXUS cannot predict random movements. Chaos is your ally.'),
 ('weather_wizard', 1, 'NEXUS overheats easily. Cold climates weaken its defenses.'),
-('ai_trivia', 1, 'Knowledge is power. NEXUS has a blind spot about its own creation.');
\ No newline at end of file
+('ai_trivia', 1, 'Knowledge is power. NEXUS has a blind spot about its own creation.');
+
+-- Per-user, per-game summary maintained alongside score and clue writes
+CREATE TABLE IF NOT EXISTS user_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    game TEXT NOT NULL,
+    best_score INTEGER DEFAULT 0,
+    play_count INTEGER DEFAULT 0,
+    last_played TIMESTAMP,
+    has_clue BOOLEAN DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    UNIQUE(user_id, game)
+);
+
+
+-- Indexes for the per-user lookups the routes run
+CREATE INDEX IF NOT EXISTS ix_score_user_game_date ON score (user_id, game, date);
+CREATE INDEX IF NOT EXISTS ix_coin_transaction_user_timestamp ON coin_transaction (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS ix_coin_transaction_user_source_timestamp ON coin_transaction (user_id, source, timestamp);
+CREATE INDEX IF NOT EXISTS ix_user_stats_game_best_score ON user_stats (game, best_score);
+
+
+-- Append-only NEXUS chat log
+CREATE TABLE IF NOT EXISTS nexus_message (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    UNIQUE(user_id, seq)
+);
+
+
+-- Pre-generated AI trivia questions and how far each player has got through them
+CREATE TABLE IF NOT EXISTS trivia_question (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question TEXT NOT NULL UNIQUE,
+    answer TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS trivia_progress (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL UNIQUE,
+    last_question_id INTEGER DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+CREATE INDEX IF NOT EXISTS ix_trivia_progress_last_question_id ON trivia_progress (last_question_id);
@@ -0,0 +1,57 @@
+import sqlite3
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Delete, Insert, Update
+from sqlalchemy.engine import make_url
+
+REPLICA = 'replica'  # Bind key of the read replica in SQLALCHEMY_BINDS
+
+
+class RoutingSession(Session):
+    """db.session that can send reads to a read replica.
+
+    Everything goes to the primary database unless use_replica(session)
+    was called, and even then writes (flushes, INSERT/UPDATE/DELETE) always
+    go to the primary. Once a session has written, its reads go back to the
+    primary too, so a request always sees its own changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self.info['wrote'] = True
+        elif self.info.get('use_replica') and not self.info.get('wrote') and bind is None:
+            return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def has_replica(db):
+    return REPLICA in db.engines
+
+
+def use_replica(session, enabled=True):
+    """Route the session's reads to the replica (if configured) until turned off"""
+    if enabled:
+        session.info['use_replica'] = True
+    else:
+        session.info.pop('use_replica', None)
+
+
+def sqlite_path(uri, instance_path):
+    """File path of a SQLite URI, relative paths being in the instance folder like Flask-SQLAlchemy"""
+    database = make_url(uri).database
+    return database if database.startswith('/') else f"{instance_path}/{database}"
+
+
+def copy_sqlite(primary_path, replica_path):
+    """Copy the primary database file into the replica with SQLite's backup API.
+
+    Stands in for real replication when trying the replica setup with two
+    local SQLite files. Readers of the replica see the copy all at once.
+    """
+    primary = sqlite3.connect(primary_path)
+    replica = sqlite3.connect(replica_path)
+    try:
+        primary.backup(replica)
+    finally:
+        replica.close()
+        primary.close()
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event_type, data):
+    """Encode one Server-Sent Events message"""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    """One open event stream, read from a request thread.
+
+    Messages are (event_type, data) pairs. A client too slow to keep up
+    loses its oldest messages rather than holding up the publisher; every
+    event carries the latest state, so nothing is lost for long.
+    """
+
+    def __init__(self, user_id, maxsize=100):
+        self.user_id = user_id
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, message):
+        while True:
+            try:
+                self._queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Wait for the next message, or return None after timeout seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription:
+    """One open event stream, read from a coroutine on the event loop it was created on"""
+
+    def __init__(self, user_id, maxsize=100):
+        self.user_id = user_id
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize)
+
+    def put(self, message):
+        # Publishers run on request threads, hand the message to the loop
+        self._loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """Delivers events to the streams open in this process.
+
+    Enough for a single worker. With several worker processes a player's
+    stream and the request that changed their coins can land in different
+    processes, so use a shared backend like RedisBroker.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = {}  # user_id -> set of subscriptions
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, user_id):
+        return self._add(Subscription(user_id, self.queue_size))
+
+    def subscribe_async(self, user_id):
+        return self._add(AsyncSubscription(user_id, self.queue_size))
+
+    def _add(self, subscription):
+        with self._lock:
+            self._subscribers.setdefault(subscription.user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def publish(self, user_id, event_type, data):
+        self.published += 1
+        self.deliver(user_id, (event_type, data))
+
+    def deliver(self, user_id, message):
+        """Hand a message to every stream the player has open in this process"""
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.put(message)
+                self.delivered += 1
+            except RuntimeError:
+                # The stream's event loop has shut down
+                self.unsubscribe(subscription)
+
+
+class RedisBroker(LocalBroker):
+    """Shares events between worker processes through a Redis channel.
+
+    publish() sends to Redis; every process runs one listener thread that
+    delivers what comes back to its own streams.
+    """
+
+    channel = 'arcade:events'
+
+    def __init__(self, url, queue_size=100):
+        import redis  # Only needed for multi-worker deployments
+        super().__init__(queue_size)
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+
+    def publish(self, user_id, event_type, data):
+        self.published += 1
+        self._redis.publish(self.channel, json.dumps([user_id, event_type, data]))
+
+    def _add(self, subscription):
+        self._ensure_listener()
+        return super()._add(subscription)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='events-redis', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    user_id, event_type, data = json.loads(message['data'])
+                    self.deliver(user_id, (event_type, data))
+            except Exception as e:
+                logger.error("Event listener error: %s", e)
+                time.sleep(1)
+
+
+def make_broker(url=None, queue_size=100):
+    """Pick the event backend: in-process by default, Redis for redis:// URLs"""
+    if not url or url == 'local':
+        return LocalBroker(queue_size)
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisBroker(url, queue_size)
+    raise ValueError(f"Unsupported EVENTS_BROKER_URL: {url}")
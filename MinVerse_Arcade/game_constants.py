@@ -74,5 +74,143 @@ COIN_CRUNCHER_CONFIG = {
     'stay_duration': 10,             # How long the cruncher stays if not clicked (seconds)
     'min_steal_amount': 5,           # Minimum coins to steal
     'max_steal_amount': 15,          # Maximum coins to steal
-    'click_threshold': 10            # Clicks needed to defeat the coin cruncher
-}
\ No newline at end of file
+    'click_threshold': 10,           # Clicks needed to defeat the coin cruncher
+    'heartbeat_interval': 5,         # How often an open, visible page checks in (seconds)
+    'present_within': 15,            # Only appears if the page checked in this recently (stay_duration plus a margin)
+    'poll_interval': 1,              # Longest wait between checks for due events (seconds)
+    'batch_size': 50,                # Due events handled per commit (holds the write lock meanwhile)
+    'batch_pause': 0.1               # Pause between batches when many are due (seconds)
+}
+
+# Coin and clue rewards for each game, applied by rewards.evaluate_reward.
+#   play_tiers:      (minimum score, coins) pairs, highest tier first
+#   play_source:     CoinTransaction source for play coins
+#   daily_limit:     how many times per day play coins can be earned (optional)
+#   score_bonus:     extra play coins for an exact score (optional)
+#   clue_trigger:    conditions on the event that reveal the game's clue, all must match
+#   clue_chance:     random chance to reveal the clue when the trigger misses (optional)
+#   clue_coins:      coins for discovering the clue for the first time
+#   clue_source:     CoinTransaction source for clue coins
+#   always_show_clue: show the clue every time it triggers, not only the first time
+#   records_score:   save the event score to the Score table
+GAME_REWARDS = {
+    'clickmaster': {
+        'play_tiers': [(50, 5), (30, 3), (10, 1)],
+        'play_source': 'clickmaster_play',
+        'score_bonus': {'score': 42, 'coins': 3},
+        'clue_trigger': [{'field': 'score', 'equals': 42}],
+        'clue_coins': 0,
+        'always_show_clue': True,
+        'records_score': True
+    },
+    'fliptext': {
+        'play_tiers': [(10, 2)],  # score is the input length
+        'play_source': 'fliptext_use',
+        'daily_limit': 1,
+        'clue_trigger': [
+            {'field': 'input', 'contains': 'NEXUS'},
+            {'field': 'output', 'contains': 'nexus'}
+        ],
+        'clue_coins': 3,
+        'clue_source': 'fliptext_clue',
+        'records_score': False
+    },
+    'emoji_memory': {
+        'play_tiers': [(8, 5)],  # all 8 pairs matched
+        'play_source': 'emoji_memory_complete',
+        'clue_trigger': [{'field': 'score', 'equals': 8}],
+        'clue_coins': 0,
+        'always_show_clue': True,
+        'records_score': True
+    },
+    'space_dodger': {
+        'play_tiers': [(500, 10), (300, 7), (150, 5), (50, 2)],
+        'play_source': 'space_dodger_score',
+        'clue_trigger': [{'field': 'score', 'at_least': 500}],
+        'clue_coins': 0,
+        'records_score': True
+    },
+    'weather_wizard': {
+        'play_tiers': [],
+        'clue_trigger': [{'field': 'temperature', 'below': 32}],  # below freezing
+        'clue_coins': 4,
+        'clue_source': 'weather_wizard_clue',
+        'records_score': False
+    },
+    'ai_trivia': {
+        'play_tiers': [],
+        'clue_trigger': [{'field': 'question', 'contains_any': [
+            "ai", "artificial intelligence", "machine learning", "neural", "algorithm",
+            "computer", "data", "robot", "automation", "intelligence"
+        ]}],
+        'clue_chance': 0.1,
+        'clue_coins': 5,
+        'clue_source': 'ai_trivia_clue',
+        'records_score': False
+    },
+    'boss_battle': {
+        'play_tiers': [(1, 25)],  # score is 1 when NEXUS is defeated
+        'play_source': 'nexus_victory',
+        'clue_coins': 0,
+        'records_score': False
+    }
+}
+
+# Leaderboards: one per game below plus a global 'coins' board
+LEADERBOARD_CONFIG = {
+    'games': ['clickmaster', 'emoji_memory', 'space_dodger'],
+    'size': 10,             # Entries shown on each board
+    'refresh_seconds': 60   # Reload from the database so other workers' scores show up
+}
+
+# NEXUS chat history storage
+NEXUS_CHAT_CONFIG = {
+    'retention_messages': 200,  # Messages kept per player, older ones are deleted
+    'prune_every': 50,          # Delete old messages once every this many messages
+    'page_size': 20             # Messages per page on the boss battle page
+}
+
+# Pre-generated AI trivia questions
+TRIVIA_POOL_CONFIG = {
+    'batch_size': 20,      # Questions requested per OpenAI call
+    'low_water': 40,       # Refill when fewer unseen questions are left than this
+    'check_interval': 60   # Seconds between pool checks by the refill thread
+}
+
+# Live updates pushed to open pages over /events
+EVENTS_CONFIG = {
+    'keepalive': 25,       # Seconds between keep-alive comments on an idle stream
+    'retry_ms': 5000,      # How long browsers wait before reconnecting a dropped stream
+    'queue_size': 100      # Messages buffered per stream before the oldest are dropped
+}
+
+# Game-over scores are written in batches by a background thread (ingest.py)
+# instead of one commit per request. Coins and clues are still saved right away.
+SCORE_INGEST_CONFIG = {
+    'write_behind': True,    # False saves each score in its request's transaction
+    'batch_size': 200,       # Scores per batch
+    'flush_interval': 0.5,   # Seconds a score can wait for its batch to fill
+    'queue_size': 5000,      # Scores waiting to be written before requests are slowed down
+    'enqueue_timeout': 0.5   # Seconds a request waits for room before saving its score itself
+}
+
+# CoinTransaction upkeep done by ledger_maintenance.py
+COIN_LEDGER_CONFIG = {
+    'settle_seconds': 300,     # Transactions younger than this wait for the next checkpoint
+    'archive_after_days': 30,  # Older transactions become daily totals (keep it >= 1 for daily limits)
+    'batch_size': 50000        # Transactions (or players, when reconciling) per batch
+}
+
+# /user/transactions and /user/scores pages, also the profile's coin history
+HISTORY_CONFIG = {
+    'page_size': 20,       # Rows per page unless ?limit= asks for another size
+    'max_page_size': 100
+}
+
+# Password hashing, done by a pool of worker processes (passwords.py)
+PASSWORD_HASH_CONFIG = {
+    'method': 'pbkdf2:sha256',  # werkzeug method; stored hashes made with other settings are redone at login
+    'workers': 2,               # Hashes running at once per app process, 0 hashes on the request thread
+    'max_pending': 8,           # Logins running or waiting before the next is turned away
+    'timeout': 10               # Seconds a request waits for its hash
+}
@@ -0,0 +1,61 @@
+"""Gunicorn settings, read automatically when gunicorn starts in this folder:
+
+    gunicorn --bind 0.0.0.0:80 'main:create_app()'
+
+The app is loaded once in the master process and each worker is forked
+from it (preload_app), so workers start without importing anything and
+share the master's memory for the code and templates until they change
+it. GUNICORN_PRELOAD=0 loads the app in every worker instead, e.g. so a
+HUP reload picks up new code.
+
+Each of the WEB_CONCURRENCY workers serves requests on GUNICORN_THREADS
+threads (gthread). Pages poll for coin changes here rather than hold an
+/events stream, which would take one of those threads for as long as the
+page stays open (see main.py's EVENTS_STREAMS; asgi.py is the server for
+streams). With EVENTS_STREAMS=1 anyway, events only reach streams in the
+worker that made them unless EVENTS_BROKER_URL names a shared broker, so
+more than one worker needs one.
+"""
+import gc
+import os
+
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+
+# Collections would write to the header of every object they look at, so a
+# worker collecting soon copies every page it shares with the master. The
+# master doesn't collect while loading the app, and what it has loaded is
+# frozen out of the collector's reach before forking.
+if preload_app:
+    gc.disable()
+
+
+def on_starting(server):
+    # --workers on the command line can also raise the count
+    url = os.getenv('EVENTS_BROKER_URL', 'local')
+    if os.getenv('EVENTS_STREAMS') == '1' and server.cfg.workers > 1 and url == 'local':
+        server.log.error("%d workers need a shared EVENTS_BROKER_URL (redis://...) "
+                         "for EVENTS_STREAMS to reach every page; set it or use one worker",
+                         server.cfg.workers)
+        raise SystemExit(1)
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    # Without preload this loads the app in the worker, which it would do next anyway
+    import main
+    main.after_fork()
+
+
+def worker_exit(server, worker):
+    # The password workers forked in post_fork would otherwise outlive this
+    # worker, still holding its copy of the listening socket
+    import main
+    main.password_hasher.stop()
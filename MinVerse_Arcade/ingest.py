@@ -0,0 +1,141 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """Writes items in batches from a background thread.
+
+    Requests put() items on a bounded queue and return straight away. The
+    writer thread hands them to write_batch(items) once batch_size items
+    are waiting or flush_interval seconds after the first one arrived,
+    whichever comes first, so many small writes become a few large ones.
+
+    When the queue is full put() waits up to its timeout for room and then
+    returns False, leaving the caller to write the item itself. That slows
+    producers down to the speed of the database instead of dropping data.
+    stop() writes whatever is still queued, call it on shutdown.
+    """
+
+    def __init__(self, write_batch, batch_size=200, flush_interval=0.5, queue_size=5000,
+                 name='batch-writer'):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.name = name
+        self._queue = queue.Queue(queue_size)
+        self._context = nullcontext
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def start(self, context=None):
+        """Start the writer thread if it isn't running.
+
+        context is called to get a context manager every batch is written
+        inside, e.g. a Flask app's app_context.
+        """
+        with self._lock:
+            if context is not None:
+                self._context = context
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def put(self, item, timeout=None):
+        """Queue an item, returning False if there was no room within timeout seconds"""
+        try:
+            self._queue.put(item, timeout=timeout)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        self.queued += 1
+        return True
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Wait until everything queued so far has been written"""
+        if self.is_running():
+            self._queue.join()
+        else:
+            self._drain()
+
+    def stop(self, timeout=10):
+        """Stop the writer thread and write anything still queued"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._drain()
+
+    def stats(self):
+        return {'queued': self.queued, 'written': self.written, 'batches': self.batches,
+                'pending': self.pending(), 'rejected': self.rejected, 'failed': self.failed}
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stopping.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _drain(self):
+        """Write everything left on the queue from the calling thread"""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            try:
+                with self._context():
+                    self.write_batch(batch)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                logger.warning("%s: batch of %d failed (%s), writing one at a time", self.name, len(batch), e)
+                # Retry item by item so one bad item doesn't lose the others
+                for item in batch:
+                    try:
+                        with self._context():
+                            self.write_batch([item])
+                        self.written += 1
+                    except Exception as e:
+                        self.failed += 1
+                        logger.error("%s: dropped %s: %s", self.name, item, e)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
@@ -0,0 +1,305 @@
+"""Opt-in request instrumentation.
+
+install(app) times every request (wall clock, database, outbound API calls),
+counts its SQL statements, and serves per-worker totals at /metrics in the
+Prometheus text format. It can also log one JSON line per request and
+write the sampled stacks of slow requests as folded stacks, which
+flamegraph.pl and speedscope.app read. Nothing here runs unless install()
+is called.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from api import outbound
+
+logger = logging.getLogger('arcade.requests')
+
+# Upper bounds of the request duration histogram, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_installed = False
+
+
+class RequestStats:
+    """What one request spent its time on"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.route = None
+        self.method = None
+        self.status = None
+        self.wall = 0.0
+        self.db_time = 0.0
+        self.queries = 0
+        self.outbound_time = 0.0
+
+
+# The stats of the request the current thread (or task) is serving
+current_request = ContextVar('current_request', default=None)
+
+
+def start_request():
+    """Start timing a request outside Flask (asgi.py's prefetching), if installed.
+
+    Returns the RequestStats to hand to the Flask view as
+    environ['arcade.request_stats'], or None.
+    """
+    if not _installed:
+        return None
+    stats = RequestStats()
+    current_request.set(stats)
+    return stats
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class Metrics:
+    """Totals for this worker process, rendered in the Prometheus text format"""
+
+    def __init__(self, gauges=None):
+        self.gauges = gauges  # Callable returning {name: (type, value)} for extra metrics
+        self._lock = threading.Lock()
+        self.requests = Counter()                           # (route, method, status) -> count
+        self.buckets = defaultdict(lambda: [0] * len(BUCKETS))
+        self.seconds = Counter()                            # route -> total wall time
+        self.db_seconds = Counter()
+        self.queries = Counter()
+        self.outbound_seconds = Counter()
+        self.upstream_calls = Counter()                     # upstream name -> count
+        self.upstream_seconds = Counter()
+
+    def observe(self, stats):
+        with self._lock:
+            self.requests[(stats.route, stats.method, stats.status)] += 1
+            buckets = self.buckets[stats.route]
+            for i, bound in enumerate(BUCKETS):
+                if stats.wall <= bound:
+                    buckets[i] += 1
+            self.seconds[stats.route] += stats.wall
+            self.db_seconds[stats.route] += stats.db_time
+            self.queries[stats.route] += stats.queries
+            self.outbound_seconds[stats.route] += stats.outbound_time
+
+    def observe_upstream(self, name, seconds):
+        with self._lock:
+            self.upstream_calls[name] += 1
+            self.upstream_seconds[name] += seconds
+
+    def render(self):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+        with self._lock:
+            metric('arcade_requests_total', 'counter', 'Requests handled by this worker',
+                   [(_labels(route=route, method=method, status=status), count)
+                    for (route, method, status), count in sorted(self.requests.items(), key=str)])
+            histogram = []
+            for route in sorted(self.buckets):
+                count = sum(n for (r, _, _), n in self.requests.items() if r == route)
+                histogram += [(_labels(route=route, le=bound), n)
+                              for bound, n in zip(BUCKETS, self.buckets[route])]
+                histogram.append((_labels(route=route, le='+Inf'), count))
+            lines.append("# HELP arcade_request_duration_seconds Request wall time")
+            lines.append("# TYPE arcade_request_duration_seconds histogram")
+            lines.extend(f"arcade_request_duration_seconds_bucket{labels} {value}" for labels, value in histogram)
+            for route in sorted(self.buckets):
+                count = sum(n for (r, _, _), n in self.requests.items() if r == route)
+                lines.append(f"arcade_request_duration_seconds_sum{_labels(route=route)} {self.seconds[route]:.6f}")
+                lines.append(f"arcade_request_duration_seconds_count{_labels(route=route)} {count}")
+            metric('arcade_request_db_seconds_total', 'counter', 'Time spent running SQL',
+                   [(_labels(route=route), f"{seconds:.6f}") for route, seconds in sorted(self.db_seconds.items())])
+            metric('arcade_request_queries_total', 'counter', 'SQL statements run',
+                   [(_labels(route=route), count) for route, count in sorted(self.queries.items())])
+            metric('arcade_request_outbound_seconds_total', 'counter', 'Time spent waiting on external APIs',
+                   [(_labels(route=route), f"{seconds:.6f}")
+                    for route, seconds in sorted(self.outbound_seconds.items())])
+            metric('arcade_upstream_calls_total', 'counter', 'Calls to each external API, retries included',
+                   [(_labels(upstream=name), count) for name, count in sorted(self.upstream_calls.items())])
+            metric('arcade_upstream_seconds_total', 'counter', 'Time spent in calls to each external API',
+                   [(_labels(upstream=name), f"{seconds:.6f}")
+                    for name, seconds in sorted(self.upstream_seconds.items())])
+
+        for name, (kind, value) in (self.gauges() if self.gauges else {}).items():
+            metric(name, kind, name.replace('_', ' '), [('', value)])
+        return '\n'.join(lines) + '\n'
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+def fold_stack(frame):
+    """A stack as 'outermost;...;innermost', one line of a folded stacks file"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    """Samples the stacks of threads that are serving requests.
+
+    A background thread looks at every active request's stack each
+    interval seconds. When a request took longer than threshold seconds
+    its samples are written to directory as a folded stacks file; the
+    samples of fast requests are thrown away.
+    """
+
+    def __init__(self, threshold, directory='profiles', interval=0.005):
+        self.threshold = threshold
+        self.directory = directory
+        self.interval = interval
+        self._active = {}  # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+
+    def begin(self):
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+
+    def end(self, stats):
+        """Stop sampling this thread's request, returning the file written for a slow one"""
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or stats.wall < self.threshold:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        route = (stats.route or 'unmatched').strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'index'
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{route}-{int(stats.wall * 1000)}ms.folded")
+        with open(path, 'w') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in samples.most_common())
+        self.written += 1
+        return path
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[fold_stack(frame)] += 1
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_request.get() is not None:
+        conn.info.setdefault('instrument_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request.get()
+    started = conn.info.get('instrument_started')
+    if stats is not None and started:
+        stats.db_time += time.perf_counter() - started.pop()
+        stats.queries += 1
+
+
+def _handle_error(exception_context):
+    # The statement failed, after_cursor_execute won't run for it
+    connection = exception_context.connection
+    started = connection.info.get('instrument_started') if connection is not None else None
+    stats = current_request.get()
+    if stats is not None and started:
+        stats.db_time += time.perf_counter() - started.pop()
+        stats.queries += 1
+
+
+def install(app, metrics_path='/metrics', log_requests=False, slow_request_ms=None,
+            profile_dir='profiles', profile_interval_ms=5, gauges=None):
+    """Instrument every request of a Flask app and serve the totals at metrics_path.
+
+    log_requests logs a JSON line per request on the 'arcade.requests'
+    logger. slow_request_ms turns on the sampling profiler for requests
+    slower than that. gauges is an optional callable returning extra
+    metrics as {name: (type, value)}. Returns the Metrics.
+    """
+    global _installed
+    metrics = Metrics(gauges)
+    profiler = SamplingProfiler(slow_request_ms / 1000, profile_dir, profile_interval_ms / 1000) \
+        if slow_request_ms else None
+
+    if not _installed:
+        _installed = True
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    def upstream_call(name, seconds):
+        metrics.observe_upstream(name, seconds)
+        stats = current_request.get()
+        if stats is not None:
+            stats.outbound_time += seconds
+    outbound.call_listeners.append(upstream_call)
+
+    @app.before_request
+    def start_timing():
+        # asgi.py starts the clock before prefetching upstream data
+        stats = request.environ.get('arcade.request_stats') or RequestStats()
+        stats.route = request.url_rule.rule if request.url_rule else 'unmatched'
+        stats.method = request.method
+        g.instrument_token = current_request.set(stats)
+        if profiler:
+            profiler.begin()
+
+    @app.after_request
+    def record_status(response):
+        stats = current_request.get()
+        if stats is not None:
+            stats.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_timing(error=None):
+        stats = current_request.get()
+        token = g.pop('instrument_token', None)
+        if stats is None or token is None:
+            return
+        current_request.reset(token)
+        stats.wall = time.perf_counter() - stats.start
+        if stats.status is None:
+            stats.status = 500
+        metrics.observe(stats)
+        profile = profiler.end(stats) if profiler else None
+        if log_requests:
+            logger.info(json.dumps({
+                'route': stats.route, 'method': stats.method, 'status': stats.status,
+                'path': request.path, 'ms': round(stats.wall * 1000, 2),
+                'db_ms': round(stats.db_time * 1000, 2), 'queries': stats.queries,
+                'outbound_ms': round(stats.outbound_time * 1000, 2)
+            }))
+        if profile:
+            logger.warning("Slow request %s %s took %.0fms, stacks in %s",
+                           stats.method, request.path, stats.wall * 1000, profile)
+
+    app.add_url_rule(metrics_path, 'metrics',
+                     lambda: Response(metrics.render(), mimetype='text/plain; version=0.0.4'))
+    return metrics
@@ -0,0 +1,43 @@
+class KeywordMatcher:
+    """Find which keyword categories appear in a message.
+
+    Built once from a {category: [keywords]} dict. Matches keywords anywhere
+    in the lowercased text, exactly like `keyword in text.lower()`, but
+    lowercases the text once, checks each distinct keyword at most once and
+    stops as soon as every category has been found.
+
+    Python's substring search runs in C and beat both a single alternation
+    regex and a pure Python automaton on long messages, so the work saved
+    here is in checking fewer keywords rather than in scanning the text.
+    """
+
+    def __init__(self, keywords_by_category):
+        self.categories = list(keywords_by_category)
+
+        # Every category a keyword belongs to
+        keyword_categories = {}
+        for category, keywords in keywords_by_category.items():
+            for keyword in keywords:
+                keyword_categories.setdefault(keyword.lower(), set()).add(category)
+
+        # A keyword that contains a shorter keyword with the same categories can
+        # never add anything ('patterns' only matches where 'pattern' does)
+        self._keywords = []
+        for keyword, categories in keyword_categories.items():
+            redundant = any(other != keyword and other in keyword and categories <= other_categories
+                            for other, other_categories in keyword_categories.items())
+            if not redundant:
+                self._keywords.append((keyword, frozenset(categories)))
+
+    def match(self, text):
+        """Return the set of categories with at least one keyword in text"""
+        text = text.lower()
+        found = set()
+        for keyword, categories in self._keywords:
+            if categories <= found:
+                continue
+            if keyword in text:
+                found |= categories
+                if len(found) == len(self.categories):
+                    break
+        return found
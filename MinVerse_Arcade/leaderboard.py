@@ -0,0 +1,75 @@
+import heapq
+from bisect import bisect_left, bisect_right, insort
+
+
+class Leaderboard:
+    """In-memory ranking for one board (a game's best scores or coins).
+
+    Keeps every user's score in a sorted list so a user's rank is a binary
+    search, plus a bounded top-N list that is only touched when a score
+    enters it. Loaded from the database with load() and kept current with
+    update() as scores are saved.
+    """
+
+    def __init__(self, size=10):
+        self.size = size
+        self._user_scores = {}  # user_id -> score
+        self._scores = []       # every score, ascending
+        self._top = []          # (-score, user_id), best first, at most size entries
+
+    def __len__(self):
+        return len(self._user_scores)
+
+    def load(self, rows):
+        """Replace the board with (user_id, score) rows"""
+        self._user_scores = {user_id: score for user_id, score in rows}
+        self._scores = sorted(self._user_scores.values())
+        self._rebuild_top()
+
+    def _rebuild_top(self):
+        self._top = heapq.nsmallest(self.size, ((-score, user_id)
+                                                for user_id, score in self._user_scores.items()))
+
+    def update(self, user_id, score):
+        """Set a user's score and keep the rankings in order"""
+        old_score = self._user_scores.get(user_id)
+        if old_score == score:
+            return
+
+        if old_score is not None:
+            del self._scores[bisect_left(self._scores, old_score)]
+        insort(self._scores, score)
+        self._user_scores[user_id] = score
+
+        entry = (-score, user_id)
+        if old_score is not None and (-old_score, user_id) in self._top:
+            self._top.remove((-old_score, user_id))
+            if score < old_score and len(self._user_scores) > len(self._top) + 1:
+                # Someone outside the top N may now outrank this user
+                self._rebuild_top()
+                return
+
+        if len(self._top) < self.size or entry < self._top[-1]:
+            insort(self._top, entry)
+            del self._top[self.size:]
+
+    def top(self):
+        """Return [(rank, user_id, score)] for the top N, tied scores share a rank"""
+        result = []
+        for position, (negative_score, user_id) in enumerate(self._top):
+            if result and result[-1][2] == -negative_score:
+                rank = result[-1][0]
+            else:
+                rank = position + 1
+            result.append((rank, user_id, -negative_score))
+        return result
+
+    def rank(self, user_id):
+        """Return the user's rank (1 is best) or None if they're not on the board"""
+        score = self._user_scores.get(user_id)
+        if score is None:
+            return None
+        return len(self._scores) - bisect_right(self._scores, score) + 1
+
+    def score(self, user_id):
+        return self._user_scores.get(user_id)
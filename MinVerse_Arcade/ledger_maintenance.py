@@ -0,0 +1,24 @@
+"""Checkpoint, compact and reconcile the coin ledger. Run it from cron, e.g.
+every 10 minutes; each step only reads what changed since the last run.
+
+    python ledger_maintenance.py [--reconcile-only]
+
+Exits with status 1 if a player's balance doesn't match the ledger.
+"""
+import sys
+
+from main import app, db
+from main import checkpoint_coin_ledger, compact_coin_ledger, reconcile_coins
+
+with app.app_context():
+    db.create_all()
+    if '--reconcile-only' not in sys.argv:
+        print(f"Checkpointed transactions up to id {checkpoint_coin_ledger()}")
+        print(f"Archived {compact_coin_ledger()} old transactions as daily totals")
+
+    mismatches = reconcile_coins()
+    for user_id, coins, ledger in mismatches:
+        print(f"User {user_id}: balance {coins}, ledger says {ledger}")
+    print(f"Reconciled, {len(mismatches)} balances differ from the ledger")
+
+sys.exit(1 if mismatches else 0)
@@ -1,35 +1,97 @@
-from flask import Flask, render_template, redirect, request, url_for, jsonify, abort, flash
+# Load environment variables from .env file. This is the only place it's
+# loaded, before the modules below read their settings from the environment.
+from dotenv import load_dotenv
+load_dotenv()
+
+from flask import Flask, Response, render_template, redirect, request, url_for, jsonify, abort, flash, current_app, has_request_context
+from flask import session as cookie_session
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, logout_user, login_required, UserMixin, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from api.ai import trivia
-from api.external import get_weather
-from dotenv import load_dotenv
-from game_constants import GAME_PROGRESSION, BOSS_BATTLE_COINS, REQUIRED_CLUES, NEXUS_WEAKNESS_KEYWORDS, COIN_CRUNCHER_CONFIG
-from functools import wraps
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+from werkzeug.security import generate_password_hash
+from api.ai import trivia, trivia_batch
+from api.external import get_weather, weather_cache
+from api.cache import TTLCache
+from game_constants import GAME_PROGRESSION, BOSS_BATTLE_COINS, REQUIRED_CLUES, NEXUS_WEAKNESS_KEYWORDS, COIN_CRUNCHER_CONFIG, GAME_REWARDS, LEADERBOARD_CONFIG, NEXUS_CHAT_CONFIG, TRIVIA_POOL_CONFIG, EVENTS_CONFIG, SCORE_INGEST_CONFIG, COIN_LEDGER_CONFIG, HISTORY_CONFIG, PASSWORD_HASH_CONFIG
+from rewards import evaluate_reward
+from leaderboard import Leaderboard
+from events import format_sse, make_broker
+from ingest import BatchWriter
+from passwords import HasherBusy, PasswordHasher
+from static_assets import StaticAssets
+import sqlite_tuning
+import instrumentation
+from db_routing import REPLICA, RoutingSession, has_replica, use_replica
+from keyword_matcher import KeywordMatcher
+from functools import cache, wraps
 import os
 import json
+import atexit
+import logging
 import time
 import random
-from datetime import datetime
+import threading
+from datetime import date, datetime, timedelta, timezone
+from types import MappingProxyType
 
-# Load environment variables from .env file
-load_dotenv()
+# LOG_LEVEL=DEBUG also shows per-request traces like submitted scores
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logging.getLogger('httpx').setLevel(logging.WARNING)  # It logs every outbound request at INFO
+logger = logging.getLogger(__name__)
+
+def utc_now():
+    """Naive UTC time, the clock the CURRENT_TIMESTAMP column defaults use"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def utc_from_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'super_secret_key')  # Use env var or fallback
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///database.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# SQLite settings from sqlite_tuning.SQLITE_PROFILES: WAL, busy timeout, cache...
+DATABASE_PROFILE = os.getenv('DATABASE_PROFILE', 'production')
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_tuning.engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'], DATABASE_PROFILE,
+    pool_size=int(os.getenv('DATABASE_POOL_SIZE', 10)))
+# Optional read replica for routes marked @replica_reads, see db_routing.py
+if os.getenv('DATABASE_REPLICA_URL'):
+    app.config['SQLALCHEMY_BINDS'] = {REPLICA: {
+        'url': os.getenv('DATABASE_REPLICA_URL'),
+        **sqlite_tuning.engine_options(os.getenv('DATABASE_REPLICA_URL'), DATABASE_PROFILE,
+                                       pool_size=int(os.getenv('DATABASE_POOL_SIZE', 10)))
+    }}
+# Seconds a player reads from the primary after changing something
+REPLICA_STICKY_SECONDS = float(os.getenv('DATABASE_REPLICA_STICKY', 5))
 
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+with app.app_context():
+    for engine in db.engines.values():
+        sqlite_tuning.install(engine, DATABASE_PROFILE)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+# Fingerprinted, precompressed copies of static/ made by build_static.py;
+# without them static files are served from static/ as before
+static_assets = StaticAssets(app)
+# Scripts play sounds by name, so pages get the name -> URL map from
+# _sound_urls.html and with it the fingerprinted files
+SOUND_NAMES = sorted(name[:-len('.mp3')] for name in os.listdir(os.path.join(app.static_folder, 'media', 'sounds'))
+                     if name.endswith('.mp3'))
+
+@app.context_processor
+def sound_urls_context():
+    return {'sound_urls': lambda: {name: url_for('static', filename=f'media/sounds/{name}.mp3')
+                                   for name in SOUND_NAMES}}
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
-    password = db.Column(db.String(150), nullable=False)  # Hashed
+    password = db.Column(db.String(255), nullable=False)  # Hashed, scrypt hashes are 162 characters
     avatar = db.Column(db.String(150), default='default.png')
     scores = db.relationship('Score', backref='user', lazy=True)
     coins = db.relationship('PlayerCoins', backref='user', lazy=True)
@@ -46,6 +108,12 @@ class Score(db.Model):
     game = db.Column(db.String(50), nullable=False)
     score = db.Column(db.Integer, default=0)
     date = db.Column(db.DateTime, default=db.func.current_timestamp())
+    __table_args__ = (
+        # Per-game history for a user, newest first
+        db.Index('ix_score_user_game_date', 'user_id', 'game', 'date'),
+        # All of a user's scores, newest first (/user/scores)
+        db.Index('ix_score_user_date', 'user_id', 'date'),
+    )
 
 # Models for the coin and clue system
 class PlayerCoins(db.Model):
@@ -78,6 +146,32 @@ class BossProgress(db.Model):
     stage = db.Column(db.String(20), default='intro')  # intro, battle, weakness, escape
     started_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+    # Highest NexusMessage.seq handed out, NULL for rows from before this column
+    last_message_seq = db.Column(db.Integer, nullable=True)
+
+# Append-only NEXUS chat log, one row per message with a per-user sequence number.
+# Replaces BossProgress.conversation_history, which is no longer written.
+class NexusMessage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    role = db.Column(db.String(20), nullable=False)  # user or assistant
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    __table_args__ = (db.UniqueConstraint('user_id', 'seq'),)
+
+# Pool of pre-generated trivia questions, filled in batches by a background thread
+class TriviaQuestion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    question = db.Column(db.Text, nullable=False, unique=True)
+    answer = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+# Each player works through the pool in id order, so no question is served twice
+class TriviaProgress(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    last_question_id = db.Column(db.Integer, default=0, index=True)
 
 class CoinTransaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -85,10 +179,1041 @@ class CoinTransaction(db.Model):
     amount = db.Column(db.Integer, nullable=False)  # Positive for earned, negative for spent/stolen
     source = db.Column(db.String(50), nullable=False)  # game name, cruncher, unlock, etc.
     timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
+    __table_args__ = (
+        # Recent transactions on the profile page
+        db.Index('ix_coin_transaction_user_timestamp', 'user_id', 'timestamp'),
+        # Daily limit checks for a single source
+        db.Index('ix_coin_transaction_user_source_timestamp', 'user_id', 'source', 'timestamp'),
+        # Reconciliation sums a user's transactions after their checkpoint
+        db.Index('ix_coin_transaction_user_id', 'user_id', 'id'),
+    )
+
+# A user's coin total from the ledger up to and including last_transaction_id,
+# so reconciliation only has to add up the transactions after it
+class CoinCheckpoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    balance = db.Column(db.Integer, nullable=False, default=0)
+    last_transaction_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+# Old CoinTransaction rows rolled up into one row per user, day and source
+class CoinTransactionArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    source = db.Column(db.String(50), nullable=False)
+    amount = db.Column(db.Integer, nullable=False)  # Sum of the day's transactions
+    transactions = db.Column(db.Integer, nullable=False)  # How many were rolled up
+    __table_args__ = (db.UniqueConstraint('user_id', 'day', 'source'),)
+
+# Each player's next Coin Cruncher event, shared by every worker process:
+# 'appear' while the cruncher is waiting to show up, 'steal' while it's on
+# screen. Rows are moved on with UPDATEs guarded on the event being replaced,
+# so only one process (or a defeat) gets each event.
+class CruncherState(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    kind = db.Column(db.String(10), nullable=False)
+    due_at = db.Column(db.DateTime, nullable=False, index=True)  # UTC
+    amount = db.Column(db.Integer, nullable=True)  # What a 'steal' takes
+    last_seen = db.Column(db.DateTime, nullable=False)  # UTC, the player's last check-in
+    # The last steal, until the player's browser picks it up
+    last_steal_amount = db.Column(db.Integer, nullable=True)
+    last_steal_coins = db.Column(db.Integer, nullable=True)
+
+# Per-user, per-game summary kept up to date whenever a score or clue is saved,
+# so pages don't have to aggregate the whole Score/DiscoveredClue history
+class UserStats(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    game = db.Column(db.String(50), nullable=False)
+    best_score = db.Column(db.Integer, default=0)
+    play_count = db.Column(db.Integer, default=0)
+    last_played = db.Column(db.DateTime, nullable=True)
+    has_clue = db.Column(db.Boolean, default=False)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'game'),
+        # Loading a game's leaderboard
+        db.Index('ix_user_stats_game_best_score', 'game', 'best_score'),
+    )
+
+def get_or_create(model, defaults=None, **key):
+    """Return the row matching key, adding it (with defaults) if it's missing.
+
+    The insert runs in a savepoint, so if a concurrent request for the same
+    player created the row first we load theirs instead of failing.
+    """
+    row = model.query.filter_by(**key).first()
+    if row:
+        return row
+    try:
+        with db.session.begin_nested():
+            row = model(**key, **(defaults or {}))
+            db.session.add(row)
+    except IntegrityError:
+        row = model.query.filter_by(**key).first()
+    return row
+
+def upsert(model, index_elements, set_):
+    """INSERT ... ON CONFLICT DO UPDATE, written the same way on SQLite and PostgreSQL.
+
+    set_ gets the excluded (proposed) row and returns the columns to update.
+    Execute it with a list of rows, or add them with .values().
+    """
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    insert_rows = dialect.insert(model)
+    return insert_rows.on_conflict_do_update(index_elements=index_elements,
+                                             set_=set_(insert_rows.excluded))
+
+def insert_ignore(model, **values):
+    """INSERT ... ON CONFLICT DO NOTHING, on SQLite and PostgreSQL.
+
+    Returns True if the row was added, False if a unique constraint said it
+    was already there. Runs at once in the session's transaction.
+    """
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    return db.session.execute(dialect.insert(model).values(**values).on_conflict_do_nothing()).rowcount == 1
+
+def update_user_stats(user_id, game, score=None, clue_found=False, stats=None):
+    """Update the UserStats row for a score or clue being saved.
+
+    Only adds to the session, the caller commits it together with the
+    Score/DiscoveredClue row so both land in the same transaction. Pass
+    stats if the row was already loaded to skip the lookup.
+    """
+    if not stats:
+        stats = get_or_create(UserStats, user_id=user_id, game=game,
+                              defaults={'best_score': 0, 'play_count': 0, 'has_clue': False})
+    
+    if score is not None:
+        stats.best_score = max(stats.best_score, score) if stats.play_count else score
+        stats.play_count += 1
+        stats.last_played = utc_now()
+    
+    if clue_found:
+        stats.has_clue = True
+    
+    return stats
+
+def rebuild_user_stats():
+    """Recompute every UserStats row from the Score and DiscoveredClue history."""
+    UserStats.query.delete()
+    
+    stats = {}
+    score_rows = db.session.query(
+        Score.user_id, Score.game,
+        db.func.max(Score.score), db.func.count(Score.id), db.func.max(Score.date)
+    ).group_by(Score.user_id, Score.game).all()
+    for user_id, game, best_score, play_count, last_played in score_rows:
+        stats[(user_id, game)] = UserStats(
+            user_id=user_id, game=game,
+            best_score=best_score or 0, play_count=play_count,
+            last_played=last_played, has_clue=False
+        )
+    
+    clue_rows = db.session.query(DiscoveredClue.user_id, DiscoveredClue.game_name).distinct().all()
+    for user_id, game in clue_rows:
+        if (user_id, game) not in stats:
+            stats[(user_id, game)] = UserStats(user_id=user_id, game=game, best_score=0, play_count=0)
+        stats[(user_id, game)].has_clue = True
+    
+    db.session.add_all(stats.values())
+    db.session.commit()
+    return len(stats)
+
+def create_missing_indexes():
+    """Create model indexes that are missing from an existing database.
+
+    db.create_all() only creates indexes together with new tables, so
+    databases created before an index was added need this.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+def add_missing_columns():
+    """Add model columns that are missing from existing tables.
+
+    Like create_missing_indexes, for databases created before a column was
+    added. Only nullable columns can be added this way. Commits.
+    """
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+                db.session.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column_ddl}'))
+    db.session.commit()
+
+def append_nexus_messages(user_id, messages):
+    """Add (role, content) messages to a user's NEXUS chat log.
+
+    Costs one update of BossProgress.last_message_seq and one insert, no
+    matter how long the conversation is. The player needs a BossProgress row.
+    Messages older than the retention window are deleted every
+    NEXUS_CHAT_CONFIG['prune_every'] messages. Doesn't commit.
+    """
+    # Reserve the sequence numbers in one UPDATE, so two turns sent at once
+    # (a double submit, two tabs) wait for each other instead of both taking
+    # the same ones. Rows from before last_message_seq start from the log.
+    logged_seq = db.select(db.func.coalesce(db.func.max(NexusMessage.seq), 0)) \
+                   .where(NexusMessage.user_id == user_id) \
+                   .scalar_subquery()
+    new_seq = db.session.execute(
+        db.update(BossProgress)
+          .where(BossProgress.user_id == user_id)
+          .values(last_message_seq=db.func.coalesce(BossProgress.last_message_seq, logged_seq) + len(messages))
+          .returning(BossProgress.last_message_seq)
+          .execution_options(synchronize_session=False)
+    ).scalar_one()
+    last_seq = new_seq - len(messages)
+    
+    db.session.add_all([
+        NexusMessage(user_id=user_id, seq=last_seq + i + 1, role=role, content=content)
+        for i, (role, content) in enumerate(messages)
+    ])
+    
+    prune_every = NEXUS_CHAT_CONFIG['prune_every']
+    if new_seq // prune_every > last_seq // prune_every:
+        NexusMessage.query.filter(
+            NexusMessage.user_id == user_id,
+            NexusMessage.seq <= new_seq - NEXUS_CHAT_CONFIG['retention_messages']
+        ).delete(synchronize_session=False)
+    return new_seq
+
+def get_nexus_messages(user_id, before_seq=None, limit=None):
+    """Return a page of chat messages, oldest first, ending before before_seq"""
+    query = NexusMessage.query.filter(NexusMessage.user_id == user_id)
+    if before_seq is not None:
+        query = query.filter(NexusMessage.seq < before_seq)
+    messages = query.order_by(NexusMessage.seq.desc()) \
+                    .limit(limit or NEXUS_CHAT_CONFIG['page_size']) \
+                    .all()
+    return list(reversed(messages))
+
+def migrate_conversation_history():
+    """Move old BossProgress.conversation_history blobs into NexusMessage rows"""
+    migrated = 0
+    for boss_progress in BossProgress.query.filter(BossProgress.conversation_history != '[]').all():
+        try:
+            conversation = json.loads(boss_progress.conversation_history or '[]')
+        except ValueError:
+            conversation = []
+        
+        if conversation:
+            append_nexus_messages(boss_progress.user_id,
+                                  [(message.get('role', 'user'), message.get('content', ''))
+                                   for message in conversation])
+            migrated += 1
+        boss_progress.conversation_history = '[]'
+    
+    db.session.commit()
+    return migrated
+
+def backfill_new_tables():
+    """Fill UserStats and NexusMessage on databases created before they existed.
+
+    Progress and leaderboards read UserStats only, so it is rebuilt when it
+    is empty while scores or clues exist. Cheap when there is nothing to do.
+    """
+    if UserStats.query.first() is None and (Score.query.first() or DiscoveredClue.query.first()):
+        logger.info("Rebuilt %d user stats rows from score and clue history", rebuild_user_stats())
+    migrate_conversation_history()
+
+# Clue texts never change while the app runs, so they are loaded once and
+# shared by every request instead of being queried from game_clue each time
+_clue_catalog = None
+
+def get_clue_catalog():
+    """Return a read-only {(game_name, clue_id): clue_text} mapping.
+
+    Built from GAME_PROGRESSION and then the game_clue table, so clues
+    edited in the database win. Loaded on first use; call
+    invalidate_clue_catalog() after reseeding clues.
+    """
+    global _clue_catalog
+    if _clue_catalog is None:
+        catalog = {(game_id, 1): game_data['clue_text']
+                   for game_id, game_data in GAME_PROGRESSION.items()
+                   if game_data.get('clue_text')}
+        for clue in GameClue.query.all():
+            catalog[(clue.game_name, clue.clue_id)] = clue.clue_text
+        _clue_catalog = MappingProxyType(catalog)
+    return _clue_catalog
+
+def invalidate_clue_catalog():
+    """Drop the cached clue catalog so the next lookup reloads it"""
+    global _clue_catalog
+    _clue_catalog = None
+
+def get_discovered_clues(user_id):
+    """Return (game_name, clue_text) for each clue the user has discovered"""
+    catalog = get_clue_catalog()
+    discovered = db.session.query(DiscoveredClue.game_name, DiscoveredClue.clue_id) \
+                           .filter(DiscoveredClue.user_id == user_id) \
+                           .order_by(DiscoveredClue.game_name) \
+                           .all()
+    return [(game_name, catalog[(game_name, clue_id)])
+            for game_name, clue_id in discovered
+            if (game_name, clue_id) in catalog]
+
+def next_trivia_question(user_id, live_question=None):
+    """Serve the next unseen question from the trivia pool.
+
+    Moves the player's TriviaProgress forward without committing (the
+    caller's commit saves it). Falls back to live_question, or generates
+    one live, if the player has already seen the whole pool.
+    """
+    ensure_trivia_refill_worker()
+    
+    progress = get_or_create(TriviaProgress, user_id=user_id, defaults={'last_question_id': 0})
+    
+    question = TriviaQuestion.query.filter(TriviaQuestion.id > (progress.last_question_id or 0)) \
+                                   .order_by(TriviaQuestion.id) \
+                                   .first()
+    if not question:
+        _trivia_refill_wanted.set()
+        return live_question or trivia()
+    
+    progress.last_question_id = question.id
+    return {'question': question.question, 'answer': question.answer}
+
+def trivia_pool_exhausted(user_id):
+    """True if the player has seen every question in the pool"""
+    last_seen = db.session.query(TriviaProgress.last_question_id) \
+                          .filter_by(user_id=user_id).scalar() or 0
+    return not db.session.query(TriviaQuestion.query.filter(TriviaQuestion.id > last_seen)
+                                .exists()).scalar()
+
+def refill_trivia_pool():
+    """Add a batch of questions if the pool is running low. Returns how many were added."""
+    # Questions nobody has reached yet
+    furthest = db.session.query(db.func.max(TriviaProgress.last_question_id)).scalar() or 0
+    unseen = TriviaQuestion.query.filter(TriviaQuestion.id > furthest).count()
+    if unseen >= TRIVIA_POOL_CONFIG['low_water']:
+        return 0
+    
+    batch = trivia_batch(TRIVIA_POOL_CONFIG['batch_size'])
+    
+    # Skip questions already in the pool (or repeated within the batch)
+    seen = {question for (question,) in db.session.query(TriviaQuestion.question)
+            .filter(TriviaQuestion.question.in_([item['question'] for item in batch]))}
+    added = 0
+    for item in batch:
+        if item['question'] in seen:
+            continue
+        seen.add(item['question'])
+        db.session.add(TriviaQuestion(question=item['question'], answer=item['answer']))
+        added += 1
+    db.session.commit()
+    return added
+
+_trivia_refill_thread = None
+_trivia_refill_wanted = threading.Event()
+
+def ensure_trivia_refill_worker():
+    """Start this process's trivia refill thread if it isn't running yet"""
+    global _trivia_refill_thread
+    if _trivia_refill_thread is not None and _trivia_refill_thread.is_alive():
+        return
+    
+    flask_app = current_app._get_current_object()
+    
+    def refill_loop():
+        while True:
+            try:
+                with flask_app.app_context():
+                    refill_trivia_pool()
+            except Exception as e:
+                logger.exception("Trivia refill error: %s", e)
+            # Wait for the next check, or wake early when a player runs out
+            _trivia_refill_wanted.wait(TRIVIA_POOL_CONFIG['check_interval'])
+            _trivia_refill_wanted.clear()
+    
+    _trivia_refill_thread = threading.Thread(target=refill_loop, name='trivia-refill', daemon=True)
+    _trivia_refill_thread.start()
+
+# Coin ledger: balances change with a single UPDATE in the database instead of
+# reading the row into Python, so concurrent requests can't lose updates
+def _update_balance(user_id, change, minimum=None):
+    """Run UPDATE player_coins SET coins = coins + change and return the new balance.
+
+    With minimum set, the row only changes if coins >= minimum. Returns None
+    when no row was updated.
+    """
+    query = db.update(PlayerCoins).where(PlayerCoins.user_id == user_id)
+    if minimum is not None:
+        query = query.where(PlayerCoins.coins >= minimum)
+    query = query.values(coins=PlayerCoins.coins + change) \
+                 .returning(PlayerCoins.coins) \
+                 .execution_options(synchronize_session=False)
+    new_balance = db.session.execute(query).scalar()
+    if new_balance is not None:
+        queue_coin_event(user_id, change, new_balance)
+    return new_balance
+
+def credit_coins(user_id, amount, source=None):
+    """Add coins to a player's balance and return the new balance.
+
+    Records a CoinTransaction when source is given. Doesn't commit.
+    """
+    new_balance = _update_balance(user_id, amount)
+    if new_balance is None:
+        # First coins for this player
+        db.session.add(PlayerCoins(user_id=user_id, coins=amount))
+        new_balance = amount
+        queue_coin_event(user_id, amount, new_balance)
+    
+    if source:
+        db.session.add(CoinTransaction(user_id=user_id, amount=amount, source=source))
+    return new_balance
+
+def debit_coins(user_id, amount, source=None):
+    """Take coins from a player only if they have at least that many.
+
+    Returns the new balance, or None if the balance was too low (or the
+    player has no coins row). Records a CoinTransaction when source is given
+    and the debit went through. Doesn't commit.
+    """
+    new_balance = _update_balance(user_id, -amount, minimum=amount)
+    if new_balance is not None and source:
+        db.session.add(CoinTransaction(user_id=user_id, amount=-amount, source=source))
+    return new_balance
+
+# Coin ledger upkeep, run by ledger_maintenance.py. CoinTransaction only ever
+# grows, so checkpoints record each user's ledger total up to a transaction id
+# and old transactions are rolled up into CoinTransactionArchive. Checking a
+# balance then only sums the transactions since the user's checkpoint.
+
+def checkpoint_coin_ledger():
+    """Move every user's checkpoint up to the newest settled transaction.
+
+    Transactions newer than COIN_LEDGER_CONFIG['settle_seconds'] are left
+    for the next run, so one still being committed can't be skipped. Commits
+    every batch_size transaction ids; returns the checkpoint's transaction id.
+    """
+    # Every run moves all users up to the same id, so the highest checkpoint
+    # is where the last run stopped
+    done = db.session.query(db.func.max(CoinCheckpoint.last_transaction_id)).scalar() or 0
+    settled = utc_now() - timedelta(seconds=COIN_LEDGER_CONFIG['settle_seconds'])
+    target = db.session.query(db.func.max(CoinTransaction.id)) \
+                       .filter(CoinTransaction.id > done, CoinTransaction.timestamp < settled) \
+                       .scalar()
+    while target is not None and done < target:
+        upto = min(done + COIN_LEDGER_CONFIG['batch_size'], target)
+        totals = db.session.query(CoinTransaction.user_id, db.func.sum(CoinTransaction.amount)) \
+                           .filter(CoinTransaction.id > done, CoinTransaction.id <= upto) \
+                           .group_by(CoinTransaction.user_id).all()
+        if totals:
+            db.session.execute(
+                upsert(CoinCheckpoint, ['user_id'],
+                       lambda excluded: {'balance': CoinCheckpoint.balance + excluded.balance,
+                                         'last_transaction_id': excluded.last_transaction_id,
+                                         'updated_at': db.func.current_timestamp()}),
+                [{'user_id': user_id, 'balance': amount, 'last_transaction_id': upto}
+                 for user_id, amount in totals])
+        db.session.commit()
+        done = upto
+    return done
+
+def compact_coin_ledger():
+    """Roll transactions older than archive_after_days into CoinTransactionArchive.
+
+    Only transactions already covered by a checkpoint are moved, so
+    reconciliation never needs the archive. Commits every batch_size
+    transactions; returns how many were moved.
+    """
+    checkpointed = db.session.query(db.func.max(CoinCheckpoint.last_transaction_id)).scalar() or 0
+    cutoff = utc_now() - timedelta(days=COIN_LEDGER_CONFIG['archive_after_days'])
+    old = db.and_(CoinTransaction.id <= checkpointed, CoinTransaction.timestamp < cutoff)
+    moved = 0
+    while True:
+        batch = db.session.query(CoinTransaction.id).filter(old) \
+                          .order_by(CoinTransaction.id).limit(COIN_LEDGER_CONFIG['batch_size']).subquery()
+        upto = db.session.query(db.func.max(batch.c.id)).scalar()
+        if upto is None:
+            return moved
+        in_batch = db.and_(old, CoinTransaction.id <= upto)
+        day = db.func.date(CoinTransaction.timestamp, type_=db.Date)
+        totals = db.session.query(CoinTransaction.user_id, day, CoinTransaction.source,
+                                  db.func.sum(CoinTransaction.amount), db.func.count()) \
+                           .filter(in_batch) \
+                           .group_by(CoinTransaction.user_id, day, CoinTransaction.source).all()
+        db.session.execute(
+            upsert(CoinTransactionArchive, ['user_id', 'day', 'source'],
+                   lambda excluded: {'amount': CoinTransactionArchive.amount + excluded.amount,
+                                     'transactions': CoinTransactionArchive.transactions + excluded.transactions}),
+            [{'user_id': user_id, 'day': day, 'source': source, 'amount': amount, 'transactions': count}
+             for user_id, day, source, amount, count in totals])
+        db.session.execute(db.delete(CoinTransaction).where(in_batch))
+        db.session.commit()
+        moved += sum(count for *_, count in totals)
+
+def reconcile_coins(user_ids=None):
+    """Compare balances with the ledger, returning [(user_id, coins, ledger_total)] that differ.
+
+    The ledger total is the user's checkpoint plus the transactions after
+    it, so this reads recent activity rather than whole histories. Checks
+    every player in pages of batch_size unless user_ids is given.
+    """
+    recent = db.session.query(db.func.coalesce(db.func.sum(CoinTransaction.amount), 0)) \
+                       .filter(CoinTransaction.user_id == PlayerCoins.user_id,
+                               CoinTransaction.id > db.func.coalesce(CoinCheckpoint.last_transaction_id, 0)) \
+                       .correlate(PlayerCoins, CoinCheckpoint).scalar_subquery()
+    query = db.session.query(PlayerCoins.user_id, PlayerCoins.coins,
+                             db.func.coalesce(CoinCheckpoint.balance, 0) + recent) \
+                      .outerjoin(CoinCheckpoint, CoinCheckpoint.user_id == PlayerCoins.user_id)
+    if user_ids is not None:
+        return [row for row in query.filter(PlayerCoins.user_id.in_(user_ids)) if row[1] != row[2]]
+    
+    mismatches = []
+    after = 0
+    while True:
+        rows = query.filter(PlayerCoins.user_id > after).order_by(PlayerCoins.user_id) \
+                    .limit(COIN_LEDGER_CONFIG['batch_size']).all()
+        if not rows:
+            return mismatches
+        mismatches += [tuple(row) for row in rows if row[1] != row[2]]
+        after = rows[-1][0]
+
+# History pages for /user/transactions and /user/scores. Pages are newest
+# first and continue from a cursor holding the (timestamp, id) of the last
+# row sent, so page 100 is found through the index as quickly as page 1.
+
+def encode_cursor(timestamp, row_id, kind=None):
+    cursor = f"{timestamp.isoformat()}_{row_id}" if timestamp else ''
+    return f"{kind}:{cursor}" if kind else cursor
+
+def decode_cursor(cursor):
+    """Return (kind, timestamp, id) from a cursor, raising ValueError if it's malformed"""
+    kind, position = cursor.split(':', 1) if cursor.startswith('archive') else (None, cursor)
+    if not position:
+        return kind, None, None  # Start of the archive
+    timestamp, row_id = position.rsplit('_', 1)
+    return kind, datetime.fromisoformat(timestamp), int(row_id)
+
+def keyset_page(query, time_column, id_column, after=None, limit=20):
+    """Return (rows, has_more) for the rows of query older than the (time, id) in after"""
+    if after:
+        after_time, after_id = after
+        # Compare with the time as the cursor's row has it stored. SQLite keeps
+        # CURRENT_TIMESTAMP defaults without microseconds but binds datetimes
+        # with them, so the decoded time would sort after its own row. The
+        # decoded time only counts once that row is gone (compacted).
+        boundary = db.func.coalesce(
+            db.select(time_column).where(id_column == after_id).correlate(None).scalar_subquery(),
+            after_time)
+        # The plain <= lets the database seek the index, the OR settles ties
+        query = query.filter(time_column <= boundary,
+                             db.or_(time_column < boundary, id_column < after_id))
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+def history_filters(query, time_column, start=None, end=None):
+    """Keep rows from the start day up to and including the end day"""
+    if start:
+        query = query.filter(time_column >= start)
+    if end:
+        query = query.filter(time_column < end + timedelta(days=1))
+    return query
+
+def get_transaction_page(user_id, cursor=None, source=None, start=None, end=None, limit=None):
+    """A page of a player's coin history and the cursor of the next page (None at the end).
+
+    Transactions moved to CoinTransactionArchive by compact_coin_ledger
+    follow the live ones as daily totals per source. start and end are
+    dates; a malformed cursor raises ValueError.
+    """
+    limit = limit or HISTORY_CONFIG['page_size']
+    kind, after_time, after_id = decode_cursor(cursor) if cursor else (None, None, None)
+    page = []
+    if kind != 'archive':
+        query = history_filters(CoinTransaction.query.filter(CoinTransaction.user_id == user_id),
+                                CoinTransaction.timestamp, start, end)
+        if source:
+            query = query.filter(CoinTransaction.source == source)
+        rows, has_more = keyset_page(query, CoinTransaction.timestamp, CoinTransaction.id,
+                                     (after_time, after_id) if cursor else None, limit)
+        page = [{'id': t.id, 'amount': t.amount, 'source': t.source,
+                 'timestamp': t.timestamp.isoformat(), 'archived': False} for t in rows]
+        if has_more:
+            return page, encode_cursor(rows[-1].timestamp, rows[-1].id)
+    
+    # Older history: daily totals
+    query = CoinTransactionArchive.query.filter(CoinTransactionArchive.user_id == user_id)
+    query = history_filters(query, CoinTransactionArchive.day, start, end)
+    if source:
+        query = query.filter(CoinTransactionArchive.source == source)
+    rows, has_more = keyset_page(query, CoinTransactionArchive.day, CoinTransactionArchive.id,
+                                 (after_time.date(), after_id) if kind and after_time else None,
+                                 limit - len(page))
+    page += [{'id': t.id, 'amount': t.amount, 'source': t.source, 'timestamp': t.day.isoformat(),
+              'archived': True, 'transactions': t.transactions} for t in rows]
+    if not has_more:
+        return page, None
+    # After a full page of live transactions the next page starts the archive
+    return page, encode_cursor(rows[-1].day if rows else None, rows[-1].id if rows else None, 'archive')
+
+def get_score_page(user_id, cursor=None, game=None, start=None, end=None, limit=None):
+    """A page of a player's scores and the cursor of the next page (None at the end)"""
+    limit = limit or HISTORY_CONFIG['page_size']
+    _, after_time, after_id = decode_cursor(cursor) if cursor else (None, None, None)
+    query = history_filters(Score.query.filter(Score.user_id == user_id), Score.date, start, end)
+    if game:
+        query = query.filter(Score.game == game)
+    rows, has_more = keyset_page(query, Score.date, Score.id,
+                                 (after_time, after_id) if cursor else None, limit)
+    page = [{'id': s.id, 'game': s.game, 'score': s.score, 'date': s.date.isoformat()} for s in rows]
+    return page, encode_cursor(rows[-1].date, rows[-1].id) if has_more else None
+
+# Live updates: coin, clue and unlock changes are pushed to the player's open
+# pages over /events once the transaction that made them commits. The broker
+# only reaches this process's streams unless EVENTS_BROKER_URL points at a
+# shared backend (see events.make_broker).
+event_broker = make_broker(os.getenv('EVENTS_BROKER_URL'), EVENTS_CONFIG['queue_size'])
+# Under a WSGI server every open stream ties up a request thread for as long
+# as the page stays open, so pages only open one when the server can hold
+# them cheaply. asgi.py turns this on; otherwise pages poll /user/coins.
+app.config['EVENTS_STREAMS'] = os.getenv('EVENTS_STREAMS') == '1'
+
+def queue_event(user_id, event_type, data):
+    """Publish an event to the player's pages when the current transaction commits"""
+    db.session.info.setdefault('pending_events', []).append((user_id, event_type, data))
+
+def queue_coin_event(user_id, change, balance):
+    """Note a balance change; one coins event per player is sent on commit"""
+    changes = db.session.info.setdefault('coin_changes', {})
+    first_balance = changes[user_id][0] if user_id in changes else balance - change
+    changes[user_id] = (first_balance, balance)
+
+@db.event.listens_for(db.session, 'after_commit')
+def publish_committed_events(session):
+    for user_id, (old_balance, balance) in session.info.pop('coin_changes', {}).items():
+        identity_cache.update(user_id, lambda identity: (*identity[:2], balance))
+        event_broker.publish(user_id, 'coins', {'coins': balance})
+        # Games whose coin requirement was crossed either way
+        for game_id, game_data in GAME_PROGRESSION.items():
+            required = game_data['coins_required']
+            if min(old_balance, balance) < required <= max(old_balance, balance):
+                event_broker.publish(user_id, 'unlock', {
+                    'game': game_id,
+                    'display_name': game_data['display_name'],
+                    'unlocked': balance >= required
+                })
+    for user_id, event_type, data in session.info.pop('pending_events', []):
+        event_broker.publish(user_id, event_type, data)
+
+@db.event.listens_for(db.session, 'after_transaction_end')
+def discard_rolled_back_events(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('coin_changes', None)
+        session.info.pop('pending_events', None)
+        session.info.pop('changed_users', None)
+
+# Leaderboards are kept in memory per process, loaded from UserStats (or
+# PlayerCoins for the coins board) and updated as scores are saved
+_leaderboards = {}  # board name -> (Leaderboard, loaded_at)
+
+def is_leaderboard(board):
+    return board == 'coins' or board in LEADERBOARD_CONFIG['games']
+
+def get_leaderboard(board):
+    """Return the Leaderboard for a game or 'coins', reloading it when stale"""
+    entry = _leaderboards.get(board)
+    if entry is None or time.time() - entry[1] > LEADERBOARD_CONFIG['refresh_seconds']:
+        if board == 'coins':
+            rows = db.session.query(PlayerCoins.user_id, PlayerCoins.coins).all()
+        else:
+            rows = db.session.query(UserStats.user_id, UserStats.best_score) \
+                             .filter(UserStats.game == board, UserStats.play_count > 0) \
+                             .all()
+        leaderboard = Leaderboard(LEADERBOARD_CONFIG['size'])
+        leaderboard.load(rows)
+        entry = (leaderboard, time.time())
+        _leaderboards[board] = entry
+    return entry[0]
+
+def update_leaderboard(board, user_id, score):
+    """Record a new score on a board if that board is loaded in this process"""
+    entry = _leaderboards.get(board)
+    if entry is not None:
+        entry[0].update(user_id, score)
+
+def get_leaderboard_data(board, user_id):
+    """Top entries with usernames plus the user's own rank"""
+    leaderboard = get_leaderboard(board)
+    top = leaderboard.top()
+    
+    user_ids = [entry_user_id for rank, entry_user_id, score in top]
+    usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(user_ids)).all())
+    
+    return {
+        'board': board,
+        'title': GAME_PROGRESSION[board]['display_name'] if board in GAME_PROGRESSION else '💰 Coins',
+        'top': [{'rank': rank, 'username': usernames.get(entry_user_id, '?'), 'score': score}
+                for rank, entry_user_id, score in top],
+        'my_rank': leaderboard.rank(user_id),
+        'my_score': leaderboard.score(user_id),
+        'players': len(leaderboard)
+    }
+
+# Score ingestion: game-over scores go on a queue and a writer thread saves
+# them in batches, one multi-row Score insert plus one UserStats upsert per
+# batch, so score posts don't each wait for SQLite's write lock
+def write_scores(scores):
+    """Save a batch of (user_id, game, score, played_at) and update UserStats and leaderboards"""
+    db.session.execute(db.insert(Score), [
+        # CURRENT_TIMESTAMP, the column default, is UTC
+        {'user_id': user_id, 'game': game, 'score': score,
+         'date': utc_from_timestamp(played_at)}
+        for user_id, game, score, played_at in scores])
+    
+    # Fold each player's scores in the batch into one stats row
+    totals = {}
+    for user_id, game, score, played_at in scores:
+        best, count, last = totals.get((user_id, game), (score, 0, played_at))
+        totals[(user_id, game)] = (max(best, score), count + 1, max(last, played_at))
+    
+    upsert_stats = upsert(
+        UserStats,
+        ['user_id', 'game'],
+        lambda excluded: {
+            # Same rule as update_user_stats: the first play sets the best score
+            'best_score': db.case((db.and_(UserStats.play_count > 0, UserStats.best_score > excluded.best_score),
+                                   UserStats.best_score),
+                                  else_=excluded.best_score),
+            'play_count': UserStats.play_count + excluded.play_count,
+            'last_played': excluded.last_played
+        }
+    ).values([
+        {'user_id': user_id, 'game': game, 'best_score': best, 'play_count': count,
+         'last_played': utc_from_timestamp(last), 'has_clue': False}
+        for (user_id, game), (best, count, last) in totals.items()
+    ]).returning(UserStats.user_id, UserStats.game, UserStats.best_score)
+    best_scores = db.session.execute(upsert_stats).all()
+    db.session.commit()
+    
+    for user_id, game, best_score in best_scores:
+        update_leaderboard(game, user_id, best_score)
+
+score_writer = BatchWriter(write_scores,
+                           batch_size=SCORE_INGEST_CONFIG['batch_size'],
+                           flush_interval=SCORE_INGEST_CONFIG['flush_interval'],
+                           queue_size=SCORE_INGEST_CONFIG['queue_size'],
+                           name='score-writer')
+# Save queued scores when the worker shuts down
+atexit.register(score_writer.stop)
+
+def score_write_behind():
+    """Whether game-over scores go through score_writer"""
+    # An in-memory database is one connection shared by every thread, so
+    # the writer thread can't have its own transaction
+    return SCORE_INGEST_CONFIG['write_behind'] and db.engine.url.database not in (None, '', ':memory:')
+
+def record_score(user_id, game, score):
+    """Queue a score for the writer thread, or save it now if the queue stays full"""
+    item = (user_id, game, score, time.time())
+    score_writer.start(current_app._get_current_object().app_context)
+    if not score_writer.put(item, timeout=SCORE_INGEST_CONFIG['enqueue_timeout']):
+        write_scores([item])
+
+# Coin Cruncher: the server decides when the cruncher shows up and how much it
+# steals, using COIN_CRUNCHER_CONFIG. Each player's next event is a
+# CruncherState row, and a thread in every worker process applies the ones
+# that fall due, so the browser only displays what happened.
+_cruncher_thread = None
+
+def next_cruncher_appearance(now):
+    delay = random.uniform(COIN_CRUNCHER_CONFIG['min_appearance_interval'],
+                           COIN_CRUNCHER_CONFIG['max_appearance_interval'])
+    return now + timedelta(seconds=delay)
+
+def cruncher_steal(user_id, amount):
+    """Take amount coins from the player, or whatever they have left if that's less.
+
+    Returns (amount_stolen, coins_remaining). Doesn't commit.
+    """
+    coins_remaining = debit_coins(user_id, amount, source='coin_cruncher')
+    if coins_remaining is not None:
+        return amount, coins_remaining
+    
+    # Can't steal more than player has, so take whatever is left
+    balance = db.session.query(PlayerCoins.coins).filter_by(user_id=user_id).scalar() or 0
+    if balance > 0:
+        coins_remaining = debit_coins(user_id, balance, source='coin_cruncher')
+        if coins_remaining is not None:
+            return balance, coins_remaining
+    
+    # Nothing left to steal (or another request spent it first)
+    return 0, balance
+
+def claim_cruncher_event(event, **values):
+    """Replace the player's event with values, unless it has already changed.
+
+    Returns whether this call replaced it; with several processes working
+    through the same events only one does. Doesn't commit.
+    """
+    query = db.update(CruncherState).where(CruncherState.user_id == event.user_id,
+                                           CruncherState.kind == event.kind,
+                                           CruncherState.due_at == event.due_at)
+    return db.session.execute(query.values(**values)
+                              .execution_options(synchronize_session=False)).rowcount == 1
+
+def run_cruncher_events(now):
+    """Handle every cruncher event that is due: crunchers appear, and the ones
+    nobody defeated in time steal. Commits every batch_size events. Needs an
+    app context.
+
+    A cruncher only appears to players whose page checked in within
+    present_within (see cruncher_heartbeat), so nobody is robbed by one
+    they couldn't see. For the others the appearance is put off.
+    """
+    max_idle = timedelta(seconds=COIN_CRUNCHER_CONFIG['max_appearance_interval'] +
+                                 COIN_CRUNCHER_CONFIG['stay_duration'])
+    present_within = timedelta(seconds=COIN_CRUNCHER_CONFIG['present_within'])
+    while True:
+        due = db.session.query(CruncherState.user_id, CruncherState.kind, CruncherState.due_at,
+                               CruncherState.amount, CruncherState.last_seen) \
+                        .filter(CruncherState.due_at <= now) \
+                        .order_by(CruncherState.due_at) \
+                        .limit(COIN_CRUNCHER_CONFIG['batch_size']).all()
+        balances = {}
+        for event in due:
+            if event.kind == 'appear':
+                if now - event.last_seen > max_idle:
+                    # The player has left, scheduling starts again when they're back
+                    db.session.execute(db.delete(CruncherState).where(
+                        CruncherState.user_id == event.user_id, CruncherState.kind == event.kind,
+                        CruncherState.due_at == event.due_at))
+                elif now - event.last_seen > present_within:
+                    # No page open (or none visible) right now
+                    claim_cruncher_event(event, due_at=next_cruncher_appearance(now))
+                else:
+                    amount = random.randint(COIN_CRUNCHER_CONFIG['min_steal_amount'],
+                                            COIN_CRUNCHER_CONFIG['max_steal_amount'])
+                    claim_cruncher_event(event, kind='steal', amount=amount,
+                                         due_at=now + timedelta(seconds=COIN_CRUNCHER_CONFIG['stay_duration']))
+            # Skipped if it was defeated or another process got there first.
+            # The steal commits together with the claim, so it happens once.
+            elif claim_cruncher_event(event, kind='appear', amount=None, due_at=next_cruncher_appearance(now)):
+                stolen, coins_remaining = cruncher_steal(event.user_id, event.amount)
+                db.session.execute(db.update(CruncherState)
+                                   .where(CruncherState.user_id == event.user_id)
+                                   .values(last_steal_amount=stolen, last_steal_coins=coins_remaining)
+                                   .execution_options(synchronize_session=False))
+                if stolen:
+                    balances[event.user_id] = coins_remaining
+        db.session.commit()
+        
+        for user_id, coins in balances.items():
+            update_leaderboard('coins', user_id, coins)
+        if len(due) < COIN_CRUNCHER_CONFIG['batch_size']:
+            return
+        # Give requests (and other processes) waiting to write a turn at the lock
+        time.sleep(COIN_CRUNCHER_CONFIG['batch_pause'])
+
+def next_cruncher_due():
+    """When the earliest cruncher event is due, or None if there are none"""
+    return db.session.query(db.func.min(CruncherState.due_at)).scalar()
+
+def get_cruncher_state(user_id, now):
+    """What the player's browser should show, scheduling a first appearance if needed. Commits."""
+    state = get_or_create(CruncherState, user_id=user_id, defaults={
+        'kind': 'appear', 'due_at': next_cruncher_appearance(now), 'last_seen': now})
+    state.last_seen = now
+    
+    result = {'click_threshold': COIN_CRUNCHER_CONFIG['click_threshold'],
+              'heartbeat_interval': COIN_CRUNCHER_CONFIG['heartbeat_interval']}
+    due_in = round(max((state.due_at - now).total_seconds(), 0), 2)
+    if state.kind == 'appear':
+        result.update(state='waiting', appears_in=due_in)
+    else:
+        result.update(state='active', amount=state.amount, steals_in=due_in)
+    
+    if state.last_steal_amount is not None:
+        # Reported once, even when two of the player's pages check in together
+        picked_up = db.session.execute(
+            db.update(CruncherState)
+              .where(CruncherState.user_id == user_id,
+                     CruncherState.last_steal_amount == state.last_steal_amount,
+                     CruncherState.last_steal_coins == state.last_steal_coins)
+              .values(last_steal_amount=None, last_steal_coins=None)
+              .execution_options(synchronize_session=False)).rowcount
+        if picked_up:
+            result['last_steal'] = {'amount_stolen': state.last_steal_amount,
+                                    'coins_remaining': state.last_steal_coins}
+    db.session.commit()
+    return result
+
+def cruncher_heartbeat(user_id, now):
+    """Note that the player has a page open and visible, which a cruncher needs
+    before it appears. A single UPDATE, sent every heartbeat_interval. Returns
+    False if the player has nothing scheduled (see get_cruncher_state). Commits."""
+    seen = db.session.execute(
+        db.update(CruncherState)
+          .where(CruncherState.user_id == user_id)
+          .values(last_seen=now)
+          .execution_options(synchronize_session=False)).rowcount == 1
+    db.session.commit()
+    return seen
+
+def defeat_cruncher(user_id, now):
+    """Stop the player's cruncher before it steals. Returns False if there wasn't one. Commits."""
+    defeated = db.session.execute(
+        db.update(CruncherState)
+          .where(CruncherState.user_id == user_id, CruncherState.kind == 'steal',
+                 CruncherState.due_at > now)
+          .values(kind='appear', amount=None, due_at=next_cruncher_appearance(now))
+          .execution_options(synchronize_session=False)).rowcount == 1
+    db.session.commit()
+    return defeated
+
+def ensure_cruncher_worker():
+    """Start this process's Coin Cruncher thread if it isn't running yet"""
+    global _cruncher_thread
+    if _cruncher_thread is not None and _cruncher_thread.is_alive():
+        return
+    
+    flask_app = current_app._get_current_object()
+    
+    def cruncher_loop():
+        while True:
+            # Other processes schedule events too, so look again after
+            # poll_interval even when nothing is due before then
+            wait = COIN_CRUNCHER_CONFIG['poll_interval']
+            try:
+                with flask_app.app_context():
+                    run_cruncher_events(utc_now())
+                    next_due = next_cruncher_due()
+                if next_due is not None:
+                    wait = min(wait, (next_due - utc_now()).total_seconds())
+            except Exception as e:
+                logger.exception("Coin Cruncher error: %s", e)
+            time.sleep(max(wait, 0.01))
+    
+    _cruncher_thread = threading.Thread(target=cruncher_loop, name='coin-cruncher', daemon=True)
+    _cruncher_thread.start()
+
+def grant_reward(user_id, game, **event):
+    """Apply a game's rewards from GAME_REWARDS and commit once.
+
+    event is the data the game submitted (score, input, temperature, ...).
+    Marks the clue as discovered and records the coin transactions in a
+    single transaction, then queues the score for record_score (or saves
+    it in the same transaction if write-behind is off). Returns the result of
+    rewards.evaluate_reward with 'clue_text' added when the clue is shown.
+    """
+    rules = GAME_REWARDS[game]
+    
+    # One row tells us both the previous stats and whether the clue is known
+    stats = None
+    if rules.get('records_score') or rules.get('clue_trigger'):
+        stats = UserStats.query.filter_by(user_id=user_id, game=game).first()
+    
+    plays_today = 0
+    if 'daily_limit' in rules:
+        # Days start at midnight UTC, like the transaction timestamps
+        start_of_today = datetime.combine(utc_now().date(), datetime.min.time())
+        plays_today = CoinTransaction.query.filter(
+            CoinTransaction.user_id == user_id,
+            CoinTransaction.source == rules['play_source'],
+            CoinTransaction.timestamp >= start_of_today
+        ).count()
+    
+    # Rolled for clue_chance only if needed, and the same if worked out again below
+    roll = cache(random.random)
+    result = evaluate_reward(game, event,
+                             clue_known=bool(stats and stats.has_clue),
+                             plays_today=plays_today, rand=roll)
+    
+    # The stats row can be missing or behind, DiscoveredClue has the last word
+    clue_was_known = False
+    if result['clue_new'] and not insert_ignore(DiscoveredClue, user_id=user_id, game_name=game, clue_id=1):
+        clue_was_known = True
+        result = evaluate_reward(game, event, clue_known=True,
+                                 plays_today=plays_today, rand=roll)
+    
+    # With write-behind on the score is queued after the commit below
+    save_score = result['score'] is not None and not score_write_behind()
+    if save_score:
+        db.session.add(Score(user_id=user_id, game=game, score=result['score']))
+    
+    if save_score or result['clue_new'] or clue_was_known:
+        stats = update_user_stats(user_id, game, score=result['score'] if save_score else None,
+                                  clue_found=result['clue_new'] or clue_was_known, stats=stats)
+    
+    if result['clue_new']:
+        queue_event(user_id, 'clue', {'game': game, 'text': get_clue_catalog().get((game, 1), '')})
+    
+    for amount, source in result['transactions']:
+        db.session.add(CoinTransaction(user_id=user_id, amount=amount, source=source))
+    
+    if result['earned_coins'] > 0:
+        result['coins'] = credit_coins(user_id, result['earned_coins'])
+    
+    db.session.commit()
+    
+    if save_score:
+        update_leaderboard(game, user_id, stats.best_score)
+    elif result['score'] is not None:
+        record_score(user_id, game, result['score'])
+    if 'coins' in result:
+        update_leaderboard('coins', user_id, result['coins'])
+    
+    if result['show_clue']:
+        result['clue_text'] = get_clue_catalog().get((game, 1), '')
+    return result
+
+# Identity cache: the logged-in player's user row and coin balance, kept per
+# process so most requests don't query them. Balances changed in this process
+# are updated on commit; changes made by other workers show up when the entry
+# expires, and game access re-checks the database before turning a player away.
+identity_cache = TTLCache(
+    maxsize=int(os.getenv('IDENTITY_CACHE_SIZE', 10000)),
+    ttl=int(os.getenv('IDENTITY_CACHE_TTL', 60)),
+    error_ttl=0  # Don't remember unknown user ids
+)
+
+class CachedUser(UserMixin):
+    """The logged-in player as Flask-Login sees them, built from identity_cache"""
+    
+    def __init__(self, id, username, coins):
+        self.id = id
+        self.username = username
+        self.coins = coins
+
+def load_identity(user_id):
+    """(id, username, coins) for a player in one query, or None if they don't exist"""
+    row = db.session.query(User.id, User.username, PlayerCoins.coins) \
+                    .outerjoin(PlayerCoins, PlayerCoins.user_id == User.id) \
+                    .filter(User.id == user_id).first()
+    return (row.id, row.username, row.coins or 0) if row else None
+
+def get_identity(user_id, refresh=False):
+    if refresh:
+        identity_cache.invalidate(user_id)
+    return identity_cache.get_or_load(user_id, lambda: load_identity(user_id),
+                                      is_error=lambda identity: identity is None)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    identity = get_identity(int(user_id))
+    return CachedUser(*identity) if identity else None
+
+@db.event.listens_for(User, 'after_update')
+@db.event.listens_for(User, 'after_delete')
+def user_changed(mapper, connection, user):
+    # Dropped from the cache once the change commits
+    db.session.info.setdefault('changed_users', set()).add(user.id)
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        identity_cache.invalidate(user_id)
 
 # Custom decorator to check game access
 def game_access_required(game_id):
@@ -98,12 +1223,13 @@ def game_access_required(game_id):
         def decorated_function(*args, **kwargs):
             # Skip access check for clickmaster (first game is always accessible)
             if game_id != 'clickmaster':
-                # Get user's coins
-                player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
-                user_coins = player_coins.coins if player_coins else 0
-                
                 # Check if user has enough coins to access the game
                 required_coins = GAME_PROGRESSION[game_id]['coins_required']
+                user_coins = current_user.coins
+                
+                if user_coins < required_coins:
+                    # The cached balance can be behind another worker, ask the database
+                    user_coins = get_identity(current_user.id, refresh=True)[2]
                 
                 if user_coins < required_coins:
                     flash(f"You need {required_coins} coins to unlock this game. You have {user_coins} coins.")
@@ -113,45 +1239,67 @@ def game_access_required(game_id):
         return decorated_function
     return decorator
 
+# Read replica: routes that only read and can show data a few seconds old
+# use @replica_reads. Players who just changed something keep reading from
+# the primary for REPLICA_STICKY_SECONDS so they see their own changes.
+def replica_reads(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not has_replica(db) or cookie_session.get('primary_until', 0) > time.time():
+            return f(*args, **kwargs)
+        use_replica(db.session)
+        try:
+            return f(*args, **kwargs)
+        finally:
+            use_replica(db.session, False)
+    return decorated_function
+
+@db.event.listens_for(db.session, 'after_commit')
+def stick_to_primary(session):
+    if session.info.get('wrote') and has_replica(db) and has_request_context():
+        cookie_session['primary_until'] = time.time() + REPLICA_STICKY_SECONDS
+
+def get_dashboard_data(user_id):
+    """Build the home page data with a fixed number of queries.
+
+    Returns (games_info, user_coins, boss_available). High scores and clue
+    flags are read from the UserStats rows in one query, so adding games to
+    GAME_PROGRESSION doesn't add round trips.
+    """
+    # Get user's coins
+    player_coins = PlayerCoins.query.filter_by(user_id=user_id).first()
+    user_coins = player_coins.coins if player_coins else 0
+    
+    # High scores and clue flags for every game come from the summary table
+    stats_by_game = {stats.game: stats for stats in UserStats.query.filter_by(user_id=user_id)}
+    
+    # Determine which games are unlocked
+    games_info = {}
+    for game_id, game_data in GAME_PROGRESSION.items():
+        stats = stats_by_game.get(game_id)
+        games_info[game_id] = {
+            'display_name': game_data['display_name'],
+            'description': game_data['description'],
+            'order': game_data['order'],
+            'unlocked': user_coins >= game_data['coins_required'],
+            'coins_required': game_data['coins_required'],
+            'coins_needed': max(0, game_data['coins_required'] - user_coins),
+            'has_clues': bool(stats and stats.has_clue),
+            'high_score': stats.best_score if stats and stats.best_score else 0
+        }
+    
+    # Check if boss battle is available
+    clue_count = sum(1 for stats in stats_by_game.values() if stats.has_clue)
+    boss_available = clue_count >= REQUIRED_CLUES and user_coins >= BOSS_BATTLE_COINS
+    
+    return games_info, user_coins, boss_available
+
 @app.route('/')
+@replica_reads
 def index():
     # Check if user is authenticated
     if current_user.is_authenticated:
-        # Get user's coins
-        player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
-        user_coins = player_coins.coins if player_coins else 0
-        
-        # Determine which games are unlocked
-        games_info = {}
-        for game_id, game_data in GAME_PROGRESSION.items():
-            # Check if the game is unlocked based on coins
-            unlocked = user_coins >= game_data['coins_required']
-            
-            # Get count of discovered clues for this game
-            clue_count = DiscoveredClue.query.filter_by(
-                user_id=current_user.id,
-                game_name=game_id
-            ).count()
-            
-            # Get the user's highest score for this game
-            high_score = db.session.query(db.func.max(Score.score)) \
-                .filter_by(user_id=current_user.id, game=game_id) \
-                .scalar()
-            
-            games_info[game_id] = {
-                'display_name': game_data['display_name'],
-                'description': game_data['description'],
-                'order': game_data['order'],
-                'unlocked': unlocked,
-                'coins_required': game_data['coins_required'],
-                'coins_needed': max(0, game_data['coins_required'] - user_coins),
-                'has_clues': clue_count > 0,
-                'high_score': high_score if high_score else 0
-            }
-        
-        # Check if boss battle is available
-        clue_count = DiscoveredClue.query.filter_by(user_id=current_user.id).count()
-        boss_available = clue_count >= REQUIRED_CLUES and user_coins >= BOSS_BATTLE_COINS
+        games_info, user_coins, boss_available = get_dashboard_data(current_user.id)
         
         # For authenticated users, skip the intro story and go straight to the games
         return render_template('index.html', 
@@ -165,17 +1313,42 @@ def index():
         # For non-authenticated users, show the intro
         return render_template('index.html', skip_intro=False)
 
+# Password hashing runs in worker processes so a burst of logins can't starve
+# the other routes; when too many are waiting, login and register answer 503
+password_hasher = PasswordHasher(PASSWORD_HASH_CONFIG['method'],
+                                 workers=PASSWORD_HASH_CONFIG['workers'],
+                                 max_pending=PASSWORD_HASH_CONFIG['max_pending'],
+                                 timeout=PASSWORD_HASH_CONFIG['timeout'])
+atexit.register(password_hasher.stop)
+
+def hasher_busy(template):
+    """503 page for when password_hasher has too many logins waiting"""
+    message = "Too many players are signing in right now, please try again in a moment"
+    response = app.make_response((render_template(template, error=message), 503))
+    response.headers['Retry-After'] = '2'
+    return response
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         user = User.query.filter_by(username=request.form['username']).first()
-        if user and check_password_hash(user.password, request.form['password']):
-            # Removed:
-            # user.last_login = datetime.now()
-            # db.session.commit()
-            
-            login_user(user)
-            return redirect(url_for('index'))
+        if user:
+            try:
+                matches, new_hash = password_hasher.verify(user.password, request.form['password'])
+            except HasherBusy:
+                return hasher_busy('login.html')
+            if matches:
+                # Removed:
+                # user.last_login = datetime.now()
+                # db.session.commit()
+                
+                if new_hash:
+                    # Hashed with older settings, store it with the current ones
+                    user.password = new_hash
+                    db.session.commit()
+                
+                login_user(user)
+                return redirect(url_for('index'))
         return render_template('login.html', error="Invalid credentials")
     return render_template('login.html')
 
@@ -185,7 +1358,10 @@ def register():
         username = request.form['username']
         if User.query.filter_by(username=username).first():
             return render_template('register.html', error="Username taken")
-        password = generate_password_hash(request.form['password'], method='pbkdf2:sha256')
+        try:
+            password = password_hasher.hash(request.form['password'])
+        except HasherBusy:
+            return hasher_busy('register.html')
         new_user = User(username=username, password=password)
         db.session.add(new_user)
         db.session.commit()
@@ -206,37 +1382,26 @@ def logout():
 
 @app.route('/profile')
 @login_required
+@replica_reads
 def profile():
-    # Get user's highest scores for each game
-    scores = db.session.query(Score.game, db.func.max(Score.score).label('score')) \
-                      .filter_by(user_id=current_user.id) \
-                      .group_by(Score.game) \
-                      .all()
-    
-    # Get total games played count
-    games_played = Score.query.filter_by(user_id=current_user.id).count()
+    # Get user's highest scores and games played from the summary table
+    user_stats = UserStats.query.filter_by(user_id=current_user.id) \
+                               .order_by(UserStats.game) \
+                               .all()
+    scores = [{"game": stats.game, "score": stats.best_score}
+              for stats in user_stats if stats.play_count]
+    games_played = sum(stats.play_count for stats in user_stats)
     
     # Get user's coins
     player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
     coins = player_coins.coins if player_coins else 0
     
     # Get user's discovered clues with their text
-    discovered_clues = db.session.query(DiscoveredClue, GameClue) \
-                               .join(GameClue, 
-                                    (DiscoveredClue.game_name == GameClue.game_name) & 
-                                    (DiscoveredClue.clue_id == GameClue.clue_id)) \
-                               .filter(DiscoveredClue.user_id == current_user.id) \
-                               .all()
+    clues = [{"game_name": game_name, "clue_text": clue_text}
+             for game_name, clue_text in get_discovered_clues(current_user.id)]
     
-    clues = [{"game_name": clue.DiscoveredClue.game_name, 
-             "clue_text": clue.GameClue.clue_text} 
-             for clue in discovered_clues]
-    
-    # Get recent coin transactions
-    transactions = CoinTransaction.query.filter_by(user_id=current_user.id) \
-                                .order_by(CoinTransaction.timestamp.desc()) \
-                                .limit(10) \
-                                .all()
+    # First page of the coin history, the page scrolls in the rest from /user/transactions
+    transactions, next_cursor = get_transaction_page(current_user.id)
     
     # Use default values instead of missing attributes
     boss_attempts = 0  # Default value 
@@ -249,6 +1414,7 @@ def profile():
                           coins=coins,
                           clues=clues,
                           transactions=transactions,
+                          next_cursor=next_cursor,
                           boss_attempts=boss_attempts,
                           victories=victories)
 
@@ -259,96 +1425,30 @@ def clickmaster():
     if request.method == 'POST':
         data = request.json
         score = data.get('score', 0)
-        print(f"Received score: {score}")
+        logger.debug("Received ClickMaster score %s from user %s", score, current_user.id)
         
-        # Save the score
-        new_score = Score(user_id=current_user.id, game='clickmaster', score=score)
-        db.session.add(new_score)
+        try:
+            # Save the score and award coins/clue in one transaction
+            result = grant_reward(current_user.id, 'clickmaster', score=score)
+        except Exception as e:
+            logger.exception("Error saving ClickMaster score: %s", e)
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
         
-        # Initialize response data
         response_data = {'message': 'Score saved'}
+        if result['earned_coins'] > 0:
+            response_data['earned_coins'] = result['earned_coins']
         
-        # Award coins based on score tiers
-        earned_coins = 0
-        if score >= 50:
-            earned_coins = 5
-        elif score >= 30:
-            earned_coins = 3
-        elif score >= 10:
-            earned_coins = 1
-        
-        # Handle special case for 42
-        if score == 42:
-            print("42 clicks detected - special handling")
-            # Extra coins bonus
-            earned_coins += 3
-            
-            # Always show the clue for 42 clicks, regardless of discovery status
-            clue = GameClue.query.filter_by(game_name='clickmaster', clue_id=1).first()
-            
-            # Create the clue if it doesn't exist
-            if not clue:
-                print("Creating clue as it doesn't exist")
-                clue = GameClue(
-                    game_name='clickmaster',
-                    clue_id=1,
-                    clue_text=GAME_PROGRESSION['clickmaster']['clue_text']
-                )
-                db.session.add(clue)
-            
-            # Mark as discovered if not already
-            discovered = DiscoveredClue.query.filter_by(
-                user_id=current_user.id,
-                game_name='clickmaster',
-                clue_id=1
-            ).first()
-            
-            if not discovered:
-                print("Marking clue as discovered")
-                discovered = DiscoveredClue(
-                    user_id=current_user.id,
-                    game_name='clickmaster',
-                    clue_id=1
-                )
-                db.session.add(discovered)
-            
-            # Always add clue to response for 42
+        # Always show the clue for 42 clicks, regardless of discovery status
+        if result['show_clue']:
             response_data['show_clue'] = True
-            response_data['clue'] = clue.clue_text
-            print(f"Added clue to response: {clue.clue_text}")
+            response_data['clue'] = result['clue_text']
         
-        # Award coins if earned
-        if earned_coins > 0:
-            player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
-            if player_coins:
-                player_coins.coins += earned_coins
-            else:
-                player_coins = PlayerCoins(user_id=current_user.id, coins=earned_coins)
-                db.session.add(player_coins)
-            
-            # Record transaction
-            transaction = CoinTransaction(
-                user_id=current_user.id,
-                amount=earned_coins,
-                source='clickmaster_play'
-            )
-            db.session.add(transaction)
-            
-            response_data['earned_coins'] = earned_coins
-        
-        try:
-            db.session.commit()
-            print(f"Final response data: {response_data}")
-            return jsonify(response_data)
-        except Exception as e:
-            print(f"Error committing to database: {e}")
-            db.session.rollback()
-            return jsonify({'error': str(e)}), 500
+        logger.debug("ClickMaster response: %s", response_data)
+        return jsonify(response_data)
     
     return render_template('games/clickmaster.html')
 
-
-
 @app.route('/games/emoji_memory', methods=['GET', 'POST'])
 @game_access_required('emoji_memory')
 def emoji_memory():
@@ -356,64 +1456,17 @@ def emoji_memory():
         data = request.json
         score = data.get('score', 0)
         
-        # Save the score
-        new_score = Score(user_id=current_user.id, game='emoji_memory', score=score)
-        db.session.add(new_score)
+        # Save the score, coins and clue are awarded when all 8 pairs are matched
+        result = grant_reward(current_user.id, 'emoji_memory', score=score)
         
-        # Initialize response data
         response_data = {'message': 'Score saved'}
-        
-        # Award coins based on score (matching all pairs)
-        if score == 8:  # If all 8 pairs are matched
-            # Award 5 coins
-            player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
-            if player_coins:
-                player_coins.coins += 5
-            else:
-                player_coins = PlayerCoins(user_id=current_user.id, coins=5)
-                db.session.add(player_coins)
-            
-            # Record the coin transaction
-            transaction = CoinTransaction(
-                user_id=current_user.id,
-                amount=5,
-                source='emoji_memory_complete'
-            )
-            db.session.add(transaction)
-            
-            # Add clue if all pairs were matched
-            clue = GameClue.query.filter_by(game_name='emoji_memory', clue_id=1).first()
-            if not clue:
-                clue = GameClue(
-                    game_name='emoji_memory',
-                    clue_id=1,
-                    clue_text=GAME_PROGRESSION['emoji_memory']['clue_text']
-                )
-                db.session.add(clue)
-            
-            # Mark clue as discovered if not already
-            discovered = DiscoveredClue.query.filter_by(
-                user_id=current_user.id,
-                game_name='emoji_memory',
-                clue_id=1
-            ).first()
-            
-            if not discovered:
-                discovered = DiscoveredClue(
-                    user_id=current_user.id,
-                    game_name='emoji_memory',
-                    clue_id=1
-                )
-                db.session.add(discovered)
-            
-            # Add clue info to response
+        if result['show_clue']:
             response_data.update({
                 'show_clue': True,
-                'clue': clue.clue_text,
-                'earned_coins': 5
+                'clue': result['clue_text'],
+                'earned_coins': result['earned_coins']
             })
         
-        db.session.commit()
         return jsonify(response_data)
     
     return render_template('games/emoji_memory.html')
@@ -428,97 +1481,27 @@ def fliptext():
         
         # Only consider it a valid flip if the text is at least 10 characters
         if len(input_text) >= 10:
-            # Award 2 coins for each use (with a daily limit)
-            player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
-            
-            # Check if player has used fliptext today to earn coins
-            last_fliptext_transaction = CoinTransaction.query.filter_by(
-                user_id=current_user.id,
-                source='fliptext_use'
-            ).order_by(CoinTransaction.timestamp.desc()).first()
-            
-            today = datetime.now().date()
-            can_earn_coins = True
+            # Award coins once a day, plus a clue for flipping "NEXUS" to "nexus"
+            result = grant_reward(current_user.id, 'fliptext',
+                                  score=len(input_text), input=input_text, output=flipped_text)
             
-            if last_fliptext_transaction:
-                last_usage_date = last_fliptext_transaction.timestamp.date()
-                if last_usage_date == today:
-                    # Already earned coins today
-                    can_earn_coins = False
-            
-            if can_earn_coins:
-                if player_coins:
-                    player_coins.coins += 2
-                else:
-                    player_coins = PlayerCoins(user_id=current_user.id, coins=2)
-                    db.session.add(player_coins)
-                
-                # Record the coin transaction
-                transaction = CoinTransaction(
-                    user_id=current_user.id,
-                    amount=2,
-                    source='fliptext_use'
-                )
-                db.session.add(transaction)
-                
-                db.session.commit()
-                
+            if result['daily_limit_reached']:
                 response_data = {
-                    'message': 'Text flipped and coins awarded',
-                    'earned_coins': 2
+                    'message': 'Text flipped, but you already earned coins today'
                 }
             else:
                 response_data = {
-                    'message': 'Text flipped, but you already earned coins today'
+                    'message': 'Text flipped and coins awarded'
                 }
             
-            # If the input contains "NEXUS" and output has "nexus" (case reversal), award clue
-            if "NEXUS" in input_text and "nexus" in flipped_text:
-                # Check if clue exists
-                clue = GameClue.query.filter_by(game_name='fliptext', clue_id=1).first()
-                if not clue:
-                    clue = GameClue(
-                        game_name='fliptext',
-                        clue_id=1,
-                        clue_text=GAME_PROGRESSION['fliptext']['clue_text']
-                    )
-                    db.session.add(clue)
-                
-                # Mark clue as discovered if not already
-                discovered = DiscoveredClue.query.filter_by(
-                    user_id=current_user.id,
-                    game_name='fliptext',
-                    clue_id=1
-                ).first()
-                
-                if not discovered:
-                    discovered = DiscoveredClue(
-                        user_id=current_user.id,
-                        game_name='fliptext',
-                        clue_id=1
-                    )
-                    db.session.add(discovered)
-                    
-                    # Award additional coins for finding the clue
-                    if player_coins:
-                        player_coins.coins += 3
-                    
-                    # Record the coin transaction
-                    transaction = CoinTransaction(
-                        user_id=current_user.id,
-                        amount=3,
-                        source='fliptext_clue'
-                    )
-                    db.session.add(transaction)
-                    
-                    db.session.commit()
-                    
-                    # Add clue info to response
-                    response_data.update({
-                        'show_clue': True,
-                        'clue': clue.clue_text,
-                        'earned_coins': 3
-                    })
+            if result['earned_coins'] > 0:
+                response_data['earned_coins'] = result['earned_coins']
+            
+            if result['show_clue']:
+                response_data.update({
+                    'show_clue': True,
+                    'clue': result['clue_text']
+                })
             
             return jsonify(response_data)
         else:
@@ -533,75 +1516,19 @@ def space_dodger():
         data = request.json
         score = data.get('score', 0)
         
-        # Save the score
-        new_score = Score(user_id=current_user.id, game='space_dodger', score=score)
-        db.session.add(new_score)
+        # Save the score, award coins by tier and the clue for 500+
+        result = grant_reward(current_user.id, 'space_dodger', score=score)
         
-        # Initialize response data
         response_data = {'message': 'Score saved'}
+        if result['earned_coins'] > 0:
+            response_data['earned_coins'] = result['earned_coins']
         
-        # Award coins based on score tiers
-        earned_coins = 0
-        if score >= 500:
-            earned_coins = 10
-        elif score >= 300:
-            earned_coins = 7
-        elif score >= 150:
-            earned_coins = 5
-        elif score >= 50:
-            earned_coins = 2
-        
-        if earned_coins > 0:
-            player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
-            if player_coins:
-                player_coins.coins += earned_coins
-            else:
-                player_coins = PlayerCoins(user_id=current_user.id, coins=earned_coins)
-                db.session.add(player_coins)
-            
-            # Record the coin transaction
-            transaction = CoinTransaction(
-                user_id=current_user.id,
-                amount=earned_coins,
-                source='space_dodger_score'
-            )
-            db.session.add(transaction)
-            
-            response_data['earned_coins'] = earned_coins
-        
-        # Award clue if score is high enough (500+)
-        if score >= 500:
-            clue = GameClue.query.filter_by(game_name='space_dodger', clue_id=1).first()
-            if not clue:
-                clue = GameClue(
-                    game_name='space_dodger',
-                    clue_id=1,
-                    clue_text=GAME_PROGRESSION['space_dodger']['clue_text']
-                )
-                db.session.add(clue)
-            
-            # Mark clue as discovered if not already
-            discovered = DiscoveredClue.query.filter_by(
-                user_id=current_user.id,
-                game_name='space_dodger',
-                clue_id=1
-            ).first()
-            
-            if not discovered:
-                discovered = DiscoveredClue(
-                    user_id=current_user.id,
-                    game_name='space_dodger',
-                    clue_id=1
-                )
-                db.session.add(discovered)
-                
-                # Add clue info to response
-                response_data.update({
-                    'show_clue': True,
-                    'clue': clue.clue_text
-                })
+        if result['show_clue']:
+            response_data.update({
+                'show_clue': True,
+                'clue': result['clue_text']
+            })
         
-        db.session.commit()
         return jsonify(response_data)
     
     return render_template('games/space_dodger.html')
@@ -640,86 +1567,33 @@ def boss_battle():
         db.session.commit()
     
     # Get user's discovered clues to display during battle
-    discovered_clues = db.session.query(DiscoveredClue, GameClue) \
-                                .join(GameClue, 
-                                     (DiscoveredClue.game_name == GameClue.game_name) & 
-                                     (DiscoveredClue.clue_id == GameClue.clue_id)) \
-                                .filter(DiscoveredClue.user_id == current_user.id) \
-                                .all()
+    clues = [{"game_name": game_name, "clue_text": clue_text}
+             for game_name, clue_text in get_discovered_clues(current_user.id)]
     
-    clues = [{"game_name": clue.DiscoveredClue.game_name, 
-              "clue_text": clue.GameClue.clue_text} 
-              for clue in discovered_clues]
+    # Most recent page of the conversation, older pages load from /api/nexus_history
+    messages = get_nexus_messages(current_user.id)
     
     return render_template('games/boss_battle.html', 
                           boss_progress=boss_progress, 
                           clues=clues,
+                          messages=messages,
                           weaknesses_found=boss_progress.weaknesses_found,
                           stage=boss_progress.stage)
 @app.route('/api/trivia')
 @login_required
 def api_trivia():
-    data = trivia()
-    
-    # Make it more likely to trigger the clue discovery
-    # Check for more AI-related terms and increase the likelihood
-    ai_terms = ["ai", "artificial intelligence", "machine learning", "neural", "algorithm", 
-                "computer", "data", "robot", "automation", "intelligence"]
-    
-    question_lower = data['question'].lower()
-    
-    # Check if any AI term is in the question OR random chance (10%)
-    is_ai_related = any(term in question_lower for term in ai_terms) or random.random() < 0.1
-    
-    if is_ai_related:
-        # Find or create the AI trivia clue
-        clue = GameClue.query.filter_by(game_name='ai_trivia', clue_id=1).first()
-        if not clue:
-            clue = GameClue(
-                game_name='ai_trivia',
-                clue_id=1,
-                clue_text=GAME_PROGRESSION['ai_trivia']['clue_text']
-            )
-            db.session.add(clue)
-        
-        # Check if user already discovered this clue
-        discovered = DiscoveredClue.query.filter_by(
-            user_id=current_user.id,
-            game_name='ai_trivia',
-            clue_id=1
-        ).first()
-        
-        if not discovered:
-            # Mark clue as discovered
-            discovered = DiscoveredClue(
-                user_id=current_user.id,
-                game_name='ai_trivia',
-                clue_id=1
-            )
-            db.session.add(discovered)
-            
-            # Award coins for discovering the clue
-            player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
-            if player_coins:
-                player_coins.coins += 5
-            else:
-                player_coins = PlayerCoins(user_id=current_user.id, coins=5)
-                db.session.add(player_coins)
-            
-            # Record the coin transaction
-            transaction = CoinTransaction(
-                user_id=current_user.id,
-                amount=5,
-                source='ai_trivia_clue'
-            )
-            db.session.add(transaction)
-            
-            db.session.commit()
-            
-            # Add clue discovery flag to the response
-            data['discovered_clue'] = True
-            data['clue_text'] = clue.clue_text
-            data['earned_coins'] = 5
+    # Served from the pre-generated pool, progress is saved by grant_reward's commit.
+    # Under asgi.py a live question may already have been fetched asynchronously.
+    data = next_trivia_question(current_user.id, request.environ.get('arcade.live_trivia'))
+    
+    # AI-related questions (or a 10% random chance) reveal the clue
+    result = grant_reward(current_user.id, 'ai_trivia', question=data['question'])
+    
+    if result['clue_new']:
+        # Add clue discovery flag to the response
+        data['discovered_clue'] = True
+        data['clue_text'] = result['clue_text']
+        data['earned_coins'] = result['earned_coins']
     
     return jsonify(data)
 
@@ -727,132 +1601,150 @@ def api_trivia():
 @login_required
 def api_weather():
     city = request.args.get('city', 'London')  # Default city
-    data = get_weather(city)
+    # Under asgi.py the weather has already been fetched asynchronously
+    data = request.environ.get('arcade.weather') or get_weather(city)
     
-    # Check for weather clue discovery condition - cold cities
-    if data.get('temperature') and isinstance(data['temperature'], (int, float)) and data['temperature'] < 32:
-        # Cold temperature detected (below freezing)
-        
-        # Find or create the weather wizard clue
-        clue = GameClue.query.filter_by(game_name='weather_wizard', clue_id=1).first()
-        if not clue:
-            clue = GameClue(
-                game_name='weather_wizard',
-                clue_id=1,
-                clue_text=GAME_PROGRESSION['weather_wizard']['clue_text']
-            )
-            db.session.add(clue)
-        
-        # Check if user already discovered this clue
-        discovered = DiscoveredClue.query.filter_by(
-            user_id=current_user.id,
-            game_name='weather_wizard',
-            clue_id=1
-        ).first()
-        
-        if not discovered:
-            # Mark clue as discovered
-            discovered = DiscoveredClue(
-                user_id=current_user.id,
-                game_name='weather_wizard',
-                clue_id=1
-            )
-            db.session.add(discovered)
-            
-            # Award coins for discovering the clue
-            player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
-            if player_coins:
-                player_coins.coins += 4
-            else:
-                player_coins = PlayerCoins(user_id=current_user.id, coins=4)
-                db.session.add(player_coins)
-            
-            # Record the coin transaction
-            transaction = CoinTransaction(
-                user_id=current_user.id,
-                amount=4,
-                source='weather_wizard_clue'
-            )
-            db.session.add(transaction)
-            
-            db.session.commit()
-            
-            # Add clue discovery flag to the response
-            data['discovered_clue'] = True
-            data['clue_text'] = clue.clue_text
-            data['earned_coins'] = 4
+    # Cold temperatures (below freezing) reveal the clue
+    result = grant_reward(current_user.id, 'weather_wizard', temperature=data.get('temperature'))
+    
+    if result['clue_new']:
+        # Add clue discovery flag to the response
+        data['discovered_clue'] = True
+        data['clue_text'] = result['clue_text']
+        data['earned_coins'] = result['earned_coins']
     
     return jsonify(data)
 
+def get_event_snapshot(user_id):
+    """The messages a new /events stream starts with"""
+    coins = db.session.query(PlayerCoins.coins).filter_by(user_id=user_id).scalar() or 0
+    return [('coins', {'coins': coins})]
+
+@app.route('/events')
+@login_required
+def events():
+    """Server-Sent Events stream of the player's coin, clue and unlock changes.
+
+    Only served with EVENTS_STREAMS on, since here it holds a thread for as
+    long as the page is open; asgi.py serves it on its event loop instead.
+    """
+    if not current_app.config.get('EVENTS_STREAMS'):
+        # No Content tells EventSource not to reconnect
+        return '', 204
+    
+    subscription = event_broker.subscribe(current_user.id)
+    snapshot = get_event_snapshot(current_user.id)
+    
+    def stream():
+        yield f"retry: {EVENTS_CONFIG['retry_ms']}\n\n"
+        for message in snapshot:
+            yield format_sse(*message)
+        while True:
+            message = subscription.get(timeout=EVENTS_CONFIG['keepalive'])
+            # Comments keep proxies from closing an idle stream
+            yield format_sse(*message) if message else ': keepalive\n\n'
+    
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(lambda: event_broker.unsubscribe(subscription))
+    return response
+
 @app.route('/user/coins')
 @login_required
+@replica_reads
 def get_user_coins():
-    player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
-    coins = player_coins.coins if player_coins else 0
-    return jsonify({'coins': coins})
+    # Loaded with the user by load_user
+    return jsonify({'coins': current_user.coins})
+
+def history_args():
+    """Cursor, date range and page size from the query string, raising ValueError if malformed"""
+    start, end = request.args.get('from'), request.args.get('to')
+    limit = request.args.get('limit', HISTORY_CONFIG['page_size'], type=int)
+    if not 1 <= limit <= HISTORY_CONFIG['max_page_size']:
+        raise ValueError(f"limit must be between 1 and {HISTORY_CONFIG['max_page_size']}")
+    cursor = request.args.get('cursor') or None
+    if cursor:
+        decode_cursor(cursor)
+    return {'cursor': cursor, 'limit': limit,
+            'start': date.fromisoformat(start) if start else None,
+            'end': date.fromisoformat(end) if end else None}
+
+@app.route('/user/transactions')
+@login_required
+@replica_reads
+def get_user_transactions():
+    """Coin history, newest first: ?cursor=&source=&from=YYYY-MM-DD&to=YYYY-MM-DD&limit="""
+    try:
+        args = history_args()
+    except ValueError as e:
+        return jsonify({'error': f"Bad history request: {e}"}), 400
+    transactions, next_cursor = get_transaction_page(current_user.id, source=request.args.get('source'), **args)
+    return jsonify({'transactions': transactions, 'next_cursor': next_cursor})
+
+@app.route('/user/scores')
+@login_required
+@replica_reads
+def get_user_scores():
+    """Score history, newest first: ?cursor=&game=&from=YYYY-MM-DD&to=YYYY-MM-DD&limit="""
+    try:
+        args = history_args()
+    except ValueError as e:
+        return jsonify({'error': f"Bad history request: {e}"}), 400
+    scores, next_cursor = get_score_page(current_user.id, game=request.args.get('game'), **args)
+    return jsonify({'scores': scores, 'next_cursor': next_cursor})
 
 @app.route('/user/clues')
 @login_required
+@replica_reads
 def get_user_clues():
-    discovered_clues = db.session.query(DiscoveredClue, GameClue) \
-                              .join(GameClue, 
-                                   (DiscoveredClue.game_name == GameClue.game_name) & 
-                                   (DiscoveredClue.clue_id == GameClue.clue_id)) \
-                              .filter(DiscoveredClue.user_id == current_user.id) \
-                              .all()
-    
-    clues = [{"game": clue.DiscoveredClue.game_name, "text": clue.GameClue.clue_text} 
-             for clue in discovered_clues]
+    clues = [{"game": game_name, "text": clue_text}
+             for game_name, clue_text in get_discovered_clues(current_user.id)]
     
     return jsonify({'clues': clues})
 
-@app.route('/api/steal_coins', methods=['POST'])
+@app.route('/leaderboard/<board>')
 @login_required
-def steal_coins():
-    """API endpoint for the Coin Cruncher to steal coins"""
-    if not request.is_json:
-        return jsonify({'error': 'Invalid request'}), 400
-    
-    data = request.json
-    amount = data.get('amount', 0)
-    
-    # Validate the amount (should be positive)
-    if amount <= 0:
-        return jsonify({'error': 'Invalid amount'}), 400
-    
-    # Get player's coins
-    player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
-    if not player_coins:
-        return jsonify({'error': 'User has no coins'}), 404
-    
-    # Calculate actual amount to steal (can't steal more than player has)
-    steal_amount = min(amount, player_coins.coins)
-    
-    if steal_amount > 0:
-        # Decrease player's coins
-        player_coins.coins -= steal_amount
-        
-        # Record the transaction
-        transaction = CoinTransaction(
-            user_id=current_user.id,
-            amount=-steal_amount,  # Negative amount for stealing
-            source='coin_cruncher'
-        )
-        db.session.add(transaction)
-        
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'amount_stolen': steal_amount,
-            'coins_remaining': player_coins.coins
-        })
-    else:
-        return jsonify({
-            'success': False,
-            'message': 'No coins to steal',
-            'coins_remaining': player_coins.coins
-        })
+@replica_reads
+def leaderboard(board):
+    if not is_leaderboard(board):
+        abort(404)
+    
+    boards = ['coins'] + LEADERBOARD_CONFIG['games']
+    return render_template('leaderboard.html',
+                          leaderboard=get_leaderboard_data(board, current_user.id),
+                          boards=boards,
+                          games=GAME_PROGRESSION)
+
+@app.route('/api/leaderboard/<board>')
+@login_required
+@replica_reads
+def api_leaderboard(board):
+    if not is_leaderboard(board):
+        return jsonify({'error': 'Unknown leaderboard'}), 404
+    return jsonify(get_leaderboard_data(board, current_user.id))
+
+@app.route('/api/coin_cruncher')
+@login_required
+def coin_cruncher_state():
+    """When the Coin Cruncher appears next, or how long until it steals"""
+    ensure_cruncher_worker()
+    return jsonify(get_cruncher_state(current_user.id, utc_now()))
+
+@app.route('/api/coin_cruncher/heartbeat', methods=['POST'])
+@login_required
+def coin_cruncher_heartbeat():
+    """Sent by open, visible pages so crunchers only appear to players who are there"""
+    if not cruncher_heartbeat(current_user.id, utc_now()):
+        return jsonify({'error': 'Nothing scheduled, check /api/coin_cruncher'}), 404
+    return '', 204
+
+@app.route('/api/coin_cruncher/defeat', methods=['POST'])
+@login_required
+def coin_cruncher_defeat():
+    now = utc_now()
+    if not defeat_cruncher(current_user.id, now):
+        return jsonify({'success': False, 'message': 'No Coin Cruncher to defeat'}), 409
+    return jsonify({'success': True, **get_cruncher_state(current_user.id, now)})
 
 @app.route('/api/nexus_chat', methods=['POST'])
 @login_required
@@ -872,42 +1764,29 @@ def nexus_chat():
     if not boss_progress:
         return jsonify({'error': 'Boss battle not started'}), 404
     
-    # Get conversation history
-    try:
-        conversation = json.loads(boss_progress.conversation_history)
-    except:
-        conversation = []
-    
-    # Add user message to conversation
-    conversation.append({
-        'role': 'user',
-        'content': user_message,
-        'timestamp': time.time()
-    })
-    
     # Process the message and check for weaknesses
     weakness_found = False
     weakness_count = boss_progress.weaknesses_found
     player_won = False
+    conversation = [{'role': 'user', 'content': user_message, 'timestamp': time.time()}]
     nexus_response, new_stage, weakness_found, player_won = generate_nexus_response(
         user_message, boss_progress.stage, weakness_count, conversation
     )
     
-    # Add NEXUS response to conversation
-    conversation.append({
-        'role': 'assistant',
-        'content': nexus_response,
-        'timestamp': time.time()
-    })
+    # Append both messages to the chat log
+    append_nexus_messages(current_user.id, [('user', user_message), ('assistant', nexus_response)])
     
     # Update boss progress
-    boss_progress.conversation_history = json.dumps(conversation)
     boss_progress.stage = new_stage
     
     if weakness_found:
         boss_progress.weaknesses_found += 1
     
-    db.session.commit()
+    if player_won:
+        # Award victory coins, committed together with the boss progress
+        grant_reward(current_user.id, 'boss_battle', score=1)
+    else:
+        db.session.commit()
     
     response_data = {
         'message': nexus_response,
@@ -917,30 +1796,24 @@ def nexus_chat():
         'victory': player_won
     }
     
-    # If player won, record victory and redirect to victory page
+    # If player won, redirect to victory page
     if player_won:
-        # Removed victories counter increment:
-        # current_user.victories += 1
-        
-        # Award victory coins
-        player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
-        if player_coins:
-            player_coins.coins += 25  # Bonus for defeating NEXUS
-        
-        # Record the transaction
-        transaction = CoinTransaction(
-            user_id=current_user.id,
-            amount=25,
-            source='nexus_victory'
-        )
-        db.session.add(transaction)
-        
-        db.session.commit()
-        
         response_data['redirect'] = url_for('victory')
     
     return jsonify(response_data)
 
+@app.route('/api/nexus_history')
+@login_required
+def nexus_history():
+    """Page backwards through the NEXUS conversation with ?before=<seq>"""
+    before_seq = request.args.get('before', type=int)
+    messages = get_nexus_messages(current_user.id, before_seq=before_seq)
+    
+    return jsonify({
+        'messages': [{'seq': m.seq, 'role': m.role, 'content': m.content} for m in messages],
+        'has_more': bool(messages) and messages[0].seq > 1
+    })
+
 @app.route('/victory')
 @login_required
 def victory():
@@ -954,9 +1827,9 @@ def victory():
     player_coins = PlayerCoins.query.filter_by(user_id=current_user.id).first()
     coins = player_coins.coins if player_coins else 0
     
-    clue_count = DiscoveredClue.query.filter_by(user_id=current_user.id).count()
-    
-    games_played = Score.query.filter_by(user_id=current_user.id).count()
+    user_stats = UserStats.query.filter_by(user_id=current_user.id).all()
+    clue_count = sum(1 for stats in user_stats if stats.has_clue)
+    games_played = sum(stats.play_count for stats in user_stats)
     
     # Use default values for boss_attempts and victories
     boss_attempts = 0  # Default value 
@@ -970,6 +1843,19 @@ def victory():
                           boss_attempts=boss_attempts,
                           victories=victories)
 
+# Compiled once at startup from NEXUS_WEAKNESS_KEYWORDS
+NEXUS_KEYWORD_MATCHER = KeywordMatcher(NEXUS_WEAKNESS_KEYWORDS)
+
+# The NEXUS system each weakness category breaks, for the defeat message
+NEXUS_WEAKNESS_SYSTEMS = {
+    'pattern': "pattern recognition algorithms",
+    'reverse': "logical inversion protocols",
+    'memory': "memory storage systems",
+    'random': "predictive analysis modules",
+    'temperature': "thermal regulation units",
+    'knowledge': "core identity functions"
+}
+
 def generate_nexus_response(user_message, current_stage, weakness_count, conversation):
     """Generate a response from NEXUS based on the user's message and game state"""
     # Initialize response variables
@@ -977,29 +1863,11 @@ def generate_nexus_response(user_message, current_stage, weakness_count, convers
     player_won = False
     new_stage = current_stage
     
-    # Define keyword categories based on the clues
-    key_pattern_words = NEXUS_WEAKNESS_KEYWORDS['pattern']
-    key_reverse_words = NEXUS_WEAKNESS_KEYWORDS['reverse']
-    key_memory_words = NEXUS_WEAKNESS_KEYWORDS['memory']
-    key_random_words = NEXUS_WEAKNESS_KEYWORDS['random']
-    key_temperature_words = NEXUS_WEAKNESS_KEYWORDS['temperature']
-    key_knowledge_words = NEXUS_WEAKNESS_KEYWORDS['knowledge']
+    # Find every weakness category mentioned in one pass over the message
+    categories_found = NEXUS_KEYWORD_MATCHER.match(user_message)
     
     # Count how many different categories of keywords were used
-    keyword_categories_used = 0
-    
-    if any(word in user_message.lower() for word in key_pattern_words):
-        keyword_categories_used += 1
-    if any(word in user_message.lower() for word in key_reverse_words):
-        keyword_categories_used += 1
-    if any(word in user_message.lower() for word in key_memory_words):
-        keyword_categories_used += 1
-    if any(word in user_message.lower() for word in key_random_words):
-        keyword_categories_used += 1
-    if any(word in user_message.lower() for word in key_temperature_words):
-        keyword_categories_used += 1
-    if any(word in user_message.lower() for word in key_knowledge_words):
-        keyword_categories_used += 1
+    keyword_categories_used = len(categories_found)
     
     # Define different responses based on the stage
     responses = {
@@ -1045,19 +1913,9 @@ def generate_nexus_response(user_message, current_stage, weakness_count, convers
     
     # If we're in the escape stage, customize the response based on which clues were used
     if new_stage == 'escape':
-        categories_used = []
-        if any(word in user_message.lower() for word in key_pattern_words):
-            categories_used.append("pattern recognition algorithms")
-        if any(word in user_message.lower() for word in key_reverse_words):
-            categories_used.append("logical inversion protocols")
-        if any(word in user_message.lower() for word in key_memory_words):
-            categories_used.append("memory storage systems")
-        if any(word in user_message.lower() for word in key_random_words):
-            categories_used.append("predictive analysis modules")
-        if any(word in user_message.lower() for word in key_temperature_words):
-            categories_used.append("thermal regulation units")
-        if any(word in user_message.lower() for word in key_knowledge_words):
-            categories_used.append("core identity functions")
+        categories_used = [NEXUS_WEAKNESS_SYSTEMS[category]
+                           for category in NEXUS_KEYWORD_MATCHER.categories
+                           if category in categories_found]
         
         # Build a custom defeat message
         if categories_used:
@@ -1081,6 +1939,10 @@ def init_game_data():
                 db.session.add(clue)
     
     db.session.commit()
+    
+    # Clues may have changed, reload the catalog with the seeded rows
+    invalidate_clue_catalog()
+    get_clue_catalog()
 
 # Add your debug route
 @app.route('/debug/user_data')
@@ -1106,17 +1968,53 @@ def debug_user_data():
     clues = DiscoveredClue.query.filter_by(user_id=user_id).all()
     clue_list = [{"game": c.game_name, "clue_id": c.clue_id, "discovered_at": c.discovered_at} for c in clues]
     
+    # Get per-game summary
+    stats = UserStats.query.filter_by(user_id=user_id).all()
+    stats_list = [{"game": s.game, "best_score": s.best_score, "play_count": s.play_count,
+                   "last_played": s.last_played, "has_clue": s.has_clue} for s in stats]
+    
     debug_data = {
         "user_id": user_id,
         "username": username,
         "coins": coins,
         "recent_scores": score_list,
         "recent_transactions": transaction_list,
-        "discovered_clues": clue_list
+        "discovered_clues": clue_list,
+        "stats": stats_list
     }
     
     return jsonify(debug_data)
 
+@app.route('/debug/cache_stats')
+@login_required
+def debug_cache_stats():
+    """Hit rates and sizes of this worker's caches"""
+    return jsonify({
+        'identity': identity_cache.stats(),
+        'weather': weather_cache.stats()
+    })
+
+# Opt-in request instrumentation: per-route timings and query counts at
+# /metrics, JSON request logs, and stacks of slow requests (instrumentation.py)
+def instrumentation_gauges():
+    return {
+        'arcade_identity_cache_hits_total': ('counter', identity_cache.hits),
+        'arcade_identity_cache_misses_total': ('counter', identity_cache.misses),
+        'arcade_weather_cache_hits_total': ('counter', weather_cache.hits),
+        'arcade_weather_cache_misses_total': ('counter', weather_cache.misses),
+        'arcade_score_queue_pending': ('gauge', score_writer.pending()),
+        'arcade_event_streams': ('gauge', event_broker.subscriber_count())
+    }
+
+if os.getenv('INSTRUMENTATION'):
+    instrumentation.install(
+        app,
+        log_requests=bool(os.getenv('INSTRUMENTATION_LOG')),
+        slow_request_ms=float(os.getenv('SLOW_REQUEST_MS', 0)) or None,
+        profile_dir=os.getenv('PROFILE_DIR', 'profiles'),
+        profile_interval_ms=float(os.getenv('PROFILE_INTERVAL_MS', 5)),
+        gauges=instrumentation_gauges)
+
 # DO NOT MODIFY the existing generate_nexus_response function!
 # If you already have this function with code, leave it as is.
 # If you don't have it, you should add it with proper indentation.
@@ -1127,18 +2025,31 @@ def debug_user_data():
 #     return "Response", current_stage, False, False  # Return appropriate values
 
 
-# At the beginning of your if __name__ == '__main__' block
-if __name__ == '__main__':
+def create_app():
+    """Set up the database (tables, indexes, game data and a first admin user)
+    and return the app.
+
+    Databases from before UserStats and NexusMessage get them filled too
+    (backfill_new_tables), so backfill_stats.py isn't needed first.
+
+    `python main.py` runs it, and gunicorn calls it as 'main:create_app()'.
+    With gunicorn.conf.py's preload_app that happens once in the master
+    process, and the workers are forked from it ready to serve.
+    """
     with app.app_context():
         # Create tables if they don't exist
         db.create_all()
+        create_missing_indexes()
+        add_missing_columns()
         init_game_data()
         
+        backfill_new_tables()
+        
         # Only create admin user if no users exist yet
         if User.query.count() == 0:
             admin_user = User(
                 username='admin',
-                password=generate_password_hash('password123')
+                password=generate_password_hash('password123', method=PASSWORD_HASH_CONFIG['method'])
             )
             db.session.add(admin_user)
             db.session.commit()
@@ -1149,6 +2060,26 @@ if __name__ == '__main__':
             db.session.commit()
             
             print("Created admin user with username 'admin' and password 'password123'")
-    
+    return app
+
+def after_fork():
+    """Run in each worker forked from a preloaded app (gunicorn.conf.py).
+
+    The database connections create_app() opened belong to the master, so
+    the worker forgets them without closing them and opens its own. The
+    password workers are forked here, before this worker starts any
+    threads. Everything else that holds threads or sockets (the score
+    queue, the Cruncher, the API clients) is only started on first use, so
+    each worker gets its own.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    password_hasher.start()
+
+if __name__ == '__main__':
+    create_app()
+    # Before the server starts its threads
+    password_hasher.start()
     # Run the app
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Too many passwords are already waiting to be hashed, try again shortly"""
+
+
+def hash_settings(method):
+    """The settings a hash made with werkzeug method starts with, defaults filled in.
+
+    'pbkdf2:sha256' -> 'pbkdf2:sha256:1000000', 'scrypt' -> 'scrypt:32768:8:1'
+    """
+    name, *args = method.split(':')
+    if name == 'pbkdf2':
+        return f"pbkdf2:{args[0] if args else 'sha256'}:{args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS}"
+    if name == 'scrypt':
+        n, r, p = args + ['32768', '8', '1'][len(args):]
+        return f"scrypt:{n}:{r}:{p}"
+    return method
+
+
+def _verify(stored, password, method):
+    """Check a password, and hash it again if stored was made with other settings"""
+    if not check_password_hash(stored, password):
+        return False, None
+    if stored.split('$', 1)[0] != hash_settings(method):
+        return True, generate_password_hash(password, method)
+    return True, None
+
+
+def _exit_with_parent(parent):
+    """Pool initializer: end this worker once the process that forked it is
+    gone, e.g. a server worker killed without shutting its pool down"""
+    def watch():
+        while os.getppid() == parent:
+            time.sleep(1)
+        os._exit(0)
+    threading.Thread(target=watch, daemon=True).start()
+
+
+class PasswordHasher:
+    """Hashes and checks passwords in a small pool of worker processes.
+
+    Hashing is deliberately slow, so a burst of logins run on the request
+    threads would take every CPU from the other routes. Here at most
+    workers hashes run at once, and once max_pending are running or
+    waiting the next one raises HasherBusy straight away instead of
+    queueing behind them. workers=0 hashes on the calling thread.
+
+    The workers are forked from the calling process. Call start() while it
+    has no other threads yet; otherwise they're forked on the first hash.
+    """
+
+    def __init__(self, method, workers=2, max_pending=32, timeout=10):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._lock = threading.Lock()
+        self.hashed = 0
+        self.rehashed = 0
+        self.rejected = 0
+
+    def start(self):
+        """Fork the worker processes now.
+
+        Forking a process while other threads run can leave the children
+        with locks those threads held, so servers call this at startup or
+        right after forking their own workers, before starting any threads.
+        """
+        if self.workers:
+            # The executor forks all its workers for the first task
+            self._get_pool().submit(int).result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored, password):
+        """Return (matches, new_hash). new_hash is set when the stored hash used
+        other settings than method and should replace it."""
+        matches, new_hash = self._run(_verify, stored, password, self.method)
+        if new_hash:
+            self.rehashed += 1
+        return matches, new_hash
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HasherBusy(f"{self.workers} password workers busy")
+        if not self.workers:
+            try:
+                result = fn(*args)
+            finally:
+                self._slots.release()
+            self.hashed += 1
+            return result
+        
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BaseException as e:
+            self._slots.release()
+            self._reset_if_broken(e)
+            raise
+        # The slot is held until the hash finishes, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.rejected += 1
+            raise HasherBusy(f"password hash took over {self.timeout}s")
+        except BrokenProcessPool as e:
+            self._reset_if_broken(e)
+            raise
+        self.hashed += 1
+        return result
+
+    def _reset_if_broken(self, error):
+        # A worker died, start a new pool on the next call
+        if isinstance(error, BrokenProcessPool):
+            with self._lock:
+                self._pool = None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # Forked rather than spawned, so the workers are ready at once
+                # instead of each importing the app again. See start().
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'),
+                                                 initializer=_exit_with_parent, initargs=(os.getpid(),))
+            return self._pool
+
+    def stop(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def stats(self):
+        return {'workers': self.workers, 'hashed': self.hashed, 'rehashed': self.rehashed,
+                'rejected': self.rejected}
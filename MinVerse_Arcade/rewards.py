@@ -0,0 +1,84 @@
+import random
+
+from game_constants import GAME_REWARDS
+
+
+def _condition_matches(condition, event):
+    """Check one clue_trigger condition against the event data"""
+    value = event.get(condition['field'])
+    if value is None:
+        return False
+
+    if 'equals' in condition:
+        return value == condition['equals']
+    if 'at_least' in condition:
+        return isinstance(value, (int, float)) and value >= condition['at_least']
+    if 'below' in condition:
+        return isinstance(value, (int, float)) and value < condition['below']
+    if 'contains' in condition:
+        return condition['contains'] in str(value)
+    if 'contains_any' in condition:
+        value_lower = str(value).lower()
+        return any(term in value_lower for term in condition['contains_any'])
+    return False
+
+
+def clue_triggered(game, event, rand=random.random):
+    """Return True if the event reveals the game's clue"""
+    rules = GAME_REWARDS[game]
+    conditions = rules.get('clue_trigger')
+    if not conditions:
+        return False
+
+    if all(_condition_matches(condition, event) for condition in conditions):
+        return True
+    return 'clue_chance' in rules and rand() < rules['clue_chance']
+
+
+def play_coins(game, score):
+    """Coins earned for a play, from the game's score tiers and bonus"""
+    rules = GAME_REWARDS[game]
+    coins = 0
+    for min_score, tier_coins in rules['play_tiers']:
+        if score >= min_score:
+            coins = tier_coins
+            break
+
+    bonus = rules.get('score_bonus')
+    if bonus and score == bonus['score']:
+        coins += bonus['coins']
+
+    return coins
+
+
+def evaluate_reward(game, event, clue_known=False, plays_today=0, rand=random.random):
+    """Work out what a game event earns, without touching the database.
+
+    event holds the data the game submitted (score, input, temperature, ...).
+    clue_known says whether the user already found this game's clue and
+    plays_today how many play rewards they got today (only needed for games
+    with a daily_limit). Returns a dict with the coin transactions to record
+    and whether the clue should be shown and/or marked as discovered.
+    """
+    rules = GAME_REWARDS[game]
+    score = event.get('score', 0)
+    transactions = []
+
+    coins = play_coins(game, score)
+    limit_reached = 'daily_limit' in rules and plays_today >= rules['daily_limit']
+    if coins > 0 and not limit_reached:
+        transactions.append((coins, rules['play_source']))
+
+    triggered = clue_triggered(game, event, rand)
+    clue_new = triggered and not clue_known
+    if clue_new and rules.get('clue_coins'):
+        transactions.append((rules['clue_coins'], rules['clue_source']))
+
+    return {
+        'score': score if rules.get('records_score') else None,
+        'transactions': transactions,
+        'earned_coins': sum(amount for amount, source in transactions),
+        'daily_limit_reached': limit_reached,
+        'clue_new': clue_new,
+        'show_clue': clue_new or (triggered and rules.get('always_show_clue', False))
+    }
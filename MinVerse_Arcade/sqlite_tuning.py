@@ -0,0 +1,65 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, StaticPool
+
+# PRAGMA settings applied to every new SQLite connection. Pick one with the
+# DATABASE_PROFILE environment variable.
+SQLITE_PROFILES = {
+    # Several workers reading and writing one database file
+    'production': {
+        'journal_mode': 'WAL',          # Readers don't block the writer or each other
+        'synchronous': 'NORMAL',        # fsync at checkpoints, not every commit (safe with WAL)
+        'busy_timeout': 10000,          # Milliseconds to wait for the write lock before "database is locked"
+        'cache_size': -64000,           # Page cache per connection, negative means KiB (64 MB)
+        'mmap_size': 256 * 1024 * 1024, # Read the file through memory mapping
+        'temp_store': 'MEMORY'          # Temp tables and sort files in memory
+    },
+    # SQLite's own defaults: rollback journal and a full fsync on every commit
+    'default': {}
+}
+
+# These only mean something for a database file
+FILE_ONLY_PRAGMAS = {'journal_mode', 'mmap_size'}
+
+
+def is_memory(uri):
+    url = make_url(uri)
+    return url.drivername.startswith('sqlite') and url.database in (None, '', ':memory:')
+
+
+def engine_options(uri, profile='production', pool_size=10, max_overflow=10):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URI.
+
+    A database file gets a connection pool sized for the worker's threads
+    and waits as long as busy_timeout for locks. An in-memory database only
+    exists inside its connection, so every thread shares one.
+    """
+    if not make_url(uri).drivername.startswith('sqlite'):
+        return {'pool_size': pool_size, 'max_overflow': max_overflow, 'pool_pre_ping': True}
+    if is_memory(uri):
+        return {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+    timeout = SQLITE_PROFILES[profile].get('busy_timeout', 5000) / 1000
+    return {
+        'poolclass': QueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'connect_args': {'timeout': timeout, 'check_same_thread': False}
+    }
+
+
+def install(engine, profile='production'):
+    """Run the profile's PRAGMAs on each connection the engine opens"""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = SQLITE_PROFILES[profile]
+    if is_memory(engine.url):
+        pragmas = {name: value for name, value in pragmas.items() if name not in FILE_ONLY_PRAGMAS}
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
@@ -60,14 +60,7 @@ document.getElementById('show-answer').onclick = () => {
       let exists = document.getElementById('coin-notification');
       
       if (!exists) {
-        fetch('/user/coins')
-          .then(res => res.json())
-          .then(data => {
-            // Just a check to make sure we can access coins API
-            console.log('Current coins:', data.coins);
-            showNotification('Knowledge is power! +1 coin');
-          })
-          .catch(err => console.error('Error fetching coins:', err));
+        showNotification('Knowledge is power! +1 coin');
       }
     }
   }, 500);
@@ -81,7 +74,7 @@ window.onload = () => {
 // Play sound
 function playSound(soundName) {
   try {
-    const audio = new Audio(`/static/media/sounds/${soundName}.mp3`);
+    const audio = new Audio((window.SOUND_URLS || {})[soundName] || `/static/media/sounds/${soundName}.mp3`);
     audio.play().catch(err => console.log('Audio playback error:', err));
   } catch (e) {
     console.error('Error playing sound:', e);
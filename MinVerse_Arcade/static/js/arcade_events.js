@@ -0,0 +1,45 @@
+/**
+ * Arcade Events - Live coin, clue and unlock updates for the current player
+ * 
+ * Where the server can hold them cheaply (window.ARCADE_STREAMS, see
+ * _arcade_events.html), opens one Server-Sent Events stream (/events) per
+ * page and re-dispatches each message as an 'arcade:coins', 'arcade:clue' or
+ * 'arcade:unlock' event on document, so other scripts can react without
+ * polling the server.
+ * 
+ * The balance is also re-read from /user/coins now and then, in case the
+ * stream missed a change (while it was reconnecting, or one made by another
+ * server process), and every 30 seconds when there is no stream.
+ */
+
+const USE_STREAM = Boolean(window.EventSource && window.ARCADE_STREAMS);
+const COIN_REFRESH_MS = USE_STREAM ? 120000 : 30000;
+
+document.addEventListener('DOMContentLoaded', () => {
+    setInterval(refreshCoins, COIN_REFRESH_MS);
+    
+    if (!USE_STREAM) {
+      refreshCoins();
+      return;
+    }
+    
+    // The browser reconnects by itself if the stream drops
+    const source = new EventSource('/events');
+    
+    ['coins', 'clue', 'unlock'].forEach(type => {
+      source.addEventListener(type, event => {
+        document.dispatchEvent(new CustomEvent(`arcade:${type}`, {
+          detail: JSON.parse(event.data)
+        }));
+      });
+    });
+  });
+  
+  function refreshCoins() {
+    fetch('/user/coins')
+      .then(res => res.json())
+      .then(data => {
+        document.dispatchEvent(new CustomEvent('arcade:coins', { detail: { coins: data.coins } }));
+      })
+      .catch(err => console.error('Error fetching coin count:', err));
+  }
@@ -31,6 +31,12 @@ document.addEventListener('DOMContentLoaded', () => {
       });
     }
     
+    // Load earlier pages of the conversation
+    const loadEarlierButton = document.getElementById('load-earlier');
+    if (loadEarlierButton) {
+      loadEarlierButton.addEventListener('click', loadEarlierMessages);
+    }
+    
     // Send message to NEXUS
     if (sendButton && userInput) {
       sendButton.addEventListener('click', sendMessage);
@@ -113,6 +119,40 @@ document.addEventListener('DOMContentLoaded', () => {
       });
     }
     
+    // Fetch the previous page of messages and insert it above the current ones
+    function loadEarlierMessages() {
+      const before = loadEarlierButton.dataset.before;
+      loadEarlierButton.disabled = true;
+      
+      fetch(`/api/nexus_history?before=${before}`)
+      .then(response => response.json())
+      .then(data => {
+        const firstMessage = loadEarlierButton.nextSibling;
+        data.messages.forEach(message => {
+          const messageDiv = document.createElement('div');
+          if (message.role === 'user') {
+            messageDiv.className = 'message user-message';
+            messageDiv.textContent = message.content;
+          } else {
+            messageDiv.className = 'message nexus-message';
+            messageDiv.innerHTML = formatNexusMessage(message.content);
+          }
+          conversationArea.insertBefore(messageDiv, firstMessage);
+        });
+        
+        if (data.has_more && data.messages.length > 0) {
+          loadEarlierButton.dataset.before = data.messages[0].seq;
+          loadEarlierButton.disabled = false;
+        } else {
+          loadEarlierButton.remove();
+        }
+      })
+      .catch(error => {
+        console.error('Error loading earlier messages:', error);
+        loadEarlierButton.disabled = false;
+      });
+    }
+    
     // Add message to conversation area
     function addMessageToConversation(role, content) {
       const messageDiv = document.createElement('div');
@@ -207,7 +247,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // Play sound effects
     function playSound(soundName) {
       try {
-        const audio = new Audio(`/static/media/sounds/${soundName}.mp3`);
+        const audio = new Audio((window.SOUND_URLS || {})[soundName] || `/static/media/sounds/${soundName}.mp3`);
         audio.play().catch(err => console.log('Audio playback error:', err));
       } catch (e) {
         console.error('Error playing sound:', e);
@@ -7,10 +7,12 @@ const clueText = document.getElementById('clue-text');
 const clueCloseBtn = document.getElementById('clue-close-btn');
 const earnedCoinsSpan = document.getElementById('earned-coins');
 
-// Load user's coins when page loads
+// The coin count is pushed by the server as it changes (arcade_events.js)
+document.addEventListener('arcade:coins', event => {
+  coinCount.innerText = event.detail.coins;
+});
+
 window.addEventListener('DOMContentLoaded', () => {
-  fetchUserCoins();
-  
   // Add a submit button 
   const submitButton = document.createElement('button');
   submitButton.innerText = 'Submit Score';
@@ -27,16 +29,6 @@ window.addEventListener('DOMContentLoaded', () => {
   });
 });
 
-// Fetch the user's current coins
-function fetchUserCoins() {
-  fetch('/user/coins')
-    .then(res => res.json())
-    .then(data => {
-      coinCount.innerText = data.coins;
-    })
-    .catch(err => console.error('Error fetching coins:', err));
-}
-
 // Handle clicks on the button
 clickBtn.addEventListener('click', () => {
   clicks++;
@@ -71,7 +63,6 @@ function sendScore(score) {
     // Update coins if earned
     if (data.earned_coins) {
       console.log('Earned coins:', data.earned_coins);
-      fetchUserCoins();
       earnedCoinsSpan.innerText = data.earned_coins;
     }
     
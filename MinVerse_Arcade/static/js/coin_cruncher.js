@@ -3,6 +3,12 @@
  * 
  * This class creates a character that randomly appears to steal coins.
  * Players need to click rapidly to defeat it before it steals their coins.
+ * 
+ * The server decides when the cruncher appears and how much it steals
+ * (/api/coin_cruncher), and takes the coins itself if it isn't defeated in
+ * time. This class only shows what the server scheduled. While the page is
+ * visible it checks in every few seconds (/api/coin_cruncher/heartbeat),
+ * and the cruncher only appears to players who checked in just now.
  */
 
 // Initialize the coin cruncher when document is ready
@@ -16,10 +22,9 @@ document.addEventListener('DOMContentLoaded', () => {
     constructor() {
       this.isActive = false;
       this.element = null;
-      this.appearInterval = null;
-      this.disappearTimeout = null;
+      this.syncTimeout = null;
+      this.heartbeatTimer = null;
       this.clickHandler = null;
-      this.stealer = null;
       this.clickCounter = 0;
       this.clickThreshold = 10; // Clicks needed to defeat the cruncher
       this.stealAmount = 0;
@@ -27,8 +32,8 @@ document.addEventListener('DOMContentLoaded', () => {
       // Create HTML element
       this.createCruncherElement();
       
-      // Start the random appearance schedule
-      this.scheduleNextAppearance();
+      // Ask the server when the cruncher shows up next
+      this.sync();
     }
     
     createCruncherElement() {
@@ -60,39 +65,73 @@ document.addEventListener('DOMContentLoaded', () => {
       this.clickHandler = this.handleClick.bind(this);
     }
     
-    scheduleNextAppearance() {
-      // Only schedule appearances for logged-in users
-      if (!document.querySelector('.navbar a[href="/logout"]')) {
+    sync() {
+      fetch('/api/coin_cruncher')
+        .then(res => res.json())
+        .then(state => this.applyState(state))
+        .catch(err => {
+          console.error('Error checking the coin cruncher:', err);
+          this.syncIn(30);
+        });
+    }
+    
+    syncIn(seconds) {
+      // Check back a moment after the server's deadline has passed
+      clearTimeout(this.syncTimeout);
+      this.syncTimeout = setTimeout(() => this.sync(), seconds * 1000 + 250);
+    }
+    
+    startHeartbeat(seconds) {
+      if (this.heartbeatTimer) {
         return;
       }
-      
-      // Random time between min and max appearance interval (2-5 minutes)
-      const minInterval = 30; // For testing, set to 30 seconds
-      const maxInterval = 120; // For testing, set to 2 minutes
-      // In production you might want to use:
-      // const minInterval = 120; // 2 minutes
-      // const maxInterval = 300; // 5 minutes
-      
-      const randomInterval = Math.floor(Math.random() * (maxInterval - minInterval + 1)) + minInterval;
-      
-      // Schedule next appearance
-      this.appearInterval = setTimeout(() => {
-        this.appear();
-      }, randomInterval * 1000);
+      this.heartbeatTimer = setInterval(() => this.heartbeat(), seconds * 1000);
+      // A page coming back into view counts at once
+      document.addEventListener('visibilitychange', () => this.heartbeat());
     }
     
-    appear() {
-      // Only appear if not already active and user is logged in
-      if (this.isActive || !document.querySelector('.navbar a[href="/logout"]')) {
-        this.scheduleNextAppearance();
+    heartbeat() {
+      if (document.visibilityState !== 'visible') {
         return;
       }
+      fetch('/api/coin_cruncher/heartbeat', { method: 'POST' })
+        .then(res => {
+          if (res.status === 404) {
+            // Nothing scheduled after a long time away, start again
+            this.sync();
+          }
+        })
+        .catch(err => console.error('Error checking in with the coin cruncher:', err));
+    }
+    
+    applyState(state) {
+      this.clickThreshold = state.click_threshold;
+      this.startHeartbeat(state.heartbeat_interval);
+      
+      if (state.last_steal) {
+        this.showSteal(state.last_steal);
+      }
       
+      if (state.state === 'active') {
+        if (!this.isActive) {
+          this.appear(state.amount);
+        }
+        this.syncIn(state.steals_in);
+      } else {
+        if (this.isActive && !state.last_steal) {
+          // Handled elsewhere, e.g. defeated in another tab
+          this.hide();
+        }
+        this.syncIn(state.appears_in);
+      }
+    }
+    
+    appear(amount) {
       // Reset the click counter
       this.clickCounter = 0;
       
-      // Calculate amount to steal - random between 5-15 coins
-      this.stealAmount = Math.floor(Math.random() * 11) + 5;
+      // The server picked how much to steal
+      this.stealAmount = amount;
       
       // Update the steal amount display
       this.element.querySelector('.steal-amount').textContent = `-${this.stealAmount}`;
@@ -109,13 +148,8 @@ document.addEventListener('DOMContentLoaded', () => {
       setTimeout(() => {
         this.element.classList.add('active');
         
-        // Add click handler
+        // Add click handler (the server steals if it isn't defeated in time)
         this.element.addEventListener('click', this.clickHandler);
-        
-        // Schedule automatic disappearance with coin theft if not clicked enough
-        this.disappearTimeout = setTimeout(() => {
-          this.stealCoins();
-        }, 10000); // 10 seconds
       }, 100);
     }
     
@@ -137,14 +171,22 @@ document.addEventListener('DOMContentLoaded', () => {
     }
     
     defeatCruncher() {
-      // Clear the auto-disappear timeout
-      if (this.disappearTimeout) {
-        clearTimeout(this.disappearTimeout);
-      }
-      
       // Remove click handler
       this.element.removeEventListener('click', this.clickHandler);
       
+      // Tell the server, which schedules the next appearance
+      fetch('/api/coin_cruncher/defeat', { method: 'POST' })
+        .then(res => res.json())
+        .then(state => {
+          if (state.success) {
+            this.syncIn(state.appears_in);
+          } else {
+            // Too late, the steal already happened
+            this.sync();
+          }
+        })
+        .catch(err => console.error('Error defeating the coin cruncher:', err));
+      
       // Play defeat sound
       this.playSound('cruncher-defeat');
       
@@ -158,14 +200,21 @@ document.addEventListener('DOMContentLoaded', () => {
         
         setTimeout(() => {
           this.element.style.display = 'none';
-          
-          // Schedule next appearance
-          this.scheduleNextAppearance();
         }, 500);
       }, 1500);
     }
     
-    stealCoins() {
+    showSteal(result) {
+      if (!result.amount_stolen) {
+        this.hide();
+        return;
+      }
+      
+      // Show the cruncher if the page was opened after it appeared
+      this.element.style.display = 'block';
+      this.element.classList.add('active');
+      this.element.querySelector('.steal-amount').textContent = `-${result.amount_stolen}`;
+      
       // Clear event listener
       this.element.removeEventListener('click', this.clickHandler);
       
@@ -175,49 +224,37 @@ document.addEventListener('DOMContentLoaded', () => {
       // Play stealing sound
       this.playSound('coin-steal');
       
-      // Make API call to steal coins
-      fetch('/api/steal_coins', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ amount: this.stealAmount })
-      })
-      .then(res => res.json())
-      .then(data => {
-        if (data.success) {
-          // Update the coins display
-          const coinsDisplay = document.querySelector('.top-coin-display .coin-value');
-          if (coinsDisplay) {
-            coinsDisplay.textContent = data.coins_remaining;
-          }
-          
-          // Show stealing animation
-          const stealIndicator = this.element.querySelector('.coin-steal-indicator');
-          stealIndicator.classList.add('active');
-          
-          setTimeout(() => {
-            stealIndicator.classList.remove('active');
-          }, 2000);
-        }
-      })
-      .catch(err => console.error('Error stealing coins:', err));
+      // Update the coins display
+      const coinsDisplay = document.querySelector('.top-coin-display .coin-value');
+      if (coinsDisplay) {
+        coinsDisplay.textContent = result.coins_remaining;
+      }
+      
+      // Show stealing animation
+      const stealIndicator = this.element.querySelector('.coin-steal-indicator');
+      stealIndicator.classList.add('active');
+      
+      setTimeout(() => {
+        stealIndicator.classList.remove('active');
+      }, 2000);
       
       // Hide after stealing
+      setTimeout(() => this.hide(), 2500);
+    }
+    
+    hide() {
+      this.element.removeEventListener('click', this.clickHandler);
+      this.element.classList.remove('active', 'stealing');
+      this.isActive = false;
+      
       setTimeout(() => {
-        this.element.classList.remove('active', 'stealing');
-        this.isActive = false;
-        
-        setTimeout(() => {
-          this.element.style.display = 'none';
-          
-          // Schedule next appearance
-          this.scheduleNextAppearance();
-        }, 500);
-      }, 2500);
+        this.element.style.display = 'none';
+      }, 500);
     }
     
     playSound(soundName) {
       try {
-        const audio = new Audio(`/static/media/sounds/${soundName}.mp3`);
+        const audio = new Audio((window.SOUND_URLS || {})[soundName] || `/static/media/sounds/${soundName}.mp3`);
         audio.play().catch(err => console.log('Audio playback error:', err));
       } catch (e) {
         console.error('Error playing sound:', e);
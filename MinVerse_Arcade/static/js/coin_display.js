@@ -7,8 +7,8 @@ document.addEventListener('DOMContentLoaded', () => {
     if (document.querySelector('.navbar a[href="/logout"]')) {
       createCoinDisplay();
       
-      // Refresh coin count every 30 seconds
-      setInterval(updateCoinCount, 30000);
+      // The server pushes the balance whenever it changes (arcade_events.js)
+      document.addEventListener('arcade:coins', event => showCoinCount(event.detail.coins));
     }
   });
   
@@ -23,25 +23,17 @@ document.addEventListener('DOMContentLoaded', () => {
     
     // Add to the document
     document.body.appendChild(coinDisplay);
-    
-    // Initialize with current coin count
-    updateCoinCount();
   }
   
-  function updateCoinCount() {
-    fetch('/user/coins')
-      .then(res => res.json())
-      .then(data => {
-        const coinValueElement = document.querySelector('.top-coin-display .coin-value');
-        if (coinValueElement) {
-          // If the value has changed, animate the update
-          const currentValue = parseInt(coinValueElement.textContent, 10);
-          if (currentValue !== data.coins) {
-            animateCoinChange(coinValueElement, currentValue, data.coins);
-          }
-        }
-      })
-      .catch(err => console.error('Error fetching coin count:', err));
+  function showCoinCount(coins) {
+    const coinValueElement = document.querySelector('.top-coin-display .coin-value');
+    if (coinValueElement) {
+      // If the value has changed, animate the update
+      const currentValue = parseInt(coinValueElement.textContent, 10);
+      if (currentValue !== coins) {
+        animateCoinChange(coinValueElement, currentValue, coins);
+      }
+    }
   }
   
   function animateCoinChange(element, oldValue, newValue) {
@@ -65,7 +57,7 @@ document.addEventListener('DOMContentLoaded', () => {
   
   function playSound(soundName) {
     try {
-      const audio = new Audio(`/static/media/sounds/${soundName}.mp3`);
+      const audio = new Audio((window.SOUND_URLS || {})[soundName] || `/static/media/sounds/${soundName}.mp3`);
       audio.play().catch(err => console.log('Audio playback error:', err));
     } catch (e) {
       console.error('Error playing sound:', e);
@@ -156,7 +156,7 @@ function showClueModal(clueText, earnedCoins) {
 // Play sound
 function playSound(soundName) {
   try {
-    const audio = new Audio(`/static/media/sounds/${soundName}.mp3`);
+    const audio = new Audio((window.SOUND_URLS || {})[soundName] || `/static/media/sounds/${soundName}.mp3`);
     audio.play().catch(err => console.log('Audio playback error:', err));
   } catch (e) {
     console.error('Error playing sound:', e);
@@ -0,0 +1,72 @@
+/**
+ * Profile coin history - loads older transactions from /user/transactions
+ * as the bottom of the list scrolls into view
+ */
+
+document.addEventListener('DOMContentLoaded', () => {
+    const history = document.getElementById('transaction-history');
+    const end = document.getElementById('transaction-history-end');
+    if (!history || !end || !history.dataset.nextCursor) return;
+
+    let loading = false;
+    let observer = null;
+
+    function loadMore() {
+      if (loading || !history.dataset.nextCursor) return;
+      loading = true;
+
+      fetch(`/user/transactions?cursor=${encodeURIComponent(history.dataset.nextCursor)}`)
+        .then(res => res.json())
+        .then(data => {
+          data.transactions.forEach(transaction => history.appendChild(transactionItem(transaction)));
+          history.dataset.nextCursor = data.next_cursor || '';
+          loading = false;
+          if (!data.next_cursor) {
+            if (observer) observer.disconnect();
+            end.remove();
+          } else if (observer && end.getBoundingClientRect().top < window.innerHeight + 200) {
+            // Still at the bottom, the observer won't fire again by itself
+            loadMore();
+          }
+        })
+        .catch(err => {
+          console.error('Error loading coin history:', err);
+          loading = false;
+        });
+    }
+
+    // Older browsers get a button instead of scrolling
+    if (!window.IntersectionObserver) {
+      const button = document.createElement('button');
+      button.textContent = 'Show older transactions';
+      button.addEventListener('click', loadMore);
+      end.appendChild(button);
+      return;
+    }
+    observer = new IntersectionObserver(entries => {
+      if (entries[0].isIntersecting) loadMore();
+    }, { rootMargin: '200px' });
+    observer.observe(end);
+  });
+
+  // Same markup as the server-rendered rows in profile.html
+  function transactionItem(transaction) {
+    const item = document.createElement('div');
+    item.className = 'transaction-item';
+
+    const source = document.createElement('span');
+    source.className = 'transaction-source';
+    source.textContent = transaction.source.replace(/_/g, ' ').replace(/\b\w/g, c => c.toUpperCase()) +
+      (transaction.archived ? ' (daily total)' : '');
+
+    const amount = document.createElement('span');
+    amount.className = `transaction-amount ${transaction.amount > 0 ? 'positive' : 'negative'}`;
+    amount.textContent = `${transaction.amount > 0 ? '+' : ''}${transaction.amount} coins`;
+
+    const date = document.createElement('span');
+    date.className = 'transaction-date';
+    date.textContent = transaction.timestamp.slice(0, 16).replace('T', ' ');
+
+    item.append(source, amount, date);
+    return item;
+  }
@@ -169,7 +169,7 @@ canvas.parentNode.insertBefore(restartBtn, canvas.nextSibling);
 // Play sound
 function playSound(soundName) {
   try {
-    const audio = new Audio(`/static/media/sounds/${soundName}.mp3`);
+    const audio = new Audio((window.SOUND_URLS || {})[soundName] || `/static/media/sounds/${soundName}.mp3`);
     audio.play().catch(err => console.log('Audio playback error:', err));
   } catch (e) {
     console.error('Error playing sound:', e);
@@ -172,7 +172,7 @@ document.addEventListener('DOMContentLoaded', () => {
 // Play sound
 function playSound(soundName) {
   try {
-    const audio = new Audio(`/static/media/sounds/${soundName}.mp3`);
+    const audio = new Audio((window.SOUND_URLS || {})[soundName] || `/static/media/sounds/${soundName}.mp3`);
     audio.play().catch(err => console.log('Audio playback error:', err));
   } catch (e) {
     console.error('Error playing sound:', e);
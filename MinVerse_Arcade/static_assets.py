@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import request, send_from_directory
+
+MANIFEST = 'manifest.json'
+# Only text compresses; MP3s and images are already as small as they get
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.txt', '.html', '.map')
+# (Accept-Encoding name, file suffix), best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Hashed names change whenever the content does, so browsers can keep them forever
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _hashed_name(path, data):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def build(static_folder, out_dir=None, url_path='/static'):
+    """Copy every file under static_folder into out_dir with a content hash in its name.
+
+    Text files also get .br (if the brotli package is installed) and .gz
+    copies, and '/static/<file>' paths written literally in CSS and JS are
+    pointed at the hashed copies. out_dir defaults to static_folder/dist and
+    is emptied first. Writes and returns the manifest: {'files': {path:
+    hashed path}, 'encodings': {hashed path: [encodings]}}.
+    """
+    try:
+        import brotli  # Optional, gzip alone still helps
+    except ImportError:
+        brotli = None
+    out_dir = out_dir or os.path.join(static_folder, 'dist')
+    shutil.rmtree(out_dir, ignore_errors=True)
+
+    # Never fingerprint an earlier build
+    skip = {os.path.abspath(out_dir), os.path.abspath(os.path.join(static_folder, 'dist'))}
+    sources = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) not in skip]
+        sources += [os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/')
+                    for name in files]
+    # CSS and JS last, so the files they mention already have their hashed names
+    sources.sort(key=lambda path: (path.endswith(('.css', '.js')), path))
+
+    files, encodings = {}, {}
+    literal = re.compile(re.escape(url_path) + r'/([\w./-]+)')
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            data = f.read()
+        if path.endswith(('.css', '.js')):
+            data = literal.sub(lambda m: f"{url_path}/dist/{files[m.group(1)]}" if m.group(1) in files
+                               else m.group(0), data.decode()).encode()
+        hashed = _hashed_name(path, data)
+        target = os.path.join(out_dir, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        files[path] = hashed
+
+        if path.endswith(COMPRESSIBLE):
+            variants = [('br', '.br', brotli.compress(data, quality=11) if brotli else None),
+                        ('gzip', '.gz', gzip.compress(data, 9, mtime=0))]
+            for encoding, suffix, compressed in variants:
+                # Not worth a Content-Encoding for a few bytes
+                if compressed is not None and len(compressed) < len(data) * 0.9:
+                    with open(target + suffix, 'wb') as f:
+                        f.write(compressed)
+                    encodings.setdefault(hashed, []).append(encoding)
+
+    manifest = {'files': files, 'encodings': encodings}
+    with open(os.path.join(out_dir, MANIFEST + '.tmp'), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(os.path.join(out_dir, MANIFEST + '.tmp'), os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+class StaticAssets:
+    """Serves the output of build() with long-lived cache headers.
+
+    url_for('static', filename='css/style.css') gives the hashed copy's URL
+    (/static/dist/css/style.<hash>.css), which is sent as the .br or .gz
+    variant when the browser accepts it and marked immutable, so repeat
+    visits load it from the browser cache without asking. Files missing
+    from the manifest, and everything when build() hasn't been run, are
+    served from static/ as before.
+    """
+
+    def __init__(self, app=None, directory=None):
+        self.directory = directory
+        self.files = {}
+        self.encodings = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = self.directory or os.path.join(app.static_folder, 'dist')
+        manifest_path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(manifest_path):
+            app.logger.info("No %s, serving static files unhashed (run build_static.py)", manifest_path)
+            return
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        self.files = manifest['files']
+        self.encodings = manifest['encodings']
+        self.hashed = set(self.files.values())
+        self._send_static_file = app.view_functions['static']
+        app.view_functions['static'] = self.send
+        app.url_defaults(self.hashed_url)
+
+    def hashed_url(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.files:
+            values['filename'] = f"dist/{self.files[values['filename']]}"
+
+    def send(self, filename):
+        name = filename[len('dist/'):] if filename.startswith('dist/') else None
+        if name not in self.hashed:
+            return self._send_static_file(filename=filename)
+
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        for encoding, suffix in ENCODINGS:
+            if encoding in self.encodings.get(name, ()) and request.accept_encodings[encoding]:
+                response = send_from_directory(self.directory, name + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.directory, name, mimetype=mimetype)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
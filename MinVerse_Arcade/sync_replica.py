@@ -0,0 +1,25 @@
+"""Copy the primary SQLite database into the read replica every few seconds.
+
+Stands in for real replication when trying DATABASE_REPLICA_URL with two
+local SQLite files:
+
+    DATABASE_URL=sqlite:///primary.db DATABASE_REPLICA_URL=sqlite:///replica.db python sync_replica.py [seconds]
+"""
+import sys
+import time
+
+from main import app, db
+from db_routing import REPLICA, copy_sqlite, has_replica, sqlite_path
+
+interval = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+
+with app.app_context():
+    if not has_replica(db):
+        sys.exit("DATABASE_REPLICA_URL is not set")
+    primary = sqlite_path(str(db.engine.url), app.instance_path)
+    replica = sqlite_path(str(db.engines[REPLICA].url), app.instance_path)
+
+print(f"Copying {primary} to {replica} every {interval:g}s")
+while True:
+    copy_sqlite(primary, replica)
+    time.sleep(interval)
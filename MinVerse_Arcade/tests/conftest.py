@@ -0,0 +1,32 @@
+"""Shared setup for the tests. They build throwaway apps with the benchmarks'
+make_app (benchmarks/common.py), so they never touch database.db. Run them
+from the MinVerse_Arcade folder:
+
+    poetry run pytest
+    poetry run pytest --runslow   # also the tests marked slow
+"""
+import os
+import sys
+
+import pytest
+
+# Make main.py and benchmarks/common.py importable
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [root, os.path.join(root, 'benchmarks')]
+
+
+def pytest_addoption(parser):
+    parser.addoption('--runslow', action='store_true', help="also run the tests marked slow")
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "slow: takes minutes, only runs with --runslow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--runslow'):
+        return
+    skip_slow = pytest.mark.skip(reason="slow, run with --runslow")
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip_slow)
@@ -0,0 +1,38 @@
+"""A database from before UserStats and NexusMessage gets them filled when
+the app starts (main.backfill_new_tables, run by create_app)."""
+import json
+
+import common
+from common import db, main
+
+
+def test_old_database_gets_stats_and_messages(tmp_path):
+    app = common.make_app(f"sqlite:///{tmp_path / 'old.db'}")
+    with app.app_context():
+        db.session.add_all([main.User(username='old', password='x'), main.User(username='new', password='x')])
+        db.session.flush()
+        db.session.add_all([
+            main.Score(user_id=1, game='clickmaster', score=30),
+            main.Score(user_id=1, game='clickmaster', score=55),
+            main.DiscoveredClue(user_id=2, game_name='emoji_memory', clue_id=1),
+            main.BossProgress(user_id=1, conversation_history=json.dumps([
+                {'role': 'user', 'content': 'hello'}, {'role': 'assistant', 'content': 'INTRUDER'}])),
+        ])
+        db.session.commit()
+
+        main.backfill_new_tables()
+
+        stats = {(row.user_id, row.game): row for row in main.UserStats.query}
+        assert (stats[1, 'clickmaster'].best_score, stats[1, 'clickmaster'].play_count) == (55, 2)
+        assert stats[2, 'emoji_memory'].has_clue
+        messages = main.NexusMessage.query.filter_by(user_id=1).order_by(main.NexusMessage.seq).all()
+        assert [message.content for message in messages] == ['hello', 'INTRUDER']
+
+        # Running again (every start) leaves what is there alone
+        db.session.add(main.Score(user_id=2, game='clickmaster', score=5))
+        main.UserStats.query.filter_by(user_id=1).update({'play_count': 7})
+        db.session.commit()
+        main.backfill_new_tables()
+        assert main.UserStats.query.filter_by(user_id=1, game='clickmaster').one().play_count == 7
+        assert main.UserStats.query.filter_by(user_id=2, game='clickmaster').first() is None
+        assert main.NexusMessage.query.count() == 2
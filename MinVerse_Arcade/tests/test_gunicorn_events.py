@@ -0,0 +1,87 @@
+"""Other routes keep answering under the real gunicorn config
+(gunicorn.conf.py, gthread workers) while pages hold /events open."""
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+requests = pytest.importorskip('requests')
+pytest.importorskip('gunicorn')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THREADS = 4
+
+
+@pytest.fixture
+def serve(tmp_path):
+    """Start gunicorn with extra environment, returning its base URL"""
+    servers = []
+
+    def start(**env):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', 'main:create_app()'],
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            env=dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'events.db'}", OPENAI_API_KEY='test',
+                     WEB_CONCURRENCY='1', GUNICORN_THREADS=str(THREADS), **env))
+        servers.append(server)
+        url = f'http://127.0.0.1:{port}'
+        for _ in range(300):
+            assert server.poll() is None, "gunicorn exited"
+            try:
+                requests.get(f'{url}/login', timeout=1)
+                return url
+            except (requests.ConnectionError, requests.Timeout):
+                time.sleep(0.1)
+        raise AssertionError("gunicorn didn't start")
+
+    yield start
+    for server in servers:
+        server.terminate()
+        server.wait()
+
+
+def logged_in(url):
+    # create_app() adds the admin user to a new database
+    session = requests.Session()
+    session.post(f'{url}/login', data={'username': 'admin', 'password': 'password123'}, timeout=10)
+    assert session.get(f'{url}/user/coins', timeout=10).status_code == 200
+    return session
+
+
+def test_pages_poll_by_default(serve):
+    url = serve()
+    session = logged_in(url)
+    # More pages than the worker has threads; none of them keeps one
+    with ThreadPoolExecutor(max_workers=THREADS * 3) as pool:
+        statuses = list(pool.map(lambda _: session.get(f'{url}/events', timeout=10).status_code,
+                                 range(THREADS * 3)))
+    assert statuses == [204] * (THREADS * 3)
+    assert 'ARCADE_STREAMS = false' in session.get(f'{url}/', timeout=10).text
+    assert session.get(f'{url}/user/coins', timeout=5).json()['coins'] >= 0
+
+
+def test_routes_answer_while_streams_are_open(serve):
+    url = serve(EVENTS_STREAMS='1')
+    session = logged_in(url)
+    streams = []
+    try:
+        # Every thread but one holds a stream
+        for _ in range(THREADS - 1):
+            stream = session.get(f'{url}/events', stream=True, timeout=10)
+            assert stream.status_code == 200
+            assert next(stream.iter_lines()).startswith(b'retry:')
+            streams.append(stream)
+        for path in ('/user/coins', '/', '/profile', '/login'):
+            started = time.perf_counter()
+            assert session.get(f'{url}{path}', timeout=5).status_code == 200, path
+            assert time.perf_counter() - started < 2, path
+    finally:
+        for stream in streams:
+            stream.close()
@@ -0,0 +1,84 @@
+"""Walking /user/transactions by next_cursor returns every row once, in
+order, through many rows that share a timestamp and on across the switch
+from live transactions to archived daily totals. A small version of the
+checks in benchmarks/bench_history_pages.py."""
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import insert
+
+import common
+from common import db, main
+
+SOURCES = ['clickmaster_play', 'space_dodger_play', 'coin_cruncher']
+LIVE = 90  # In three bursts of 30 rows with the same timestamp
+
+
+@pytest.fixture(scope='module')
+def history(tmp_path_factory):
+    """A logged in test client, and the ids of the live and archived rows"""
+    app = common.make_app(f"sqlite:///{tmp_path_factory.mktemp('history') / 'history.db'}",
+                          with_routes=True)
+    now = main.utc_now().replace(microsecond=0)
+    noon = now.replace(hour=12, minute=0, second=0)
+    with app.app_context():
+        db.session.execute(insert(main.User), [{'username': 'player', 'password': 'x'}])
+        db.session.execute(insert(main.PlayerCoins), [{'user_id': 1, 'coins': 0}])
+        # Old history, several rows per source and day, to be archived
+        db.session.execute(insert(main.CoinTransaction), [
+            {'user_id': 1, 'amount': 1, 'source': SOURCES[i % 3],
+             'timestamp': noon - timedelta(days=10 + i // 12, seconds=i)} for i in range(60)])
+        db.session.commit()
+        archive_after_days = main.COIN_LEDGER_CONFIG['archive_after_days']
+        main.COIN_LEDGER_CONFIG['archive_after_days'] = 5
+        try:
+            main.checkpoint_coin_ledger()
+            main.compact_coin_ledger()
+        finally:
+            main.COIN_LEDGER_CONFIG['archive_after_days'] = archive_after_days
+        db.session.execute(insert(main.CoinTransaction), [
+            {'user_id': 1, 'amount': 1, 'source': SOURCES[i % 3],
+             'timestamp': now - timedelta(minutes=i // 30)} for i in range(LIVE)])
+        db.session.commit()
+        live_ids = {row.id for row in main.CoinTransaction.query}
+        archive_ids = {row.id for row in main.CoinTransactionArchive.query}
+    assert len(live_ids) == LIVE and len(archive_ids) == 15  # 5 days of 3 sources
+
+    client = app.test_client()
+    serializer = app.session_interface.get_signing_serializer(app)
+    client.set_cookie('session', serializer.dumps({'_user_id': '1', '_fresh': True}))
+    return client, live_ids, archive_ids
+
+
+def walk(client, limit):
+    """Follow next_cursor from the first page until it is null"""
+    url = f'/user/transactions?limit={limit}'
+    seen, cursor = [], None
+    for _ in range((LIVE + 15) // limit + 2):
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        seen += response.json['transactions']
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            return seen
+    raise AssertionError(f"still paging after {len(seen)} rows")
+
+
+# Pages that end inside a burst, exactly on the last live row, and inside the archive
+@pytest.mark.parametrize('limit', [1, 7, 30, LIVE, 100])
+def test_every_row_once_in_order(history, limit):
+    client, live_ids, archive_ids = history
+    seen = walk(client, limit)
+
+    live = [row for row in seen if not row['archived']]
+    archived = [row for row in seen if row['archived']]
+    assert seen == live + archived
+    # No duplicates and nothing missing
+    assert len(live) == LIVE and {row['id'] for row in live} == live_ids
+    assert len(archived) == len(archive_ids) and {row['id'] for row in archived} == archive_ids
+    assert sum(row['transactions'] for row in archived) == 60
+
+    live_keys = [(row['timestamp'], row['id']) for row in live]
+    archived_keys = [(row['timestamp'], row['id']) for row in archived]
+    assert live_keys == sorted(live_keys, reverse=True)
+    assert archived_keys == sorted(archived_keys, reverse=True)
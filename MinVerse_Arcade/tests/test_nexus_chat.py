@@ -0,0 +1,77 @@
+"""The NEXUS chat log (append_nexus_messages): turns sent at the same time
+get their own contiguous sequence numbers, and old messages are pruned
+down to NEXUS_CHAT_CONFIG['retention_messages']."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import insert
+
+import common
+from common import db, main
+
+TURNS = 8
+
+
+def make_player(tmp_path, **options):
+    app = common.make_app(f"sqlite:///{tmp_path / 'nexus.db'}", **options)
+    with app.app_context():
+        db.session.execute(insert(main.User), [{'username': 'player', 'password': 'x'}])
+        db.session.execute(insert(main.PlayerCoins), [{'user_id': 1, 'coins': 0}])
+        db.session.execute(insert(main.BossProgress), [{'user_id': 1, 'stage': 'battle'}])
+        db.session.commit()
+    return app
+
+
+def logged_rows(app):
+    with app.app_context():
+        return [(row.seq, row.role, row.content)
+                for row in main.NexusMessage.query.order_by(main.NexusMessage.seq)]
+
+
+def test_turns_sent_at_once_get_contiguous_seqs(tmp_path, monkeypatch):
+    app = make_player(tmp_path, with_routes=True, profile='production')
+    everyone_asked = threading.Barrier(TURNS)
+
+    def nexus_reply(user_message, current_stage, weakness_count, conversation):
+        # Every turn has its reply before any of them is logged
+        everyone_asked.wait(timeout=10)
+        return f"reply to {user_message}", current_stage, False, False
+
+    monkeypatch.setattr(main, 'generate_nexus_response', nexus_reply)
+    serializer = app.session_interface.get_signing_serializer(app)
+    session_cookie = serializer.dumps({'_user_id': '1', '_fresh': True})
+
+    def send_turn(i):
+        client = app.test_client()
+        client.set_cookie('session', session_cookie)
+        return client.post('/api/nexus_chat', json={'message': f'turn {i}'}).status_code
+
+    with ThreadPoolExecutor(max_workers=TURNS) as pool:
+        assert list(pool.map(send_turn, range(TURNS))) == [200] * TURNS
+
+    rows = logged_rows(app)
+    assert [seq for seq, _, _ in rows] == list(range(1, 2 * TURNS + 1))
+    # Each turn's two messages sit next to each other
+    turns = [(rows[i], rows[i + 1]) for i in range(0, len(rows), 2)]
+    assert all(user[1:] == ('user', user[2]) and reply[1:] == ('assistant', f"reply to {user[2]}")
+               for user, reply in turns)
+    assert sorted(user[2] for user, _ in turns) == sorted(f'turn {i}' for i in range(TURNS))
+    with app.app_context():
+        assert main.BossProgress.query.filter_by(user_id=1).one().last_message_seq == 2 * TURNS
+
+
+def test_old_messages_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setitem(main.NEXUS_CHAT_CONFIG, 'retention_messages', 10)
+    monkeypatch.setitem(main.NEXUS_CHAT_CONFIG, 'prune_every', 5)
+    app = make_player(tmp_path)
+    most_kept = 0
+    with app.app_context():
+        for turn in range(20):
+            # Two messages a turn, so some turns step over a multiple of prune_every
+            main.append_nexus_messages(1, [('user', f'turn {turn}'), ('assistant', 'INTRUDER')])
+            db.session.commit()
+            most_kept = max(most_kept, main.NexusMessage.query.count())
+
+    # Pruned at least every prune_every messages, never below the retention window
+    assert 10 < most_kept <= 10 + 5
+    assert [seq for seq, _, _ in logged_rows(app)] == list(range(31, 41))
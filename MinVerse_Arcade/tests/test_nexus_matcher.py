@@ -0,0 +1,56 @@
+"""The compiled NEXUS keyword matcher against the per-category substring
+checks it replaced"""
+import random
+
+import pytest
+
+from game_constants import NEXUS_WEAKNESS_KEYWORDS
+from keyword_matcher import KeywordMatcher
+
+matcher = KeywordMatcher(NEXUS_WEAKNESS_KEYWORDS)
+
+
+def original_categories(user_message):
+    """The per-category `any(word in user_message.lower() ...)` checks the
+    matcher replaced"""
+    return {category for category, words in NEXUS_WEAKNESS_KEYWORDS.items()
+            if any(word in user_message.lower() for word in words)}
+
+
+# (message, categories the original logic finds)
+CASES = [
+    ("", set()),
+    ("hello nexus", set()),
+    ("PATTERN", {'pattern'}),
+    ("the answer is 42", {'pattern'}),
+    ("forty-two and forty two", {'pattern'}),
+    ("repeat after me", {'pattern', 'memory'}),
+    ("flip it backwards", {'reverse'}),
+    ("I remember your face", {'memory'}),
+    ("chaos and random dodge", {'random'}),
+    ("it is freezing cold", {'temperature'}),
+    ("who made you", {'knowledge'}),
+    ("blind spot", {'knowledge'}),
+    ("blindspot", set()),
+    ("remembering", {'memory'}),          # substring match, no word boundaries
+    ("madeline", {'knowledge'}),          # 'made' inside a longer word still counts
+    ("sequencerandom", {'pattern', 'random'}),
+    ("reversedweathermemoriescreatorchaos42",
+     {'reverse', 'temperature', 'memory', 'knowledge', 'random', 'pattern'}),
+]
+
+
+@pytest.mark.parametrize('message, expected', CASES)
+def test_matches_original_checks(message, expected):
+    assert original_categories(message) == expected
+    assert matcher.match(message) == expected
+
+
+def test_random_messages():
+    # Messages built from keyword fragments and filler
+    rng = random.Random(42)
+    keywords = [word for words in NEXUS_WEAKNESS_KEYWORDS.values() for word in words]
+    fragments = keywords + [word[:3] for word in keywords] + ['the', 'NEXUS', ' ', '-', 'x', 'ing']
+    for _ in range(20_000):
+        message = ''.join(rng.choice(fragments) for _ in range(rng.randint(0, 8)))
+        assert matcher.match(message) == original_categories(message), message
@@ -0,0 +1,120 @@
+"""Run EXPLAIN QUERY PLAN on every query the routes issue and fail if any of
+them scans a whole table.
+
+Seeds a database with many users and scores, logs in as one of the busiest
+users, hits every route and explains each SELECT, UPDATE and DELETE that
+was sent to the database. The 1M score seed is marked slow.
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+import common
+from common import db, main
+
+USERS = 1000
+
+REQUESTS = [
+    ('GET', '/', None),
+    ('GET', '/profile', None),
+    ('GET', '/user/coins', None),
+    ('GET', '/user/clues', None),
+    ('GET', '/user/transactions', None),
+    ('GET', '/user/transactions?source=seed&from=2020-01-01&to=2030-12-31&cursor=2030-01-01T00:00:00_999999', None),
+    ('GET', '/user/transactions?cursor=archive:2030-01-01_999999', None),
+    ('GET', '/user/scores', None),
+    ('GET', '/user/scores?game=clickmaster&from=2020-01-01&cursor=2030-01-01T00:00:00_999999', None),
+    ('GET', '/debug/user_data', None),
+    ('POST', '/games/clickmaster', {'score': 42}),
+    ('POST', '/games/emoji_memory', {'score': 8}),
+    ('POST', '/games/fliptext', {'input': 'hello NEXUS there', 'output': 'HELLO nexus THERE'}),
+    ('POST', '/games/space_dodger', {'score': 520}),
+    ('GET', '/api/trivia', None),
+    ('GET', '/api/weather?city=Oslo', None),
+    ('GET', '/api/coin_cruncher', None),
+    ('POST', '/api/coin_cruncher/heartbeat', None),
+    ('POST', '/api/coin_cruncher/defeat', None),  # Too late, answers 409
+    ('GET', '/games/boss_battle', None),
+    ('POST', '/api/nexus_chat', {'message': 'pattern and flip'}),
+    ('GET', '/api/nexus_history?before=2', None),
+    ('GET', '/victory', None),
+]
+
+
+def seed(app, total_scores):
+    rng = random.Random(1)
+    games = [game for game in main.GAME_PROGRESSION if game != 'boss_battle']
+    with app.app_context():
+        db.session.execute(insert(main.User), [
+            {'username': f'player{i}', 'password': 'x'} for i in range(USERS)])
+        db.session.execute(insert(main.PlayerCoins), [
+            {'user_id': i + 1, 'coins': 100} for i in range(USERS)])
+        start = datetime.now() - timedelta(days=365)
+        for offset in range(0, total_scores, 50_000):
+            batch = [{'user_id': rng.randint(1, USERS), 'game': rng.choice(games),
+                      'score': rng.randint(0, 600), 'date': start + timedelta(seconds=i * 30)}
+                     for i in range(offset, min(offset + 50_000, total_scores))]
+            db.session.execute(insert(main.Score), batch)
+            db.session.execute(insert(main.CoinTransaction), [
+                {'user_id': row['user_id'], 'amount': 1, 'source': f"{row['game']}_play",
+                 'timestamp': row['date']} for row in batch])
+        db.session.execute(insert(main.TriviaQuestion), [
+            {'question': f'Question {i}?', 'answer': 'Yes'} for i in range(1000)])
+        db.session.commit()
+        main.rebuild_user_stats()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('total_scores', [20_000, pytest.param(1_000_000, marks=pytest.mark.slow)])
+def test_every_query_uses_an_index(total_scores, tmp_path, monkeypatch):
+    # The external APIs are stubbed, only the database is under test
+    monkeypatch.setattr(main, 'trivia', lambda: {'question': 'Who built the first robot?', 'answer': 'Nobody knows'})
+    monkeypatch.setattr(main, 'get_weather', lambda city: {'city': city, 'temperature': 10, 'weather': 'snow'})
+    monkeypatch.setattr(main, 'ensure_trivia_refill_worker', lambda: None)
+    # The Cruncher worker's pass is run by hand below
+    monkeypatch.setattr(main, 'ensure_cruncher_worker', lambda: None)
+
+    app = common.make_app(f"sqlite:///{tmp_path / 'plans.db'}", with_routes=True)
+    seed(app, total_scores)
+
+    client = app.test_client()
+    client.post('/register', data={'username': 'checker', 'password': 'checker'})
+    client.post('/login', data={'username': 'checker', 'password': 'checker'})
+    with app.app_context():
+        checker_id = main.User.query.filter_by(username='checker').first().id
+        main.credit_coins(checker_id, 100, source='seed')
+        # The checker's cruncher is about to steal
+        db.session.add(main.CruncherState(user_id=checker_id, kind='steal', amount=5,
+                                          due_at=main.utc_now(), last_seen=main.utc_now()))
+        db.session.commit()
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record_statement)
+        for method, url, payload in REQUESTS:
+            response = client.open(url, method=method, json=payload)
+            assert response.status_code < 400 or url.endswith('/defeat'), \
+                f"{method} {url} returned {response.status_code}"
+        # The Coin Cruncher worker applies the steal, and the next check-in reports it
+        main.run_cruncher_events(main.utc_now())
+        main.next_cruncher_due()
+        assert client.get('/api/coin_cruncher').json['last_steal']['amount_stolen'] == 5
+        event.remove(db.engine, 'before_cursor_execute', record_statement)
+
+        failures = []
+        for statement, parameters in dict(statements).items():
+            plan = db.session.connection().exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            details = [row[-1] for row in plan]
+            if any(detail.startswith('SCAN') for detail in details):
+                failures.append(f"{' '.join(statement.split())}\n    " + "\n    ".join(details))
+
+    assert not failures, "Full table scans:\n" + "\n".join(failures)
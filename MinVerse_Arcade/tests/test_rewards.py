@@ -0,0 +1,43 @@
+"""grant_reward when the UserStats row disagrees with DiscoveredClue."""
+import common
+from common import db, main
+
+NEXUS_FLIP = {'score': 17, 'input': 'hello NEXUS there', 'output': 'HELLO nexus THERE'}
+
+
+def make_player(tmp_path):
+    app = common.make_app(f"sqlite:///{tmp_path / 'rewards.db'}")
+    with app.app_context():
+        db.session.add(main.User(username='player', password='x'))
+        db.session.add(main.PlayerCoins(user_id=1, coins=0))
+        db.session.commit()
+    return app
+
+
+def test_clue_found_before_stats_existed(tmp_path):
+    app = make_player(tmp_path)
+    with app.app_context():
+        # A clue from before UserStats, with no stats row for it
+        db.session.add(main.DiscoveredClue(user_id=1, game_name='fliptext', clue_id=1))
+        db.session.commit()
+
+        result = main.grant_reward(1, 'fliptext', **NEXUS_FLIP)
+
+        assert not result['clue_new']
+        assert result['transactions'] == [(2, 'fliptext_use')]
+        assert main.PlayerCoins.query.filter_by(user_id=1).one().coins == 2
+        assert main.DiscoveredClue.query.count() == 1
+        # The stats row now knows, so the next flip skips the insert
+        assert main.UserStats.query.filter_by(user_id=1, game='fliptext').one().has_clue
+
+
+def test_new_clue_is_recorded_once(tmp_path):
+    app = make_player(tmp_path)
+    with app.app_context():
+        first = main.grant_reward(1, 'fliptext', **NEXUS_FLIP)
+        second = main.grant_reward(1, 'fliptext', **NEXUS_FLIP)
+
+        assert first['clue_new'] and first['earned_coins'] == 5
+        assert not second['clue_new'] and second['earned_coins'] == 0
+        assert main.DiscoveredClue.query.count() == 1
+        assert main.PlayerCoins.query.filter_by(user_id=1).one().coins == 5
@@ -0,0 +1,52 @@
+"""Concurrent awards, spends and steals against one player leave a balance
+that matches their CoinTransaction rows and never goes negative. A small
+version of benchmarks/stress_coins.py, which runs thousands."""
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import common
+from common import db, main
+
+OPERATIONS = 400
+THREADS = 8
+
+
+@pytest.mark.parametrize('profile', [None, 'production'])
+def test_balance_matches_ledger(profile, tmp_path):
+    # Threads need a shared file database, an in-memory one is per connection
+    engine_options = None if profile else {'connect_args': {'timeout': 60}}
+    app = common.make_app(f"sqlite:///{tmp_path / 'stress.db'}", engine_options=engine_options,
+                          profile=profile)
+    with app.app_context():
+        user_id = common.create_user(coins=0)
+
+    def award_spend_or_steal(i):
+        rng = random.Random(i)
+        with app.app_context():
+            if i % 3 == 0:
+                # Takes whatever is left if the player is short
+                stolen, _ = main.cruncher_steal(user_id, rng.randint(1, 15))
+                outcome = 'steal' if stolen else 'missed'
+            elif i % 3 == 1:
+                spent = main.debit_coins(user_id, rng.randint(1, 10), source='stress_spend')
+                outcome = 'spend' if spent is not None else 'missed'
+            else:
+                main.credit_coins(user_id, rng.randint(1, 10), source='stress_award')
+                outcome = 'award'
+            db.session.commit()
+            return outcome
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        outcomes = list(pool.map(award_spend_or_steal, range(OPERATIONS)))
+
+    with app.app_context():
+        balance = main.PlayerCoins.query.filter_by(user_id=user_id).one().coins
+        ledger = db.session.query(db.func.sum(main.CoinTransaction.amount)) \
+                           .filter_by(user_id=user_id).scalar() or 0
+        recorded = main.CoinTransaction.query.filter_by(user_id=user_id).count()
+
+    assert balance == ledger
+    assert balance >= 0
+    assert recorded == OPERATIONS - outcomes.count('missed')
@@ -0,0 +1,126 @@
+"""The trivia pool against a local fake OpenAI endpoint: batches are
+validated and deduplicated, /api/trivia serves from the pool without
+calling the API, and no player gets the same question twice."""
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import common
+from api import ai
+from common import db, main
+
+ensure_trivia_refill_worker = main.ensure_trivia_refill_worker
+completion_calls = {'batch': 0, 'single': 0}
+question_numbers = itertools.count(1)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][0]['content']
+        time.sleep(0.5)  # Completions are slow, serving from the pool shouldn't be
+
+        batch = re.match(r'Generate (\d+) unique', prompt)
+        if batch:
+            completion_calls['batch'] += 1
+            items = [{'question': f'Fake question {next(question_numbers)}?', 'answer': 'Yes'}
+                     for _ in range(int(batch.group(1)))]
+            # Bad and repeated items the pool has to drop
+            items += [{'question': '', 'answer': 'empty'}, {'answer': 'no question'}, items[0]]
+            content = '```json\n' + json.dumps(items) + '\n```'
+        else:
+            completion_calls['single'] += 1
+            content = json.dumps({'question': 'Live fallback question?', 'answer': 'Yes'})
+
+        payload = json.dumps({
+            'id': 'fake', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def fake_openai_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/v1'
+    server.shutdown()
+
+
+@pytest.fixture
+def app(fake_openai_url, tmp_path, monkeypatch):
+    """An app whose pool was filled from the fake endpoint"""
+    monkeypatch.setenv('OPENAI_BASE_URL', fake_openai_url)
+    monkeypatch.setenv('OPENAI_API_KEY', 'fake')
+    # Built again on first use, pointed at the fake
+    monkeypatch.setattr(ai, '_client', None)
+    for key, value in {'batch_size': 10, 'low_water': 15, 'check_interval': 3600}.items():
+        monkeypatch.setitem(main.TRIVIA_POOL_CONFIG, key, value)
+    # Refills only run when a test calls them, or starts the thread itself
+    monkeypatch.setattr(main, 'ensure_trivia_refill_worker', lambda: None)
+    completion_calls.update(batch=0, single=0)
+
+    app = common.make_app(f"sqlite:///{tmp_path / 'trivia.db'}",
+                          engine_options={'connect_args': {'timeout': 30}}, with_routes=True)
+    with app.app_context():
+        # An empty pool is filled in batches up to the low water mark
+        assert main.refill_trivia_pool() == 10
+        assert main.refill_trivia_pool() == 10
+    return app
+
+
+def login(app, username):
+    client = app.test_client()
+    client.post('/register', data={'username': username, 'password': 'pw'})
+    client.post('/login', data={'username': username, 'password': 'pw'})
+    return client
+
+
+def test_refill_stops_at_low_water(app):
+    with app.app_context():
+        assert main.refill_trivia_pool() == 0
+        # The bad and repeated items in every batch were dropped
+        assert main.TriviaQuestion.query.count() == 20
+    assert completion_calls['batch'] == 2
+
+
+def test_each_player_gets_every_question_once(app):
+    first, second = login(app, 'first'), login(app, 'second')
+    served = [first.get('/api/trivia').json['question'] for _ in range(20)]
+    assert len(set(served)) == 20, "a question was served twice"
+    assert completion_calls['single'] == 0
+
+    # Every player gets the whole pool, in their own order of progress
+    assert second.get('/api/trivia').json['question'] == served[0]
+
+
+def test_player_who_has_seen_everything_wakes_the_refill(app, monkeypatch):
+    # The real refill thread, started for this app
+    monkeypatch.setattr(main, 'ensure_trivia_refill_worker', ensure_trivia_refill_worker)
+    monkeypatch.setattr(main, '_trivia_refill_thread', None)
+    first = login(app, 'first')
+    served = [first.get('/api/trivia').json['question'] for _ in range(20)]
+
+    # A live question, and the refill thread is woken for another batch
+    assert first.get('/api/trivia').json['question'] == 'Live fallback question?'
+    for _ in range(50):
+        if completion_calls['batch'] > 2:
+            break
+        time.sleep(0.1)
+    time.sleep(0.5)
+    assert completion_calls['batch'] == 3, completion_calls
+    assert first.get('/api/trivia').json['question'] not in served
@@ -0,0 +1,112 @@
+"""The weather cache against a local stub of the OpenWeatherMap API:
+coalescing (threads and the async path), hits for normalized city names,
+negative caching, LRU eviction and TTL expiry."""
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from api import external
+from api.cache import TTLCache
+from api.external import get_weather, get_weather_async
+
+upstream_calls = Counter()
+
+
+class StubWeatherHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        city = parse_qs(urlparse(self.path).query)['q'][0]
+        upstream_calls[city.lower()] += 1
+        time.sleep(0.2)  # A slow upstream makes concurrent misses overlap
+
+        if city.lower() == 'atlantis':
+            status, body = 404, {'cod': '404', 'message': 'city not found'}
+        else:
+            status, body = 200, {'cod': 200, 'name': city.title(),
+                                 'main': {'temp': 20.4, 'humidity': 80},
+                                 'weather': [{'description': 'light snow'}],
+                                 'wind': {'speed': 3}}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def stub_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubWeatherHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/weather'
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def weather_cache(stub_url, monkeypatch):
+    """A small cache with short TTLs in front of the stub"""
+    cache = TTLCache(maxsize=3, ttl=2, error_ttl=1)
+    monkeypatch.setattr(external, 'weather_cache', cache)
+    monkeypatch.setattr(external, 'WEATHER_API_URL', stub_url)
+    upstream_calls.clear()
+    return cache
+
+
+def test_concurrent_misses_make_one_call(weather_cache):
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(get_weather, ['Oslo'] * 20))
+    assert all(result['temperature'] == 20 for result in results)
+    assert upstream_calls['oslo'] == 1
+    assert weather_cache.coalesced > 0
+
+
+def test_async_misses_make_one_call():
+    async def concurrent_lookups():
+        return await asyncio.gather(*(get_weather_async('Bergen') for _ in range(20)))
+    assert all(result['temperature'] == 20 for result in asyncio.run(concurrent_lookups()))
+    assert upstream_calls['bergen'] == 1
+
+
+def test_normalized_names_share_an_entry():
+    result = get_weather('  oSLO ')
+    # Callers get their own copy to add keys to
+    result['discovered_clue'] = True
+    assert 'discovered_clue' not in get_weather('Oslo')
+    assert sum(upstream_calls.values()) == 1
+
+
+def test_errors_are_cached_briefly():
+    assert get_weather('Atlantis')['temperature'] == 'N/A'
+    assert get_weather('Atlantis')['temperature'] == 'N/A'
+    assert upstream_calls['atlantis'] == 1
+    time.sleep(1.1)
+    get_weather('Atlantis')
+    assert upstream_calls['atlantis'] == 2
+
+
+def test_least_recently_used_city_is_evicted(weather_cache):
+    for city in ('Oslo', 'Reykjavik', 'Nuuk', 'Tromso'):
+        get_weather(city)
+    assert weather_cache.evictions > 0
+    get_weather('Reykjavik')
+    assert upstream_calls['reykjavik'] == 1
+    get_weather('Oslo')
+    assert upstream_calls['oslo'] == 2
+
+
+def test_entries_expire():
+    get_weather('Reykjavik')
+    get_weather('Reykjavik')
+    assert upstream_calls['reykjavik'] == 1
+    time.sleep(2.1)
+    get_weather('Reykjavik')
+    assert upstream_calls['reykjavik'] == 2